@@ -1 +1 @@
-{'application': False, 'author': 'Marcos Hache Odoo', 'data': ['views/res_company_view.xml', 'views/res_config_settings_view.xml', 'wizard/register_grain_lpg_wizard_view.xml', 'wizard/grain_netting_wizard_view.xml', 'views/grain_liquidation_views.xml', 'views/grain_liquidation_vendor_bill_fix.xml', 'views/grain_liquidation_menu.xml', 'views/account_move_out_invoice_canje.xml', 'security/security_groups.xml', 'security/ir.model.access.csv', 'data/sequence_canje_contract.xml', 'wizard/apply_grain_canje_view.xml', 'views/grain_canje_contract_view.xml', 'views/account_move_view.xml', 'views/grain_canje_analysis_views.xml', 'reports/report_grain_canje_contract.xml'], 'depends': ['account', 'product', 'mail', 'stock', 'base'], 'installable': True, 'license': 'LGPL-3', 'name': 'Grain Canje Triangular', 'summary': 'Gestión completa de contratos y aplicaciones de canje de granos (productor → acopio → proveedor)', 'version': '16.0.1.0.0'}
\ No newline at end of file
+{'application': False, 'author': 'Marcos Hache Odoo', 'data': ['views/res_company_view.xml', 'views/res_config_settings_view.xml', 'wizard/register_grain_lpg_wizard_view.xml', 'wizard/grain_netting_wizard_view.xml', 'wizard/grain_netting_run_wizard_view.xml', 'views/grain_liquidation_views.xml', 'views/grain_liquidation_vendor_bill_fix.xml', 'views/grain_liquidation_menu.xml', 'views/grain_liquidation_import_views.xml', 'views/account_move_out_invoice_canje.xml', 'security/security_groups.xml', 'security/ir.model.access.csv', 'data/sequence_canje_contract.xml', 'data/ir_cron_data.xml', 'data/grain_rollup_data.xml', 'wizard/apply_grain_canje_view.xml', 'wizard/apply_grain_canje_bulk_view.xml', 'wizard/grain_market_price_import_wizard_view.xml', 'wizard/grain_canje_reprice_wizard_view.xml', 'views/grain_market_price_views.xml', 'views/grain_canje_contract_view.xml', 'views/grain_canje_ledger_views.xml', 'views/grain_canje_job_views.xml', 'views/grain_producer_balance_views.xml', 'views/grain_campaign_summary_views.xml', 'views/account_move_view.xml', 'views/grain_canje_analysis_views.xml', 'reports/report_grain_canje_contract.xml'], 'depends': ['account', 'product', 'mail', 'stock', 'base'], 'installable': True, 'license': 'LGPL-3', 'name': 'Grain Canje Triangular', 'summary': 'Gestión completa de contratos y aplicaciones de canje de granos (productor → acopio → proveedor)', 'version': '16.0.1.0.0'}
\ No newline at end of file
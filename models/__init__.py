@@ -1,14 +1,28 @@
 # -*- coding: utf-8 -*-
 
 from . import grain_canje_contract
+from . import grain_canje_application_batch
+from . import grain_canje_ledger
+from . import grain_canje_price
+from . import grain_market_price
 from . import account_move
+from . import stock_move
 
 # NUEVO: netting / liquidaciones
 from . import grain_liquidation
 from . import grain_liquidation_actions
 from . import grain_liquidation_workflow
 from . import grain_liquidation_patch
+from . import grain_liquidation_import
 from . import account_move_grain_netting
+from . import grain_netting_engine
+from . import grain_canje_job
+from . import grain_rollup_mixin
+from . import grain_producer_balance
+from . import grain_campaign_summary
+from . import grain_canje_campaign_close
 
 from . import res_company
+from . import res_currency
 from . import res_config_settings
+from . import grain_canje_analysis
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from odoo import fields, models, _
+from odoo import api, fields, models, tools, _
 
 
 class AccountMove(models.Model):
@@ -11,6 +11,25 @@ class AccountMove(models.Model):
         string="Aplicaciones de canje",
         readonly=True,
     )
+    grain_liquidation_id = fields.Many2one(
+        "grain.liquidation",
+        string="Liquidación (LPG)",
+        readonly=True,
+        copy=False,
+        index=True,
+        help="LPG que generó esta vendor bill.",
+    )
+
+    def init(self):
+        super().init()
+        # Búsqueda de la vendor bill de una LPG: productor + fecha + diario
+        tools.create_index(
+            self._cr,
+            "account_move_grain_lpg_bill_idx",
+            self._table,
+            ["partner_id", "invoice_date", "journal_id"],
+            where="move_type = 'in_invoice'",
+        )
 
     def button_apply_grain_canje(self):
         """Abrir wizard de aplicación de canje de granos para esta factura de proveedor."""
@@ -28,3 +47,25 @@ class AccountMove(models.Model):
                 "default_move_id": self.id,
             },
         }
+
+
+class AccountMoveLine(models.Model):
+    _inherit = "account.move.line"
+
+    @api.model
+    def _grain_reconcile_batch(self, line_sets):
+        """Concilia varios juegos de apuntes en una sola pasada.
+
+        Cada juego es una factura con su canje, o una línea de compensación
+        con sus partidas. ``_reconcile_plan`` arma los parciales (y las
+        diferencias de cambio) de todos los juegos juntos y crea un
+        ``account.full.reconcile`` por juego saldado, así cada factura
+        conserva su propio número de conciliación.
+        """
+        plan = []
+        for lines in line_sets:
+            lines = lines.filtered(lambda l: not l.reconciled)
+            if len(lines) >= 2:
+                plan.append(lines)
+        if plan:
+            self.env["account.move.line"]._reconcile_plan(plan)
@@ -1,17 +1,37 @@
 # -*- coding: utf-8 -*-
 from odoo import models, _
+from odoo.exceptions import UserError
 
 
 class AccountMove(models.Model):
     _inherit = "account.move"
 
     def action_open_grain_netting_wizard(self):
-        self.ensure_one()
+        producer = self.commercial_partner_id
+        if len(producer) != 1 or len(self.company_id) != 1:
+            raise UserError(_("Seleccioná facturas de un mismo productor y compañía."))
+        invoices = self.filtered(
+            lambda m: m.move_type == "out_invoice" and m.state == "posted" and m.payment_state not in ("paid", "in_payment")
+        )
+        if not invoices:
+            raise UserError(_("No hay facturas cliente publicadas con saldo para compensar."))
+
+        lpg_domain = [
+            ("move_type", "=", "in_invoice"),
+            ("state", "=", "posted"),
+            ("payment_state", "not in", ("paid", "in_payment")),
+            ("commercial_partner_id", "=", producer.id),
+            ("company_id", "=", self.company_id.id),
+        ]
+        if self.company_id.grain_liquidation_journal_id:
+            lpg_domain.append(("journal_id", "=", self.company_id.grain_liquidation_journal_id.id))
+        lpg_bills = self.search(lpg_domain)
+
         action = self.env.ref("grain_canje_triangular.action_grain_netting_wizard").read()[0]
         action["context"] = {
-            "default_move_id": self.id,
-            "default_producer_id": self.partner_id.id,
+            "default_move_ids": [(6, 0, invoices.ids)],
+            "default_lpg_bill_ids": [(6, 0, lpg_bills.ids)],
+            "default_producer_id": producer.id,
             "default_company_id": self.company_id.id,
-            "default_amount": self.amount_residual,
         }
         return action
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Modo masivo: sin seguimiento ni mensajes por registro.
+
+Las operaciones en lote (trabajos en segundo plano, wizards masivos,
+compensación automática, cierre de campaña) corren con este contexto y dejan
+un solo mensaje resumen por lote o por registro afectado. El uso interactivo
+de a un registro no lo activa y conserva el chatter completo.
+"""
+
+BULK_CONTEXT = {
+    "tracking_disable": True,
+    "mail_notrack": True,
+    "mail_create_nolog": True,
+    "grain_bulk": True,
+}
+
+# Enlaces por mensaje resumen; el resto se indica como cantidad
+DIGEST_MAX_LINKS = 50
+
+
+def bulk_mode(records):
+    """``records`` con el contexto de modo masivo."""
+    return records.with_context(**BULK_CONTEXT)
+
+
+def in_bulk_mode(records):
+    return bool(records.env.context.get("grain_bulk"))
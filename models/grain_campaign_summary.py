@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, _
+
+
+class GrainCampaignSummary(models.Model):
+    _name = "grain.campaign.summary"
+    _inherit = ["grain.rollup.mixin"]
+    _description = "Resumen de canje por campaña / grano / proveedor / productor / mes"
+    _order = "campaign_id, month, product_id"
+
+    _rollup_keys = ("company_id", "campaign_id", "product_id", "supplier_id", "producer_id", "month")
+    _rollup_measures = ("tn_aplicadas", "amount_company", "application_count")
+
+    company_id = fields.Many2one("res.company", string="Compañía", required=True, readonly=True)
+    campaign_id = fields.Many2one("grain.canje.campaign", string="Campaña", readonly=True)
+    product_id = fields.Many2one("product.product", string="Grano", readonly=True)
+    supplier_id = fields.Many2one("res.partner", string="Proveedor", readonly=True)
+    producer_id = fields.Many2one("res.partner", string="Productor", readonly=True)
+    month = fields.Date(string="Mes", readonly=True)
+    currency_id = fields.Many2one(related="company_id.currency_id", readonly=True)
+
+    tn_aplicadas = fields.Float(string="TN aplicadas", digits=(16, 3), readonly=True)
+    amount_company = fields.Monetary(string="Importe", currency_field="currency_id", readonly=True)
+    application_count = fields.Integer(string="Aplicaciones", readonly=True)
+
+    def init(self):
+        self._rollup_create_index()
+
+    def _source_query(self):
+        return """
+            SELECT c.company_id,
+                   c.campaign_id,
+                   c.product_id,
+                   sup.commercial_partner_id AS supplier_id,
+                   prod.commercial_partner_id AS producer_id,
+                   date_trunc('month', app.date)::date AS month,
+                   app.tn_aplicadas,
+                   COALESCE(app.amount_company, 0.0) AS amount_company,
+                   1 AS application_count
+              FROM grain_canje_application app
+              JOIN grain_canje_contract c ON c.id = app.contract_id
+              JOIN res_partner sup ON sup.id = c.supplier_id
+              JOIN res_partner prod ON prod.id = c.producer_id
+        """
+
+    @api.model
+    def action_rebuild(self):
+        rows = self._rebuild()
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": _("Resumen de campañas reconstruido"),
+                "message": _("Filas: %s") % rows,
+                "type": "success",
+            },
+        }
+
+
+class GrainCanjeApplication(models.Model):
+    _inherit = "grain.canje.application"
+
+    def _campaign_summary_deltas(self, sign=1):
+        return [
+            {
+                "company_id": app.contract_id.company_id.id,
+                "campaign_id": app.contract_id.campaign_id.id,
+                "product_id": app.contract_id.product_id.id,
+                "supplier_id": app.contract_id.supplier_id.commercial_partner_id.id,
+                "producer_id": app.contract_id.producer_id.commercial_partner_id.id,
+                "month": app.date and fields.Date.start_of(app.date, "month"),
+                "tn_aplicadas": sign * app.tn_aplicadas,
+                "amount_company": sign * app.amount_company,
+                "application_count": sign,
+            }
+            for app in self
+        ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        applications = super().create(vals_list)
+        self.env["grain.campaign.summary"]._rollup_add(applications._campaign_summary_deltas())
+        return applications
+
+    def write(self, vals):
+        if not {"tn_aplicadas", "contract_id", "date"} & set(vals):
+            return super().write(vals)
+        deltas = self._campaign_summary_deltas(sign=-1)
+        res = super().write(vals)
+        self.env["grain.campaign.summary"]._rollup_add(deltas + self._campaign_summary_deltas())
+        return res
+
+    def unlink(self):
+        deltas = self._campaign_summary_deltas(sign=-1)
+        res = super().unlink()
+        self.env["grain.campaign.summary"]._rollup_add(deltas)
+        return res
+
+
+class GrainCanjeCampaign(models.Model):
+    _inherit = "grain.canje.campaign"
+
+    currency_id = fields.Many2one(related="company_id.currency_id", readonly=True)
+    tn_aplicadas = fields.Float(string="TN aplicadas", digits=(16, 3), compute="_compute_summary_kpis")
+    amount_aplicado = fields.Monetary(
+        string="Importe aplicado", currency_field="currency_id", compute="_compute_summary_kpis"
+    )
+    application_count = fields.Integer(string="Aplicaciones", compute="_compute_summary_kpis")
+
+    def _compute_summary_kpis(self):
+        # Lee el resumen (pocas filas por campaña), no las aplicaciones
+        groups = self.env["grain.campaign.summary"].read_group(
+            [("campaign_id", "in", self.ids)],
+            ["tn_aplicadas:sum", "amount_company:sum", "application_count:sum"],
+            ["campaign_id"],
+        )
+        totals = {group["campaign_id"][0]: group for group in groups}
+        for campaign in self:
+            group = totals.get(campaign.id, {})
+            campaign.tn_aplicadas = group.get("tn_aplicadas", 0.0)
+            campaign.amount_aplicado = group.get("amount_company", 0.0)
+            campaign.application_count = group.get("application_count", 0)
+
+    def action_open_summary(self):
+        self.ensure_one()
+        action = self.env.ref("grain_canje_triangular.action_grain_campaign_summary").read()[0]
+        action["domain"] = [("campaign_id", "=", self.id)]
+        return action
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+from odoo import api, fields, models
+
+# Desplazamiento del id por tipo de fila: id = desplazamiento * 10^10 + id de origen
+LINE_TYPE_ID_OFFSET = {
+    "application": 1,
+    "contract": 2,
+    "liquidation": 3,
+    "netting": 4,
+}
+
+
+class GrainCanjeAnalysis(models.Model):
+    _name = "grain.canje.analysis"
+    _description = "Análisis de canje (campaña / cereal)"
+    _auto = False
+    _order = "date desc"
+
+    line_type = fields.Selection(
+        [
+            ("application", "Aplicación de canje"),
+            ("contract", "Saldo de contrato"),
+            ("liquidation", "Liquidación (LPG)"),
+            ("netting", "Compensación"),
+        ],
+        string="Tipo",
+        readonly=True,
+    )
+    date = fields.Date(string="Fecha", readonly=True)
+    company_id = fields.Many2one("res.company", string="Compañía", readonly=True)
+    currency_id = fields.Many2one("res.currency", string="Moneda", readonly=True)
+    campaign_id = fields.Many2one("grain.canje.campaign", string="Campaña", readonly=True)
+    product_id = fields.Many2one("product.product", string="Grano", readonly=True)
+    producer_id = fields.Many2one("res.partner", string="Productor", readonly=True)
+    supplier_id = fields.Many2one("res.partner", string="Proveedor", readonly=True)
+    contract_id = fields.Many2one("grain.canje.contract", string="Contrato", readonly=True)
+
+    tn_aplicadas = fields.Float(string="TN aplicadas", readonly=True)
+    tn_disponibles = fields.Float(string="TN residuales", readonly=True)
+    tn_liquidadas = fields.Float(string="TN liquidadas", readonly=True)
+    amount_applied = fields.Monetary(string="Canje aplicado", currency_field="currency_id", readonly=True)
+    amount_liquidated = fields.Monetary(string="Liquidado (LPG)", currency_field="currency_id", readonly=True)
+    amount_netted = fields.Monetary(string="Compensado", currency_field="currency_id", readonly=True)
+
+    # ------------------------------
+    # VISTA SQL
+    # ------------------------------
+
+    def _query(self):
+        return """
+            SELECT sub.*
+              FROM (
+                -- Aplicaciones de canje (importe en moneda de la compañía, fijado al aplicar)
+                SELECT {application}::bigint * 10000000000 + app.id AS id,
+                       'application' AS line_type,
+                       app.date,
+                       c.company_id,
+                       comp.currency_id,
+                       c.campaign_id,
+                       c.product_id,
+                       c.producer_id,
+                       c.supplier_id,
+                       c.id AS contract_id,
+                       app.tn_aplicadas,
+                       0.0 AS tn_disponibles,
+                       0.0 AS tn_liquidadas,
+                       app.amount_company AS amount_applied,
+                       0.0 AS amount_liquidated,
+                       0.0 AS amount_netted
+                  FROM grain_canje_application app
+                  JOIN grain_canje_contract c ON c.id = app.contract_id
+                  JOIN res_company comp ON comp.id = c.company_id
+
+                UNION ALL
+
+                -- Saldo residual por contrato (una fila por contrato)
+                SELECT {contract}::bigint * 10000000000 + c.id,
+                       'contract',
+                       c.date,
+                       c.company_id,
+                       comp.currency_id,
+                       c.campaign_id,
+                       c.product_id,
+                       c.producer_id,
+                       c.supplier_id,
+                       c.id,
+                       0.0,
+                       c.tn_disponibles,
+                       0.0,
+                       0.0,
+                       0.0,
+                       0.0
+                  FROM grain_canje_contract c
+                  JOIN res_company comp ON comp.id = c.company_id
+                 WHERE c.state IN ('open', 'done')
+
+                UNION ALL
+
+                -- Liquidaciones publicadas (campaña según fecha)
+                SELECT {liquidation}::bigint * 10000000000 + l.id,
+                       'liquidation',
+                       l.date,
+                       l.company_id,
+                       l.currency_id,
+                       camp.id,
+                       l.product_id,
+                       l.producer_id,
+                       NULL,
+                       NULL,
+                       0.0,
+                       0.0,
+                       l.qty_tn,
+                       0.0,
+                       l.amount,
+                       0.0
+                  FROM grain_liquidation l
+                  LEFT JOIN LATERAL (
+                      SELECT gc.id
+                        FROM grain_canje_campaign gc
+                       WHERE gc.company_id = l.company_id
+                         AND l.date BETWEEN gc.date_start AND gc.date_end
+                    ORDER BY gc.date_start DESC
+                       LIMIT 1
+                  ) camp ON TRUE
+                 WHERE l.state = 'posted'
+
+                UNION ALL
+
+                -- Compensaciones (Debe A/P de los asientos del diario de compensaciones)
+                SELECT {netting}::bigint * 10000000000 + aml.id,
+                       'netting',
+                       aml.date,
+                       aml.company_id,
+                       comp.currency_id,
+                       NULL,
+                       NULL,
+                       aml.partner_id,
+                       NULL,
+                       NULL,
+                       0.0,
+                       0.0,
+                       0.0,
+                       0.0,
+                       0.0,
+                       aml.debit
+                  FROM account_move_line aml
+                  JOIN res_company comp ON comp.id = aml.company_id
+                  JOIN account_account acc ON acc.id = aml.account_id
+                 WHERE aml.journal_id = comp.grain_netting_journal_id
+                   AND aml.parent_state = 'posted'
+                   AND acc.account_type = 'liability_payable'
+                   AND aml.debit > 0
+              ) sub
+        """.format(**LINE_TYPE_ID_OFFSET)
+
+    def init(self):
+        # La vista sólo se recrea si cambió su definición (hash guardado como comentario)
+        cr = self.env.cr
+        query = self._query()
+        indexes = [
+            # Índice único requerido por REFRESH ... CONCURRENTLY
+            "CREATE UNIQUE INDEX {t}_id_idx ON {t} (id)",
+            "CREATE INDEX {t}_campaign_product_idx ON {t} (company_id, campaign_id, product_id)",
+        ]
+        signature = hashlib.md5("\n".join([query] + indexes).encode()).hexdigest()
+        cr.execute(
+            "SELECT relkind, obj_description(oid, 'pg_class') FROM pg_class WHERE relname = %s",
+            (self._table,),
+        )
+        row = cr.fetchone()
+        if row and row[0] == "m" and row[1] == signature:
+            return
+        if row and row[0] == "m":
+            cr.execute("DROP MATERIALIZED VIEW %s CASCADE" % self._table)
+        elif row and row[0] == "v":
+            cr.execute("DROP VIEW %s CASCADE" % self._table)
+
+        cr.execute("CREATE MATERIALIZED VIEW %s AS (%s)" % (self._table, query))
+        cr.execute("COMMENT ON MATERIALIZED VIEW %s IS %%s" % self._table, (signature,))
+        for index in indexes:
+            cr.execute(index.format(t=self._table))
+
+    # ------------------------------
+    # ACTUALIZACIÓN
+    # ------------------------------
+
+    @api.model
+    def _refresh(self):
+        self.env.flush_all()
+        self.env.cr.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY %s" % self._table)
+        self.invalidate_model()
+
+    @api.model
+    def action_refresh(self):
+        self._refresh()
+        return {"type": "ir.actions.client", "tag": "reload"}
+
+    @api.model
+    def _cron_refresh(self):
+        self._refresh()
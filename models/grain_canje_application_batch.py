@@ -0,0 +1,525 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools.float_utils import float_round
+
+from .grain_bulk import DIGEST_MAX_LINKS, in_bulk_mode
+
+
+class GrainCanjeApplication(models.Model):
+    _inherit = "grain.canje.application"
+
+    # ------------------------------
+    # VALIDACIONES
+    # ------------------------------
+
+    @api.model
+    def _canje_invoice_residual(self, move):
+        """Saldo pendiente de la factura en la moneda de la factura."""
+        if move.currency_id == move.company_id.currency_id:
+            return abs(move.amount_residual)
+        # Factura en moneda extranjera: sumamos amount_residual_currency de las líneas de proveedor
+        vendor_lines = move.line_ids.filtered(
+            lambda l: l.account_id.account_type in ("asset_receivable", "liability_payable")
+        )
+        return abs(sum(vendor_lines.mapped("amount_residual_currency")))
+
+    @api.model
+    def _canje_check_group(self, move, allocations, remaining_tn):
+        """Valida las asignaciones {move, contract, tn} de una factura.
+
+        ``remaining_tn`` lleva las TN disponibles por contrato ya consumidas por
+        las facturas anteriores del mismo lote; sólo se actualiza si la factura
+        pasa todas las validaciones.
+        """
+        company = move.company_id
+
+        if move.move_type != "in_invoice" or move.state != "posted":
+            raise UserError(_("La factura debe estar publicada para aplicar el canje."))
+
+        journal = company.canje_journal_id
+        cuenta_cte_prod = company.canje_account_id
+        if not journal or not cuenta_cte_prod:
+            raise UserError(_("Configurar diario y cuenta de canje en Ajustes → Contabilidad."))
+
+        lines = []
+        consumed = {}
+        for alloc in allocations:
+            contract = alloc["contract"]
+            tn = alloc["tn"]
+            if tn <= 0.0:
+                raise UserError(_("Las toneladas a aplicar deben ser mayores a cero."))
+            if contract.state != "open" or contract.company_id != company:
+                raise UserError(_("El contrato %s no está vigente para la compañía de la factura.") % contract.name)
+            if contract.supplier_id.commercial_partner_id != move.commercial_partner_id:
+                raise UserError(_("El contrato %s no corresponde al proveedor de la factura.") % contract.name)
+
+            available = remaining_tn.get(contract, contract.tn_disponibles or 0.0)
+            if consumed.get(contract, 0.0) + tn > available + 1e-6:
+                raise UserError(_("Las TN a aplicar superan las disponibles en el contrato %s.") % contract.name)
+            consumed[contract] = consumed.get(contract, 0.0) + tn
+
+            amount = move.currency_id.round(tn * (contract.precio_ref or 0.0))
+            if amount <= 0.0:
+                raise UserError(_("El monto equivalente debe ser mayor que cero."))
+            lines.append((contract, tn, amount))
+
+        amount_total = sum(amount for _contract, _tn, amount in lines)
+        residual_inv_cur = self._canje_invoice_residual(move)
+        if amount_total > residual_inv_cur + 0.01:
+            raise UserError(
+                _(
+                    "No podés aplicar más que el saldo pendiente de la factura.\n"
+                    "Saldo actual: %(saldo).2f %(moneda)s"
+                )
+                % {
+                    "saldo": residual_inv_cur,
+                    "moneda": move.currency_id.name,
+                }
+            )
+
+        # Línea de proveedor de la factura (no reconciliada)
+        vendor_lines = move.line_ids.filtered(
+            lambda l: l.account_id.account_type == "liability_payable" and not l.reconciled
+        )
+        if not vendor_lines:
+            raise UserError(
+                _("No se encontró una línea de proveedor pendiente de conciliar en la factura.")
+            )
+
+        for contract, tn in consumed.items():
+            remaining_tn[contract] = remaining_tn.get(contract, contract.tn_disponibles or 0.0) - tn
+
+        return {
+            "move": move,
+            "journal": journal,
+            "account": cuenta_cte_prod,
+            "vendor_lines": vendor_lines,
+            "lines": lines,
+            "amount_total": amount_total,
+        }
+
+    # ------------------------------
+    # SIMULACIÓN (SIN ESCRITURA)
+    # ------------------------------
+
+    @api.model
+    def _canje_simulate_load(self, move_ids, contract_ids):
+        """Datos de facturas y contratos para la simulación (una consulta por modelo)."""
+        self.env["account.move"].flush_model([
+            "move_type", "state", "company_id", "commercial_partner_id", "currency_id",
+        ])
+        self.env["account.move.line"].flush_model([
+            "move_id", "account_id", "reconciled", "amount_residual", "amount_residual_currency",
+        ])
+        self.env["grain.canje.contract"].flush_model([
+            "state", "company_id", "supplier_id", "precio_ref", "tn_disponibles",
+        ])
+        self.env["res.partner"].flush_model(["commercial_partner_id"])
+
+        moves = {}
+        if move_ids:
+            self.env.cr.execute(
+                """
+                SELECT m.id,
+                       m.name,
+                       m.move_type,
+                       m.state,
+                       m.company_id,
+                       m.commercial_partner_id,
+                       m.currency_id,
+                       comp.canje_journal_id IS NOT NULL AND comp.canje_account_id IS NOT NULL AS configured,
+                       ABS(COALESCE(SUM(
+                           CASE WHEN m.currency_id = comp.currency_id THEN aml.amount_residual
+                                ELSE aml.amount_residual_currency
+                           END
+                       ) FILTER (WHERE acc.account_type IN ('asset_receivable', 'liability_payable')), 0.0)) AS residual,
+                       COALESCE(bool_or(acc.account_type = 'liability_payable' AND NOT aml.reconciled), FALSE)
+                           AS has_payable
+                  FROM account_move m
+                  JOIN res_company comp ON comp.id = m.company_id
+             LEFT JOIN account_move_line aml ON aml.move_id = m.id
+             LEFT JOIN account_account acc ON acc.id = aml.account_id
+                 WHERE m.id IN %s
+              GROUP BY m.id, comp.id
+                """,
+                (tuple(move_ids),),
+            )
+            moves = {row["id"]: row for row in self.env.cr.dictfetchall()}
+
+        contracts = {}
+        if contract_ids:
+            self.env.cr.execute(
+                """
+                SELECT c.id, c.name, c.state, c.company_id, p.commercial_partner_id,
+                       COALESCE(c.precio_ref, 0.0) AS precio_ref,
+                       COALESCE(c.tn_disponibles, 0.0) AS tn_disponibles
+                  FROM grain_canje_contract c
+                  JOIN res_partner p ON p.id = c.supplier_id
+                 WHERE c.id IN %s
+                """,
+                (tuple(contract_ids),),
+            )
+            contracts = {row["id"]: row for row in self.env.cr.dictfetchall()}
+        return moves, contracts
+
+    @api.model
+    def _canje_simulate(self, pairs):
+        """Evalúa sin escribir si cada par factura/contrato puede aplicarse.
+
+        ``pairs`` es una lista de dicts ``{"move_id", "contract_id", "tn"}``
+        (ids); sin ``contract_id`` se evalúa la asignación automática entre los
+        contratos vigentes del proveedor y sin ``tn`` se toma lo que cubra el
+        saldo; con ``contract_id`` las TN son obligatorias, como al aplicar.
+        Aplica las mismas validaciones que ``_canje_check_group``, con las TN
+        y saldos consumidos en orden por los pares anteriores. La asignación
+        automática es la misma de la aplicación (``_canje_allocate``, que sólo
+        lee), así la simulación informa lo que realmente se aplicaría.
+
+        Devuelve una lista, en el orden de ``pairs``, de dicts ``{"move_id",
+        "contract_id", "tn", "amount", "ok", "errors"}``.
+        """
+        moves, contracts = self._canje_simulate_load(
+            {pair["move_id"] for pair in pairs},
+            {pair["contract_id"] for pair in pairs if pair.get("contract_id")},
+        )
+        Contract = self.env["grain.canje.contract"]
+        currencies = self.env["res.currency"].browse({m["currency_id"] for m in moves.values()})
+        currencies = {currency.id: currency for currency in currencies}
+
+        residuals = {move_id: move["residual"] for move_id, move in moves.items()}
+        remaining_tn = {contract_id: c["tn_disponibles"] for contract_id, c in contracts.items()}
+        # TN tomadas por contrato en los pares factibles anteriores (como ``consumed`` al aplicar)
+        consumed = {}
+
+        # Mismo orden que el wizard masivo: primero contratos explícitos, después automáticos
+        order = sorted(range(len(pairs)), key=lambda i: not pairs[i].get("contract_id"))
+        results = [None] * len(pairs)
+        for index in order:
+            pair = pairs[index]
+            move = moves.get(pair["move_id"])
+            contract = contracts.get(pair.get("contract_id"))
+            tn = pair.get("tn") or 0.0
+            result = {
+                "move_id": pair["move_id"],
+                "contract_id": pair.get("contract_id") or False,
+                "tn": 0.0,
+                "amount": 0.0,
+                "ok": False,
+                "errors": [],
+            }
+            results[index] = result
+            errors = result["errors"]
+
+            if not move:
+                errors.append(_("La factura no existe."))
+                continue
+            if move["move_type"] != "in_invoice" or move["state"] != "posted":
+                errors.append(_("La factura debe estar publicada para aplicar el canje."))
+            if not move["configured"]:
+                errors.append(_("Configurar diario y cuenta de canje en Ajustes → Contabilidad."))
+            if not move["has_payable"]:
+                errors.append(_("No se encontró una línea de proveedor pendiente de conciliar en la factura."))
+
+            currency = currencies[move["currency_id"]]
+            residual = residuals[move["id"]]
+            if pair.get("contract_id"):
+                if not contract:
+                    errors.append(_("El contrato no existe."))
+                    continue
+                if contract["state"] != "open" or contract["company_id"] != move["company_id"]:
+                    errors.append(_("El contrato %s no está vigente para la compañía de la factura.") % contract["name"])
+                if contract["commercial_partner_id"] != move["commercial_partner_id"]:
+                    errors.append(_("El contrato %s no corresponde al proveedor de la factura.") % contract["name"])
+                available = remaining_tn[contract["id"]]
+                # Igual que la aplicación: con contrato explícito las TN son obligatorias
+                if tn <= 0.0:
+                    errors.append(_("Falta indicar las TN a aplicar."))
+                elif tn > available + 1e-6:
+                    errors.append(_("Las TN a aplicar superan las disponibles en el contrato %s.") % contract["name"])
+                amount = currency.round(tn * contract["precio_ref"])
+            else:
+                # Misma asignación FIFO que la aplicación, sobre lo que dejaron los pares anteriores
+                allocations = self._canje_allocate(
+                    self.env["account.move"].browse(move["id"]),
+                    tn_max=tn,
+                    consumed=dict(consumed),
+                    allocated_amount=move["residual"] - residual,
+                )
+                tn = float_round(sum(alloc["tn"] for alloc in allocations), precision_digits=3)
+                if tn <= 0.0:
+                    errors.append(_("No hay contratos vigentes con TN disponibles para el proveedor."))
+                    continue
+                amount = currency.round(sum(alloc["tn"] * alloc["contract"].precio_ref for alloc in allocations))
+
+            if amount <= 0.0 and not errors:
+                errors.append(_("El monto equivalente debe ser mayor que cero."))
+            if amount > residual + 0.01:
+                errors.append(
+                    _("No podés aplicar más que el saldo pendiente de la factura (saldo: %(saldo).2f %(moneda)s).")
+                    % {"saldo": residual, "moneda": currency.name}
+                )
+
+            result.update(tn=tn, amount=amount)
+            if errors:
+                continue
+
+            # Par factible: consume saldo de la factura y TN del contrato / proveedor
+            result["ok"] = True
+            residuals[move["id"]] -= amount
+            if contract:
+                allocations = [{"contract": Contract.browse(contract["id"]), "tn": tn}]
+            for alloc in allocations:
+                consumed[alloc["contract"]] = consumed.get(alloc["contract"], 0.0) + alloc["tn"]
+                if alloc["contract"].id in remaining_tn:
+                    remaining_tn[alloc["contract"].id] -= alloc["tn"]
+        return results
+
+    # ------------------------------
+    # ASIGNACIÓN AUTOMÁTICA (FIFO)
+    # ------------------------------
+
+    @api.model
+    def _canje_allocate(self, move, tn_max=0.0, consumed=None, allocated_amount=0.0):
+        """Reparte el saldo de la factura entre los contratos vigentes del proveedor.
+
+        Recorre los contratos en el orden configurado en la compañía y toma de
+        cada uno lo que permita su disponibilidad, hasta cubrir el saldo de la
+        factura (o ``tn_max`` TN si se indica). ``consumed`` lleva las TN ya
+        asignadas por contrato dentro del mismo lote y ``allocated_amount`` el
+        importe de la factura ya asignado explícitamente en el lote.
+
+        Devuelve una lista de dicts ``{"move", "contract", "tn"}``.
+        """
+        consumed = consumed if consumed is not None else {}
+        remaining_amount = self._canje_invoice_residual(move) - allocated_amount
+        remaining_tn = tn_max or 0.0
+
+        allocations = []
+        available_contracts = self.env["grain.canje.contract"]._canje_available_contracts(
+            move.commercial_partner_id, move.company_id
+        )
+        for contract, tn_disponibles in available_contracts:
+            if remaining_amount < 0.01 or (tn_max and remaining_tn <= 0.0):
+                break
+            tn = min(
+                tn_disponibles - consumed.get(contract, 0.0),
+                remaining_amount / contract.precio_ref,
+            )
+            if tn_max:
+                tn = min(tn, remaining_tn)
+            tn = float_round(tn, precision_digits=3, rounding_method="DOWN")
+            if tn <= 0.0:
+                continue
+
+            allocations.append({"move": move, "contract": contract, "tn": tn})
+            consumed[contract] = consumed.get(contract, 0.0) + tn
+            remaining_amount -= tn * contract.precio_ref
+            remaining_tn -= tn
+        return allocations
+
+    # ------------------------------
+    # ASIENTOS
+    # ------------------------------
+
+    @api.model
+    def _canje_company_amounts(self, group):
+        """Cotización de la factura e importe en moneda de la compañía de cada línea del grupo.
+
+        Guarda ``rate`` y ``amounts_company`` (en el orden de ``lines``) en el
+        grupo: el asiento de canje y las aplicaciones usan los mismos importes.
+        """
+        if "amounts_company" not in group:
+            move = group["move"]
+            company = move.company_id
+            date = move.invoice_date or fields.Date.context_today(self)
+            rate = move.currency_id._canje_convert(1.0, company.currency_id, company, date, round=False)
+            group["rate"] = rate
+            group["amounts_company"] = [
+                company.currency_id.round(amount * rate) for _contract, _tn, amount in group["lines"]
+            ]
+        return group["amounts_company"]
+
+    @api.model
+    def _canje_prepare_move_vals(self, group):
+        """Asiento de canje de una factura: un Debe al proveedor y un Haber por productor."""
+        move = group["move"]
+        currency = move.currency_id
+        date = move.invoice_date or fields.Date.context_today(self)
+        amounts_company = self._canje_company_amounts(group)
+
+        by_producer = {}
+        for (contract, _tn, amount), amount_company_cur in zip(group["lines"], amounts_company):
+            total, total_company_cur = by_producer.get(contract.producer_id, (0.0, 0.0))
+            by_producer[contract.producer_id] = (total + amount, total_company_cur + amount_company_cur)
+
+        credit_lines = []
+        total_company_cur = 0.0
+        for producer, (amount, amount_company_cur) in by_producer.items():
+            total_company_cur += amount_company_cur
+            # Haber: Cta Cte Cereal Productor (deuda con productor)
+            credit_lines.append((0, 0, {
+                "account_id": group["account"].id,
+                "partner_id": producer.id,
+                "debit": 0.0,
+                "credit": amount_company_cur,
+                "currency_id": currency.id,
+                "amount_currency": -amount,
+            }))
+
+        # Debe: cuenta proveedor (reduce deuda)
+        debit_line = (0, 0, {
+            "account_id": group["vendor_lines"][0].account_id.id,
+            "partner_id": move.partner_id.id,
+            "debit": total_company_cur,
+            "credit": 0.0,
+            "currency_id": currency.id,
+            "amount_currency": group["amount_total"],
+        })
+
+        contract_names = ", ".join(dict.fromkeys(contract.name for contract, _tn, _amount in group["lines"]))
+        return {
+            "move_type": "entry",
+            "date": date,
+            "journal_id": group["journal"].id,
+            "ref": _("Canje %s aplicado a %s") % (contract_names, move.name),
+            "line_ids": [debit_line] + credit_lines,
+        }
+
+    @api.model
+    def _canje_message_body(self, group):
+        currency = group["move"].currency_id
+        body = _("Aplicación de canje de granos:")
+        for contract, tn, amount in group["lines"]:
+            body += _(
+                "\n- Contrato: %(contract)s"
+                "\n- TN aplicadas: %(tn).2f"
+                "\n- Monto equivalente: %(amount).2f %(currency)s"
+            ) % {
+                "contract": contract.name,
+                "tn": tn,
+                "amount": amount,
+                "currency": currency.name,
+            }
+        return body
+
+    # ------------------------------
+    # APLICACIÓN EN LOTE
+    # ------------------------------
+
+    @api.model
+    def _canje_apply_batch(self, allocations):
+        """Aplica canje a varias facturas en una sola transacción.
+
+        ``allocations`` es una lista de dicts ``{"move", "contract", "tn"}``;
+        puede haber varias asignaciones por factura (una por contrato). Se crea
+        un asiento de canje por factura y todas las aplicaciones, asientos y
+        publicaciones se hacen en llamadas ORM agrupadas.
+
+        Devuelve ``(aplicaciones, errores)`` donde ``errores`` es un dict
+        ``{move_id: mensaje}`` con las facturas que no pasaron la validación
+        o cuyos contratos están bloqueados por otra transacción; esas facturas
+        se omiten sin abortar el resto del lote.
+        """
+        groups = {}
+        for alloc in allocations:
+            groups.setdefault(alloc["move"], []).append(alloc)
+
+        # Reservar las TN de los contratos involucrados antes de validar
+        contracts = self.env["grain.canje.contract"].browse(
+            list(dict.fromkeys(alloc["contract"].id for alloc in allocations))
+        )
+        # Disponibilidad leída de las filas bloqueadas (no del caché ni de la foto anterior)
+        remaining_tn = contracts._canje_reserve()
+        busy = contracts.filtered(lambda c: c not in remaining_tn)
+
+        errors = {}
+        prepared = []
+        for move, move_allocations in groups.items():
+            busy_names = [alloc["contract"].name for alloc in move_allocations if alloc["contract"] in busy]
+            if busy_names:
+                errors[move.id] = _(
+                    "El contrato %s está siendo aplicado por otro usuario; reintentá en unos segundos."
+                ) % ", ".join(busy_names)
+                continue
+            try:
+                prepared.append(self._canje_check_group(move, move_allocations, remaining_tn))
+            except UserError as e:
+                errors[move.id] = e.args[0]
+
+        if not prepared:
+            return self.browse(), errors
+
+        # Cotizaciones del rango de fechas del lote, en una consulta por compañía
+        today = fields.Date.context_today(self)
+        for company in self.env["res.company"].union(*(group["move"].company_id for group in prepared)):
+            company_groups = [group for group in prepared if group["move"].company_id == company]
+            dates = [group["move"].invoice_date or today for group in company_groups]
+            currencies = self.env["res.currency"].union(*(group["move"].currency_id for group in company_groups))
+            (currencies | company.currency_id)._canje_prefetch_rates(company, min(dates), max(dates))
+
+        # 1) Asientos de canje (uno por factura)
+        canje_moves = self.env["account.move"].create(
+            [self._canje_prepare_move_vals(group) for group in prepared]
+        )
+        canje_moves.action_post()
+
+        # 2) Aplicaciones
+        application_vals = []
+        for group, canje_move in zip(prepared, canje_moves):
+            for (contract, tn, amount), amount_company in zip(group["lines"], group["amounts_company"]):
+                application_vals.append({
+                    "contract_id": contract.id,
+                    "move_id": group["move"].id,
+                    "canje_move_id": canje_move.id,
+                    "date": today,
+                    "tn_aplicadas": tn,
+                    "price_per_tn": contract.precio_ref,
+                    "amount": amount,
+                    "amount_company": amount_company,
+                    "currency_rate": group["rate"],
+                })
+        applications = self.create(application_vals)
+
+        # 3) Conciliar con las facturas (cada una con su canje) y dejar constancia en el chatter
+        line_sets = []
+        for group, canje_move in zip(prepared, canje_moves):
+            move = group["move"]
+            vendor_lines = group["vendor_lines"]
+            canje_vendor_lines = canje_move.line_ids.filtered(
+                lambda l: l.account_id == vendor_lines[0].account_id
+                and l.partner_id == move.partner_id
+            )
+            line_sets.append(vendor_lines + canje_vendor_lines)
+        self.env["account.move.line"]._grain_reconcile_batch(line_sets)
+        if in_bulk_mode(self):
+            applications._canje_post_digest()
+        else:
+            for group in prepared:
+                group["move"].message_post(body=self._canje_message_body(group))
+
+        return applications, errors
+
+    def _canje_post_digest(self):
+        """Modo masivo: un mensaje por contrato con el resumen del lote.
+
+        Reemplaza el mensaje por factura; lleva cantidades, totales y enlaces
+        a las facturas aplicadas.
+        """
+        by_contract = {}
+        for app in self:
+            by_contract.setdefault(app.contract_id, self.browse())
+            by_contract[app.contract_id] |= app
+        for contract, applications in by_contract.items():
+            moves = applications.move_id
+            body = _(
+                "Aplicación de canje en lote: %(count)s facturas, %(tn).2f TN, %(amount)s."
+            ) % {
+                "count": len(moves),
+                "tn": sum(applications.mapped("tn_aplicadas")),
+                "amount": contract.company_id.currency_id.format(sum(applications.mapped("amount_company"))),
+            }
+            body += "<br/>" + ", ".join(move._get_html_link() for move in moves[:DIGEST_MAX_LINKS])
+            if len(moves) > DIGEST_MAX_LINKS:
+                body += "<br/>" + _("(%s facturas más)") % (len(moves) - DIGEST_MAX_LINKS)
+            contract.message_post(body=body)
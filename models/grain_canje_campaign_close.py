@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+from odoo import fields, models, _
+from odoo.exceptions import UserError
+
+from .grain_bulk import bulk_mode
+
+
+class GrainCanjeCampaignSnapshot(models.Model):
+    _name = "grain.canje.campaign.snapshot"
+    _description = "Saldo de cierre de contrato por campaña"
+    _order = "campaign_id, contract_id"
+
+    campaign_id = fields.Many2one(
+        "grain.canje.campaign",
+        string="Campaña",
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete="cascade",
+    )
+    contract_id = fields.Many2one(
+        "grain.canje.contract",
+        string="Contrato",
+        required=True,
+        readonly=True,
+        ondelete="cascade",
+    )
+    company_id = fields.Many2one("res.company", string="Compañía", required=True, readonly=True)
+    date_close = fields.Datetime(string="Fecha de cierre", required=True, readonly=True)
+    producer_id = fields.Many2one("res.partner", string="Productor", readonly=True)
+    supplier_id = fields.Many2one("res.partner", string="Proveedor", readonly=True)
+    product_id = fields.Many2one("product.product", string="Grano", readonly=True)
+    currency_id = fields.Many2one(related="company_id.currency_id", readonly=True)
+
+    tn_pactadas = fields.Float(string="TN pactadas", digits=(16, 3), readonly=True)
+    tn_mrv = fields.Float(string="TN desde MRV", digits=(16, 3), readonly=True)
+    tn_aplicadas = fields.Float(string="TN aplicadas", digits=(16, 3), readonly=True)
+    tn_disponibles = fields.Float(string="TN disponibles", digits=(16, 3), readonly=True)
+    amount_aplicado = fields.Monetary(string="Importe aplicado", currency_field="currency_id", readonly=True)
+    application_count = fields.Integer(string="Aplicaciones", readonly=True)
+
+
+class GrainCanjeCampaign(models.Model):
+    _inherit = "grain.canje.campaign"
+
+    date_closed = fields.Datetime(string="Cerrada el", readonly=True, copy=False)
+    snapshot_ids = fields.One2many(
+        "grain.canje.campaign.snapshot",
+        "campaign_id",
+        string="Saldos de cierre",
+        readonly=True,
+    )
+
+    def _close_snapshot(self, date_close):
+        """Calcula y guarda los saldos finales de los contratos a cerrar.
+
+        Una sola consulta agregada para toda la campaña: TN MRV (recepciones
+        realizadas menos devoluciones, convertidas como en ``_compute_tn_mrv``),
+        TN e importe aplicados, y disponibles con la misma regla que
+        ``_compute_tn_disponibles``. Sólo entran los contratos vigentes: los
+        borradores nunca se aplicaron y quedan como están. Devuelve los ids de
+        los contratos incluidos.
+        """
+        self.ensure_one()
+        self.env.flush_all()
+        self.env.cr.execute(
+            """
+            WITH contracts AS (
+                SELECT c.id, c.company_id, c.producer_id, c.supplier_id, c.product_id,
+                       COALESCE(c.tn_pactadas, 0.0) AS tn_pactadas, pt.uom_id
+                  FROM grain_canje_contract c
+                  JOIN product_product pp ON pp.id = c.product_id
+                  JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                 WHERE c.campaign_id = %(campaign_id)s
+                   AND c.state = 'open'
+            ),
+            mrv AS (
+                -- Misma conversión que _compute_tn_mrv: UoM del movimiento -> UoM del grano del contrato
+                SELECT rel.contract_id,
+                       SUM(CASE WHEN sm.origin_returned_move_id IS NOT NULL THEN -1 ELSE 1 END
+                           * CASE WHEN sm.product_uom = c.uom_id THEN sm.product_uom_qty
+                                  ELSE sm.product_uom_qty / from_uom.factor * to_uom.factor
+                             END) AS tn
+                  FROM grain_canje_contract_move_rel rel
+                  JOIN contracts c ON c.id = rel.contract_id
+                  JOIN stock_move sm ON sm.id = rel.move_id
+                  JOIN uom_uom from_uom ON from_uom.id = sm.product_uom
+                  JOIN uom_uom to_uom ON to_uom.id = c.uom_id
+                 WHERE sm.state = 'done'
+              GROUP BY rel.contract_id
+            ),
+            apps AS (
+                SELECT app.contract_id,
+                       SUM(app.tn_aplicadas) AS tn,
+                       SUM(COALESCE(app.amount_company, 0.0)) AS amount,
+                       COUNT(*) AS count
+                  FROM grain_canje_application app
+                  JOIN contracts c ON c.id = app.contract_id
+              GROUP BY app.contract_id
+            ),
+            final AS (
+                SELECT c.id, c.company_id, c.producer_id, c.supplier_id, c.product_id, c.tn_pactadas,
+                       ROUND(COALESCE(mrv.tn, 0.0)::numeric, 3) AS tn_mrv,
+                       ROUND(COALESCE(apps.tn, 0.0)::numeric, 3) AS tn_aplicadas,
+                       COALESCE(apps.amount, 0.0) AS amount,
+                       COALESCE(apps.count, 0) AS count
+                  FROM contracts c
+             LEFT JOIN mrv ON mrv.contract_id = c.id
+             LEFT JOIN apps ON apps.contract_id = c.id
+            )
+            INSERT INTO grain_canje_campaign_snapshot (
+                campaign_id, contract_id, company_id, date_close, producer_id, supplier_id, product_id,
+                tn_pactadas, tn_mrv, tn_aplicadas, tn_disponibles, amount_aplicado, application_count,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT %(campaign_id)s, id, company_id, %(date_close)s, producer_id, supplier_id, product_id,
+                   tn_pactadas, tn_mrv, tn_aplicadas,
+                   ROUND((CASE WHEN tn_pactadas != 0.0 THEN tn_pactadas::numeric ELSE tn_mrv END) - tn_aplicadas, 3),
+                   amount, count,
+                   %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+              FROM final
+         RETURNING id
+            """,
+            {"campaign_id": self.id, "date_close": date_close, "uid": self.env.uid},
+        )
+        snapshot_ids = [row[0] for row in self.env.cr.fetchall()]
+        if not snapshot_ids:
+            return []
+
+        # Los campos almacenados del contrato quedan iguales al saldo de cierre
+        self.env.cr.execute(
+            """
+            UPDATE grain_canje_contract c
+               SET tn_mrv = s.tn_mrv,
+                   tn_aplicadas = s.tn_aplicadas,
+                   tn_disponibles = s.tn_disponibles
+              FROM grain_canje_campaign_snapshot s
+             WHERE s.id IN %s
+               AND c.id = s.contract_id
+         RETURNING c.id
+            """,
+            (tuple(snapshot_ids),),
+        )
+        contract_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env["grain.canje.contract"].invalidate_model(["tn_mrv", "tn_aplicadas", "tn_disponibles"])
+        self.env["grain.canje.campaign.snapshot"].invalidate_model()
+        return contract_ids
+
+    def action_close_campaign(self):
+        """Cierra la campaña: saldos de cierre, contratos a ``done`` y un solo mensaje."""
+        for campaign in self:
+            if campaign.state == "closed":
+                raise UserError(_("La campaña %s ya está cerrada.") % campaign.display_name)
+
+            date_close = fields.Datetime.now()
+            pending = self.env["grain.canje.contract"].search([
+                ("campaign_id", "=", campaign.id), ("state", "=", "open"),
+            ])
+            # Saldos previos del libro (no del campo): la diferencia también corrige un desvío acumulado
+            before = pending._ledger_available_at()
+            contracts = pending.browse(campaign._close_snapshot(date_close) if pending else [])
+
+            # Una sola escritura para todos los contratos, sin seguimiento por registro
+            bulk_mode(contracts).write({"state": "done"})
+            self.env["grain.canje.ledger"]._append([
+                {
+                    "contract": contract,
+                    "kind": "adjustment",
+                    "tn": contract.tn_disponibles - before.get(contract.id, 0.0),
+                    "note": _("Cierre de campaña"),
+                }
+                for contract in contracts
+            ])
+
+            campaign.with_context(tracking_disable=True).write({"state": "closed", "date_closed": date_close})
+            campaign.message_post(body=campaign._close_message_body(date_close))
+        return True
+
+    def _close_message_body(self, date_close):
+        self.ensure_one()
+        groups = self.env["grain.canje.campaign.snapshot"].read_group(
+            [("campaign_id", "=", self.id), ("date_close", "=", date_close)],
+            ["tn_pactadas:sum", "tn_mrv:sum", "tn_aplicadas:sum", "tn_disponibles:sum", "amount_aplicado:sum"],
+            [],
+        )
+        totals = groups[0] if groups else {}
+        return _(
+            "Campaña cerrada. Contratos cerrados: %(count)s.<br/>"
+            "TN pactadas: %(pactadas).3f · TN MRV: %(mrv).3f · TN aplicadas: %(aplicadas).3f · "
+            "TN disponibles: %(disponibles).3f<br/>Importe aplicado: %(amount)s"
+        ) % {
+            "count": totals.get("__count", 0),
+            "pactadas": totals.get("tn_pactadas") or 0.0,
+            "mrv": totals.get("tn_mrv") or 0.0,
+            "aplicadas": totals.get("tn_aplicadas") or 0.0,
+            "disponibles": totals.get("tn_disponibles") or 0.0,
+            "amount": self.currency_id.format(totals.get("amount_aplicado") or 0.0),
+        }
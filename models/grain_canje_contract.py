@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
-from odoo import api, fields, models
+from psycopg2 import errors as pg_errors
+
+from odoo import api, fields, models, tools
 from odoo.tools.float_utils import float_round
 
 
 class GrainCanjeCampaign(models.Model):
     _name = "grain.canje.campaign"
     _description = "Campaña de canje de granos"
+    _inherit = ["mail.thread"]
 
-    name = fields.Char(string="Nombre campaña", required=True)
+    name = fields.Char(string="Nombre campaña", required=True, tracking=True)
     date_start = fields.Date(string="Desde")
     date_end = fields.Date(string="Hasta")
     company_id = fields.Many2one(
@@ -16,6 +19,16 @@ class GrainCanjeCampaign(models.Model):
         default=lambda self: self.env.company,
         required=True,
     )
+    state = fields.Selection(
+        [
+            ("open", "Abierta"),
+            ("closed", "Cerrada"),
+        ],
+        string="Estado",
+        default="open",
+        required=True,
+        tracking=True,
+    )
 
 
 class GrainCanjeContract(models.Model):
@@ -44,6 +57,7 @@ class GrainCanjeContract(models.Model):
         "grain.canje.campaign",
         string="Campaña",
         tracking=True,
+        index=True,
     )
 
     producer_id = fields.Many2one(
@@ -100,6 +114,12 @@ class GrainCanjeContract(models.Model):
         string="Precio referencia por TN",
         tracking=True,
     )
+    priority = fields.Integer(
+        string="Prioridad de aplicación",
+        default=10,
+        help="Orden de consumo en la asignación automática (menor primero), "
+             "si la compañía asigna por prioridad.",
+    )
 
     state = fields.Selection(
         [
@@ -126,29 +146,105 @@ class GrainCanjeContract(models.Model):
         )
     ]
 
-    @api.depends("stock_move_ids", "stock_move_ids.product_uom_qty")
+    def init(self):
+        # Contratos vigentes de un proveedor (wizard de aplicación / asignación automática)
+        tools.create_index(
+            self._cr,
+            "grain_canje_contract_supplier_state_company_idx",
+            self._table,
+            ["supplier_id", "state", "company_id"],
+        )
+        # Vinculación automática de recepciones MRV (stock.move realizado → contrato)
+        tools.create_index(
+            self._cr,
+            "grain_canje_contract_product_state_company_idx",
+            self._table,
+            ["product_id", "state", "company_id"],
+        )
+
+    @api.depends("product_id", "stock_move_ids")
     def _compute_tn_mrv(self):
-        """Suma de TN desde movimientos de stock vinculados (MRV)."""
+        """Suma de TN desde movimientos de stock vinculados (MRV).
+
+        Sólo cuentan los movimientos realizados; las devoluciones restan. Una
+        consulta agrupada por contrato y UoM para todo el lote; la conversión
+        a la UoM del producto del contrato se hace con un factor por par de UoM.
+
+        Los movimientos que se realizan después de vinculados no pasan por
+        acá: ``stock.move._action_done`` aplica sólo la diferencia, y
+        ``stock.move.write`` la de una corrección de cantidad o UoM de un
+        movimiento realizado. Los cancelados nunca estuvieron realizados.
+        """
+        stored = self.filtered("id")
+        qty_by_contract_uom = {}
+        if stored:
+            self.env["stock.move"].flush_model([
+                "product_uom_qty", "product_uom", "state", "origin_returned_move_id",
+            ])
+            stored.flush_recordset(["stock_move_ids"])
+            self.env.cr.execute(
+                """
+                SELECT rel.contract_id,
+                       sm.product_uom,
+                       SUM(CASE WHEN sm.origin_returned_move_id IS NOT NULL THEN -sm.product_uom_qty
+                                ELSE sm.product_uom_qty
+                           END)
+                  FROM grain_canje_contract_move_rel rel
+                  JOIN stock_move sm ON sm.id = rel.move_id
+                 WHERE rel.contract_id IN %s
+                   AND sm.state = 'done'
+              GROUP BY rel.contract_id, sm.product_uom
+                """,
+                (tuple(stored.ids),),
+            )
+            for contract_id, uom_id, qty in self.env.cr.fetchall():
+                qty_by_contract_uom.setdefault(contract_id, []).append((uom_id, qty))
+
+        Uom = self.env["uom.uom"]
+        uom_factors = {}
+
+        def convert(qty, from_uom_id, to_uom):
+            # Convertir a la UoM del producto del contrato si aplica
+            if not from_uom_id or not to_uom or from_uom_id == to_uom.id:
+                return qty
+            key = (from_uom_id, to_uom.id)
+            if key not in uom_factors:
+                uom_factors[key] = Uom.browse(from_uom_id)._compute_quantity(1.0, to_uom, round=False)
+            return qty * uom_factors[key]
+
         for contract in self:
-            total = 0.0
-            for move in contract.stock_move_ids:
-                qty = move.product_uom_qty
-                # Convertir a la UoM del producto del contrato si aplica
-                if contract.product_id and move.product_uom and contract.product_id.uom_id:
-                    qty = move.product_uom._compute_quantity(
-                        move.product_uom_qty,
-                        contract.product_id.uom_id,
-                    )
-                total += qty
+            to_uom = contract.product_id.uom_id
+            if contract.id:
+                rows = qty_by_contract_uom.get(contract.id, [])
+            else:
+                # Registro nuevo (onchange): todavía no está en la base
+                rows = [
+                    (move.product_uom.id, -move.product_uom_qty if move.origin_returned_move_id else move.product_uom_qty)
+                    for move in contract.stock_move_ids
+                    if move.state == "done"
+                ]
+            total = sum(convert(qty, uom_id, to_uom) for uom_id, qty in rows)
             contract.tn_mrv = float_round(total, precision_digits=3)
 
     @api.depends("application_ids", "application_ids.tn_aplicadas")
     def _compute_tn_aplicadas(self):
-        for contract in self:
-            contract.tn_aplicadas = float_round(
-                sum(contract.application_ids.mapped("tn_aplicadas")),
-                precision_digits=3,
+        """Suma de TN aplicadas: un read_group agrupado por contrato para todo el lote."""
+        stored = self.filtered("id")
+        totals = {}
+        if stored:
+            groups = self.env["grain.canje.application"].read_group(
+                [("contract_id", "in", stored.ids)],
+                ["contract_id", "tn_aplicadas:sum"],
+                ["contract_id"],
             )
+            totals = {group["contract_id"][0]: group["tn_aplicadas"] for group in groups}
+
+        for contract in self:
+            if contract.id:
+                total = totals.get(contract.id, 0.0)
+            else:
+                total = sum(contract.application_ids.mapped("tn_aplicadas"))
+            contract.tn_aplicadas = float_round(total, precision_digits=3)
 
     @api.depends("tn_pactadas", "tn_mrv", "tn_aplicadas")
     def _compute_tn_disponibles(self):
@@ -160,6 +256,86 @@ class GrainCanjeContract(models.Model):
                 precision_digits=3,
             )
 
+    @api.model
+    def _canje_available_contracts(self, supplier, company, order=None):
+        """Contratos vigentes del proveedor con TN disponibles, en orden de consumo.
+
+        Una sola consulta sobre la tabla de contratos (sin leer ``tn_disponibles``
+        contrato por contrato). Devuelve una lista de ``(contrato, tn_disponibles)``.
+        """
+        order = order or company.canje_allocation_order or "date"
+        order_by = {
+            "date": "c.date, c.id",
+            "campaign": "camp.date_start NULLS LAST, c.date, c.id",
+            "priority": "c.priority, c.date, c.id",
+        }[order]
+
+        self.flush_model([
+            "state", "company_id", "supplier_id", "tn_disponibles",
+            "precio_ref", "date", "priority", "campaign_id",
+        ])
+        self.env["grain.canje.campaign"].flush_model(["date_start"])
+        self.env["res.partner"].flush_model(["commercial_partner_id"])
+        self.env.cr.execute(
+            """
+            SELECT c.id, c.tn_disponibles
+              FROM grain_canje_contract c
+              JOIN res_partner p ON p.id = c.supplier_id
+         LEFT JOIN grain_canje_campaign camp ON camp.id = c.campaign_id
+             WHERE c.state = 'open'
+               AND c.company_id = %%s
+               AND p.commercial_partner_id = %%s
+               AND c.tn_disponibles > 0.0005
+               AND c.precio_ref > 0
+          ORDER BY %s
+            """ % order_by,
+            (company.id, supplier.commercial_partner_id.id),
+        )
+        return [(self.browse(contract_id), tn) for contract_id, tn in self.env.cr.fetchall()]
+
+    def _canje_reserve(self):
+        """Bloquea los contratos para reservar sus TN disponibles.
+
+        ``FOR NO KEY UPDATE SKIP LOCKED``: las aplicaciones sobre contratos
+        distintos corren en paralelo, y los contratos que otra transacción está
+        aplicando en este momento se devuelven como no reservados en lugar de
+        esperar el lock. La disponibilidad se lee de la misma fila bloqueada:
+        si el bloqueo se obtiene, ninguna otra transacción la modificó después
+        de la foto de ésta, así dos aplicaciones concurrentes nunca sobregiran
+        el mismo contrato.
+
+        Si otra transacción ya confirmó un cambio sobre el contrato (REPEATABLE
+        READ lo informa como falla de serialización al bloquear), el contrato
+        se trata como ocupado en lugar de abortar y reintentar todo el pedido.
+
+        Devuelve ``{contract: tn_disponibles}`` de los contratos bloqueados.
+        """
+        if not self:
+            return {}
+        self.flush_recordset(["tn_disponibles"])
+        query = """
+            SELECT id, COALESCE(tn_disponibles, 0.0)
+              FROM grain_canje_contract
+             WHERE id IN %s
+          ORDER BY id
+               FOR NO KEY UPDATE SKIP LOCKED
+        """
+        rows = []
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute(query, (tuple(self.ids),))
+                rows = self.env.cr.fetchall()
+        except pg_errors.SerializationFailure:
+            # Aislar los contratos modificados por otra transacción
+            for contract in self:
+                try:
+                    with self.env.cr.savepoint(flush=False):
+                        self.env.cr.execute(query, ((contract.id,),))
+                        rows += self.env.cr.fetchall()
+                except pg_errors.SerializationFailure:
+                    continue
+        return {self.browse(contract_id): available for contract_id, available in rows}
+
     def action_open(self):
         self.write({"state": "open"})
 
@@ -187,6 +363,14 @@ class GrainCanjeApplication(models.Model):
         required=True,
         domain=[("move_type", "=", "in_invoice")],
         ondelete="cascade",
+        index=True,
+    )
+    canje_move_id = fields.Many2one(
+        "account.move",
+        string="Asiento de canje",
+        readonly=True,
+        copy=False,
+        index=True,
     )
     date = fields.Date(
         string="Fecha de aplicación",
@@ -196,6 +380,12 @@ class GrainCanjeApplication(models.Model):
         string="TN aplicadas",
         required=True,
     )
+    # Precio congelado al aplicar: cambiar el precio del contrato no reprecia el historial
+    price_per_tn = fields.Float(
+        string="Precio por TN",
+        readonly=True,
+        copy=False,
+    )
     amount = fields.Monetary(
         string="Monto equivalente",
         currency_field="currency_id",
@@ -208,34 +398,49 @@ class GrainCanjeApplication(models.Model):
         store=True,
         readonly=True,
     )
+    # Importe en moneda de la compañía, fijado al aplicar (los totales se suman sin convertir)
+    amount_company = fields.Monetary(
+        string="Monto (moneda compañía)",
+        currency_field="company_currency_id",
+        readonly=True,
+        copy=False,
+    )
+    currency_rate = fields.Float(
+        string="Cotización usada",
+        digits=(12, 6),
+        readonly=True,
+        copy=False,
+        help="Unidades de moneda de la compañía por unidad de moneda de la factura.",
+    )
+    company_currency_id = fields.Many2one(
+        "res.currency",
+        related="company_id.currency_id",
+        readonly=True,
+    )
 
-    # Campos para reportes / pivot
+    # Campos informativos del contrato (el pivot lee grain.canje.analysis)
     producer_id = fields.Many2one(
         "res.partner",
         string="Productor",
         related="contract_id.producer_id",
-        store=True,
         readonly=True,
     )
     supplier_id = fields.Many2one(
         "res.partner",
         string="Proveedor",
         related="contract_id.supplier_id",
-        store=True,
         readonly=True,
     )
     campaign_id = fields.Many2one(
         "grain.canje.campaign",
         string="Campaña",
         related="contract_id.campaign_id",
-        store=True,
         readonly=True,
     )
     product_id = fields.Many2one(
         "product.product",
         string="Grano",
         related="contract_id.product_id",
-        store=True,
         readonly=True,
     )
     company_id = fields.Many2one(
@@ -245,7 +450,148 @@ class GrainCanjeApplication(models.Model):
         readonly=True,
     )
 
-    @api.depends("tn_aplicadas", "contract_id.precio_ref")
+    def init(self):
+        # Aplicaciones de un contrato (one2many del contrato, totales por contrato)
+        tools.create_index(
+            self._cr,
+            "grain_canje_application_contract_date_idx",
+            self._table,
+            ["contract_id", "date"],
+        )
+        # Totales en moneda de la compañía por período
+        tools.create_index(
+            self._cr,
+            "grain_canje_application_company_date_idx",
+            self._table,
+            ["company_id", "date"],
+        )
+        # Aplicaciones anteriores al precio congelado: deducirlo del monto guardado
+        self._cr.execute(
+            """
+            UPDATE grain_canje_application app
+               SET price_per_tn = CASE WHEN app.tn_aplicadas != 0 THEN app.amount / app.tn_aplicadas
+                                       ELSE COALESCE(c.precio_ref, 0.0)
+                                  END
+              FROM grain_canje_contract c
+             WHERE c.id = app.contract_id
+               AND app.price_per_tn IS NULL
+            """
+        )
+        self._backfill_amount_company()
+
+    @api.depends("tn_aplicadas", "price_per_tn")
     def _compute_amount(self):
         for app in self:
-            app.amount = (app.tn_aplicadas or 0.0) * (app.contract_id.precio_ref or 0.0)
+            app.amount = (app.tn_aplicadas or 0.0) * (app.price_per_tn or 0.0)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        contracts = self.env["grain.canje.contract"].browse(
+            [vals["contract_id"] for vals in vals_list if "price_per_tn" not in vals and vals.get("contract_id")]
+        )
+        prices = {contract.id: contract.precio_ref for contract in contracts}
+        for vals in vals_list:
+            if "price_per_tn" not in vals and vals.get("contract_id"):
+                vals["price_per_tn"] = prices[vals["contract_id"]] or 0.0
+        applications = super().create(vals_list)
+        # Aplicaciones creadas fuera del motor de canje: convertir con la cotización de la factura
+        applications.filtered(lambda app: not app.currency_rate)._set_amount_company()
+        return applications
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {"tn_aplicadas", "price_per_tn"} & set(vals) and "amount_company" not in vals:
+            # Cambió el monto: se reconvierte con la cotización congelada al aplicar
+            for app in self.filtered("currency_rate"):
+                super(GrainCanjeApplication, app).write({
+                    "amount_company": app.company_id.currency_id.round(app.amount * app.currency_rate),
+                })
+            self.filtered(lambda app: not app.currency_rate)._set_amount_company()
+        return res
+
+    def _set_amount_company(self):
+        today = fields.Date.context_today(self)
+        for app in self:
+            company = app.company_id
+            rate = app.currency_id._canje_convert(
+                1.0, company.currency_id, company, app.move_id.invoice_date or app.date or today, round=False
+            ) if app.currency_id else 1.0
+            app.write({
+                "currency_rate": rate,
+                "amount_company": company.currency_id.round(app.amount * rate),
+            })
+
+    @api.model
+    def _rate_lateral(self, alias, currency, company, date):
+        """Última cotización de ``currency`` a ``date`` (misma regla que res.currency._get_rates)."""
+        return """
+            LEFT JOIN LATERAL (
+                SELECT r.rate
+                  FROM res_currency_rate r
+                 WHERE r.currency_id = {currency}
+                   AND (r.company_id = {company} OR r.company_id IS NULL)
+                   AND r.name <= {date}
+              ORDER BY r.company_id, r.name DESC
+                 LIMIT 1
+            ) {alias} ON TRUE
+        """.format(alias=alias, currency=currency, company=company, date=date)
+
+    @api.model
+    def _backfill_amount_company(self, batch_size=10000):
+        """Completa ``amount_company`` / ``currency_rate`` de las aplicaciones que no lo tienen.
+
+        UPDATE por lotes de ``batch_size`` filas, con la cotización a la fecha
+        de la factura (o de la aplicación). Devuelve la cantidad de filas.
+        """
+        cr = self.env.cr
+        total = 0
+        last_id = 0
+        while True:
+            # Se pagina por id: las filas sin cotización quedan atrás y no cortan el recorrido
+            cr.execute(
+                """
+                SELECT id FROM grain_canje_application
+                 WHERE amount_company IS NULL AND id > %s
+              ORDER BY id
+                 LIMIT %s
+                """,
+                (last_id, batch_size),
+            )
+            ids = [row[0] for row in cr.fetchall()]
+            if not ids:
+                break
+            last_id = ids[-1]
+            cr.execute(
+                """
+                UPDATE grain_canje_application app
+                   SET currency_rate = v.rate,
+                       amount_company = ROUND((COALESCE(app.amount, 0.0) * v.rate)::numeric, cur.decimal_places)
+                  FROM (
+                        SELECT a.id,
+                               comp.currency_id,
+                               CASE WHEN a.currency_id IS NULL OR a.currency_id = comp.currency_id THEN 1.0
+                                    ELSE COALESCE(comp_rate.rate, 1.0) / COALESCE(app_rate.rate, 1.0)
+                               END AS rate
+                          FROM grain_canje_application a
+                          JOIN res_company comp ON comp.id = a.company_id
+                          JOIN account_move inv ON inv.id = a.move_id
+                          {app_rate}
+                          {comp_rate}
+                         WHERE a.id IN %s
+                  ) v
+                  JOIN res_currency cur ON cur.id = v.currency_id
+                 WHERE app.id = v.id
+                """.format(
+                    app_rate=self._rate_lateral(
+                        "app_rate", "a.currency_id", "a.company_id", "COALESCE(inv.invoice_date, a.date)"
+                    ),
+                    comp_rate=self._rate_lateral(
+                        "comp_rate", "comp.currency_id", "a.company_id", "COALESCE(inv.invoice_date, a.date)"
+                    ),
+                ),
+                (tuple(ids),),
+            )
+            total += cr.rowcount
+        if total:
+            self.invalidate_model(["amount_company", "currency_rate"])
+        return total
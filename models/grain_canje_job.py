@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from itertools import islice
+
+from psycopg2 import errors as pg_errors
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+from .grain_bulk import bulk_mode
+
+_logger = logging.getLogger(__name__)
+
+# Ítems por lote según el tipo de trabajo
+CHUNK_SIZES = {
+    "canje_apply": 50,
+    "lpg_post": 200,
+    "netting": 20,
+    "recompute": 500,
+}
+
+
+class GrainCanjeJob(models.Model):
+    _name = "grain.canje.job"
+    _description = "Trabajo en segundo plano (canje / LPG / compensación)"
+    _inherit = ["mail.thread"]
+    _order = "id desc"
+
+    name = fields.Char(string="Descripción", required=True, readonly=True)
+    job_type = fields.Selection(
+        [
+            ("canje_apply", "Aplicación masiva de canje"),
+            ("lpg_post", "Publicación de LPG"),
+            ("netting", "Compensación automática"),
+            ("recompute", "Recálculo de toneladas"),
+            ("lpg_import", "Importación de LPG"),
+        ],
+        string="Tipo",
+        required=True,
+        readonly=True,
+    )
+    company_id = fields.Many2one("res.company", required=True, readonly=True, default=lambda self: self.env.company)
+    user_id = fields.Many2one("res.users", string="Solicitado por", required=True, readonly=True,
+                              default=lambda self: self.env.user)
+    params = fields.Json(string="Parámetros", readonly=True)
+    state = fields.Selection(
+        [
+            ("pending", "En cola"),
+            ("running", "En proceso"),
+            ("done", "Terminado"),
+            ("failed", "Con lotes fallidos"),
+        ],
+        default="pending",
+        required=True,
+        readonly=True,
+    )
+    date_start = fields.Datetime(string="Inicio", readonly=True)
+    date_done = fields.Datetime(string="Fin", readonly=True)
+
+    chunk_ids = fields.One2many("grain.canje.job.chunk", "job_id", string="Lotes", readonly=True)
+    items_total = fields.Integer(string="Ítems", readonly=True)
+    items_done = fields.Integer(string="Procesados", compute="_compute_progress")
+    items_failed = fields.Integer(string="Con error", compute="_compute_progress")
+    progress = fields.Float(string="Avance (%)", compute="_compute_progress")
+
+    @api.depends("chunk_ids.state", "chunk_ids.items_done", "chunk_ids.items_failed")
+    def _compute_progress(self):
+        data = {}
+        if self.ids:
+            for group in self.env["grain.canje.job.chunk"].read_group(
+                [("job_id", "in", self.ids)],
+                ["items_done:sum", "items_failed:sum"],
+                ["job_id"],
+            ):
+                data[group["job_id"][0]] = (group["items_done"], group["items_failed"])
+        for job in self:
+            done, failed = data.get(job.id, (0, 0))
+            job.items_done = done
+            job.items_failed = failed
+            job.progress = 100.0 * (done + failed) / job.items_total if job.items_total else 0.0
+
+    # ------------------------------
+    # ALTA
+    # ------------------------------
+
+    @api.model
+    def _enqueue(self, job_type, items, name, company=None, params=None, chunk_size=None):
+        """Crea un trabajo dividiendo ``items`` (valores JSON) en lotes y despierta al worker."""
+        if not items:
+            raise UserError(_("No hay nada para procesar."))
+        chunk_size = chunk_size or CHUNK_SIZES.get(job_type, 100)
+        return self._enqueue_chunks(
+            job_type,
+            (items[start:start + chunk_size] for start in range(0, len(items), chunk_size)),
+            name,
+            company=company,
+            params=params,
+        )
+
+    @api.model
+    def _enqueue_chunks(self, job_type, chunks, name, company=None, params=None):
+        """Crea un trabajo con los lotes ya armados de ``chunks`` (iterable de listas de ítems).
+
+        Los lotes se insertan de a tandas, así un origen grande (un archivo
+        de importación) no se carga entero en memoria. Los lotes son filas
+        internas de la cola: se crean con ``sudo()`` (el usuario sólo los lee).
+        """
+        Chunk = self.env["grain.canje.job.chunk"].sudo()
+        job = self.create({
+            "name": name,
+            "job_type": job_type,
+            "company_id": (company or self.env.company).id,
+            "params": params or {},
+        })
+        chunks = iter(chunks)
+        total = sequence = 0
+        while True:
+            batch = list(islice(chunks, 100))
+            if not batch:
+                break
+            Chunk.create([
+                {"job_id": job.id, "sequence": sequence + index, "items": items}
+                for index, items in enumerate(batch)
+            ])
+            Chunk.flush_model()
+            Chunk.invalidate_model(["items"])
+            sequence += len(batch)
+            total += sum(len(items) for items in batch)
+        if not total:
+            raise UserError(_("No hay nada para procesar."))
+        job.items_total = total
+        self.env.ref("grain_canje_triangular.ir_cron_grain_canje_job_worker")._trigger()
+        return job
+
+    def _action_open(self):
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Trabajo en segundo plano"),
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+        }
+
+    def action_retry(self):
+        """Vuelve a poner en cola los lotes fallidos."""
+        chunks = self.chunk_ids.filtered(lambda c: c.state == "failed")
+        chunks.sudo().write({"state": "pending", "items_done": 0, "items_failed": 0, "errors": {}})
+        self.filtered(lambda j: j.state == "failed").write({"state": "running", "date_done": False})
+        self.env.ref("grain_canje_triangular.ir_cron_grain_canje_job_worker")._trigger()
+        return True
+
+    # ------------------------------
+    # EJECUCIÓN DE UN LOTE
+    # ------------------------------
+
+    def _job_dispatch(self, items):
+        """Procesa los ítems de un lote; devuelve ``(procesados, {ítem: error})``."""
+        return getattr(self, "_job_run_%s" % self.job_type)(items)
+
+    def _job_run_canje_apply(self, items):
+        """Ítems ``{"move_id", "contract_id", "tn"}``; sin contrato = asignación automática."""
+        Application = self.env["grain.canje.application"]
+        Move = self.env["account.move"]
+        Contract = self.env["grain.canje.contract"]
+
+        allocations = []
+        consumed = {}
+        allocated = {}
+        auto = []
+        for item in items:
+            if item.get("contract_id"):
+                contract = Contract.browse(item["contract_id"])
+                allocations.append({"move": Move.browse(item["move_id"]), "contract": contract, "tn": item["tn"]})
+                consumed[contract] = consumed.get(contract, 0.0) + item["tn"]
+                allocated[item["move_id"]] = allocated.get(item["move_id"], 0.0) + item["tn"] * contract.precio_ref
+            else:
+                auto.append(item)
+        for item in auto:
+            move_allocations = Application._canje_allocate(
+                Move.browse(item["move_id"]),
+                tn_max=item.get("tn") or 0.0,
+                consumed=consumed,
+                allocated_amount=allocated.get(item["move_id"], 0.0),
+            )
+            for alloc in move_allocations:
+                amount = alloc["tn"] * alloc["contract"].precio_ref
+                allocated[item["move_id"]] = allocated.get(item["move_id"], 0.0) + amount
+            allocations += move_allocations
+
+        applications, errors = Application._canje_apply_batch(allocations)
+        for item in auto:
+            if item["move_id"] not in applications.move_id.ids and item["move_id"] not in errors:
+                errors[item["move_id"]] = _("No hay contratos vigentes con TN disponibles para el proveedor.")
+        moves = {item["move_id"] for item in items}
+        return len(moves - set(errors)), {
+            Move.browse(move_id).display_name: msg for move_id, msg in errors.items()
+        }
+
+    def _job_run_lpg_post(self, items):
+        liquidations = self.env["grain.liquidation"].browse(items)
+        errors = liquidations._post_batch()
+        return len(items) - len(errors), {
+            lpg.lpg_number or lpg.display_name: errors[lpg.id]
+            for lpg in liquidations.filtered(lambda l: l.id in errors)
+        }
+
+    def _job_run_netting(self, items):
+        self.env["grain.netting.engine"]._run(
+            self.company_id,
+            producers=self.env["res.partner"].browse(items),
+            strategy=(self.params or {}).get("strategy", "due_date"),
+        )
+        return len(items), {}
+
+    def _job_run_recompute(self, items):
+        self.env["grain.canje.contract"].browse(items).exists()._job_recompute_tonnage()
+        return len(items), {}
+
+    def _job_run_lpg_import(self, items):
+        """Ítems: filas ``{"row", <columnas>}`` de la importación ``params["import_id"]``."""
+        return self.env["grain.liquidation.import"].browse(self.params["import_id"])._import_rows(items)
+
+    # ------------------------------
+    # FINALIZACIÓN
+    # ------------------------------
+
+    def _mark_running(self):
+        """Pasa el trabajo a "en proceso" sin esperar al resto de los workers.
+
+        Si otro worker ya tiene la fila bloqueada (o la acaba de actualizar) lo
+        deja como está: ese worker hace la misma transición.
+        """
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute(
+                    """
+                    UPDATE grain_canje_job
+                       SET state = 'running', date_start = now() AT TIME ZONE 'UTC'
+                     WHERE id IN (
+                           SELECT id FROM grain_canje_job
+                            WHERE id = %s AND state = 'pending'
+                              FOR NO KEY UPDATE SKIP LOCKED
+                     )
+                    """,
+                    (self.id,),
+                )
+        except pg_errors.SerializationFailure:
+            pass
+        self.invalidate_recordset(["state", "date_start"])
+
+    def _check_done(self):
+        """Cierra el trabajo si ya no le quedan lotes en cola.
+
+        Se bloquea la fila del trabajo con SKIP LOCKED: si otro worker la
+        está cerrando, éste no hace nada.
+        """
+        self.ensure_one()
+        self.env.cr.execute(
+            """
+            SELECT j.id
+              FROM grain_canje_job j
+             WHERE j.id = %s
+               AND j.state IN ('pending', 'running')
+               AND NOT EXISTS (
+                   SELECT 1 FROM grain_canje_job_chunk c WHERE c.job_id = j.id AND c.state = 'pending'
+               )
+               FOR NO KEY UPDATE SKIP LOCKED
+            """,
+            (self.id,),
+        )
+        if not self.env.cr.fetchone():
+            return False
+
+        self.invalidate_recordset()
+        failed_chunks = self.chunk_ids.filtered(lambda c: c.state == "failed")
+        self.write({
+            "state": "failed" if failed_chunks else "done",
+            "date_done": fields.Datetime.now(),
+        })
+        self.message_post(body=self._digest_body())
+        return True
+
+    def _digest_body(self):
+        body = _(
+            "Procesados: %(done)s de %(total)s. Con error: %(failed)s."
+        ) % {
+            "done": self.items_done,
+            "total": self.items_total,
+            "failed": self.items_failed,
+        }
+        errors = []
+        for chunk in self.chunk_ids.filtered("errors"):
+            errors += ["%s: %s" % (key, msg) for key, msg in chunk.errors.items()]
+        if errors:
+            body += "<br/>" + "<br/>".join(errors[:50])
+            if len(errors) > 50:
+                body += "<br/>" + _("(%s errores más, ver lotes)") % (len(errors) - 50)
+        return body
+
+    # ------------------------------
+    # WORKER
+    # ------------------------------
+
+    @api.model
+    def _cron_process_chunks(self, time_limit=240, auto_commit=True):
+        """Worker: toma lotes en cola hasta agotar la cola o el tiempo.
+
+        Cada lote se reclama con ``FOR UPDATE SKIP LOCKED`` y se confirma con
+        su propio commit, así varios workers (crons duplicados o ejecuciones
+        superpuestas) pueden repartirse el mismo trabajo.
+        """
+        Chunk = self.env["grain.canje.job.chunk"]
+        started = time.time()
+        while time.time() - started < time_limit:
+            chunk = Chunk._claim()
+            if not chunk:
+                break
+            job = chunk.job_id
+            chunk._process()
+            if auto_commit:
+                self.env.cr.commit()
+            job._check_done()
+            if auto_commit:
+                self.env.cr.commit()
+
+
+class GrainCanjeJobChunk(models.Model):
+    _name = "grain.canje.job.chunk"
+    _description = "Lote de un trabajo en segundo plano"
+    _order = "job_id, sequence"
+
+    job_id = fields.Many2one("grain.canje.job", required=True, readonly=True, ondelete="cascade", index=True)
+    sequence = fields.Integer(readonly=True)
+    state = fields.Selection(
+        [
+            ("pending", "En cola"),
+            ("done", "Procesado"),
+            ("failed", "Fallido"),
+        ],
+        default="pending",
+        required=True,
+        readonly=True,
+        index=True,
+    )
+    items = fields.Json(string="Ítems", readonly=True)
+    items_done = fields.Integer(string="Procesados", readonly=True)
+    items_failed = fields.Integer(string="Con error", readonly=True)
+    errors = fields.Json(string="Errores", readonly=True)
+    errors_text = fields.Text(string="Detalle de errores", compute="_compute_errors_text")
+    attempts = fields.Integer(string="Intentos", readonly=True)
+
+    @api.depends("errors")
+    def _compute_errors_text(self):
+        for chunk in self:
+            chunk.errors_text = "\n".join(
+                "%s: %s" % (key, msg) for key, msg in (chunk.errors or {}).items()
+            )
+
+    @api.model
+    def _claim(self):
+        """Reserva el próximo lote en cola (bloqueo de fila hasta el commit)."""
+        self.flush_model(["state", "job_id", "sequence"])
+        self.env.cr.execute(
+            """
+            SELECT c.id
+              FROM grain_canje_job_chunk c
+              JOIN grain_canje_job j ON j.id = c.job_id
+             WHERE c.state = 'pending'
+               AND j.state IN ('pending', 'running')
+          ORDER BY c.job_id, c.sequence
+             LIMIT 1
+               FOR UPDATE OF c SKIP LOCKED
+            """
+        )
+        row = self.env.cr.fetchone()
+        return self.browse(row[0] if row else [])
+
+    def _process(self):
+        self.ensure_one()
+        job = self.job_id
+        if job.state == "pending":
+            job._mark_running()
+
+        runner = bulk_mode(job.with_user(job.user_id).with_company(job.company_id))
+        try:
+            with self.env.cr.savepoint():
+                done, errors = runner._job_dispatch(self.items)
+        except Exception as e:
+            _logger.exception("Trabajo %s: falla en el lote %s", job.id, self.sequence)
+            self.write({
+                "state": "failed",
+                "items_done": 0,
+                "items_failed": len(self.items),
+                "errors": {"lote": str(e.args[0] if isinstance(e, UserError) else e)},
+                "attempts": self.attempts + 1,
+            })
+            return False
+
+        self.write({
+            "state": "done",
+            "items_done": done,
+            "items_failed": len(self.items) - done,
+            "errors": {str(key): msg for key, msg in errors.items()},
+            "attempts": self.attempts + 1,
+        })
+        return True
+
+
+class GrainCanjeContract(models.Model):
+    _inherit = "grain.canje.contract"
+
+    def action_recompute_in_background(self):
+        job = self.env["grain.canje.job"]._enqueue(
+            "recompute",
+            self.ids,
+            _("Recálculo de toneladas (%s contratos)") % len(self),
+        )
+        return job._action_open()
+
+
+class GrainLiquidation(models.Model):
+    _inherit = "grain.liquidation"
+
+    def action_post_in_background(self):
+        to_post = self.filtered(lambda r: r.state == "draft")
+        job = self.env["grain.canje.job"]._enqueue(
+            "lpg_post",
+            to_post.ids,
+            _("Publicación de LPG (%s)") % len(to_post),
+        )
+        return job._action_open()
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, tools, _
+from odoo.tools.float_utils import float_compare, float_is_zero, float_round
+
+
+class GrainCanjeLedger(models.Model):
+    _name = "grain.canje.ledger"
+    _description = "Libro de TN disponibles por contrato de canje"
+    _order = "date desc, id desc"
+
+    contract_id = fields.Many2one(
+        "grain.canje.contract",
+        string="Contrato",
+        required=True,
+        readonly=True,
+        ondelete="cascade",
+    )
+    company_id = fields.Many2one(
+        "res.company",
+        string="Compañía",
+        required=True,
+        readonly=True,
+    )
+    date = fields.Date(
+        string="Fecha",
+        required=True,
+        readonly=True,
+        default=fields.Date.context_today,
+    )
+    kind = fields.Selection(
+        [
+            ("mrv", "Recepción MRV"),
+            ("application", "Aplicación"),
+            ("reversal", "Reversión"),
+            ("adjustment", "Ajuste manual"),
+        ],
+        string="Tipo",
+        required=True,
+        readonly=True,
+    )
+    tn = fields.Float(
+        string="TN",
+        digits=(16, 3),
+        readonly=True,
+    )
+    balance = fields.Float(
+        string="Saldo TN disponibles",
+        digits=(16, 3),
+        compute="_compute_balance",
+    )
+    application_id = fields.Many2one(
+        "grain.canje.application",
+        string="Aplicación",
+        readonly=True,
+        ondelete="set null",
+    )
+    note = fields.Char(
+        string="Detalle",
+        readonly=True,
+    )
+
+    def init(self):
+        # Saldo vigente / a fecha: DISTINCT ON (contract_id) ... ORDER BY contract_id, date DESC, id DESC
+        tools.create_index(
+            self._cr,
+            "grain_canje_ledger_contract_date_idx",
+            self._table,
+            ["contract_id", "date", "id"],
+        )
+
+    def _compute_balance(self):
+        """Saldo acumulado: suma de ventana por contrato en orden (fecha, id)."""
+        stored = self.filtered("id")
+        balances = {}
+        if stored:
+            self.flush_model(["contract_id", "date", "tn"])
+            self.env.cr.execute(
+                """
+                SELECT id, balance
+                  FROM (
+                    SELECT id, SUM(tn) OVER (PARTITION BY contract_id ORDER BY date, id) AS balance
+                      FROM grain_canje_ledger
+                     WHERE contract_id IN %s
+                  ) l
+                 WHERE id IN %s
+                """,
+                (tuple(stored.contract_id.ids), tuple(stored.ids)),
+            )
+            balances = dict(self.env.cr.fetchall())
+        for row in self:
+            row.balance = float_round(balances.get(row.id, 0.0), precision_digits=3)
+
+    @api.model
+    def _last_balances(self, contracts, date=None):
+        """Saldo de TN disponibles por contrato (al día ``date`` si se indica).
+
+        Una sola consulta indexada sobre (contract_id, date, id).
+        Devuelve ``{contract_id: saldo}``; los contratos sin movimientos no aparecen.
+        """
+        if not contracts:
+            return {}
+        self.flush_model(["contract_id", "date", "tn"])
+        query = """
+            SELECT contract_id, ROUND(SUM(tn)::numeric, 3)::float8
+              FROM grain_canje_ledger
+             WHERE contract_id IN %s
+        """
+        params = [tuple(contracts.ids)]
+        if date:
+            query += " AND date <= %s"
+            params.append(date)
+        query += " GROUP BY contract_id"
+        self.env.cr.execute(query, params)
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _append(self, entries):
+        """Agrega movimientos al libro.
+
+        ``entries`` es una lista de dicts ``{"contract", "kind", "tn"}`` con
+        ``"date"`` (fecha del movimiento de origen; hoy si no se indica),
+        ``"application"`` y ``"note"`` opcionales, ya ocurridos (los campos
+        ``tn_disponibles`` de los contratos reflejan el movimiento). Los
+        contratos que todavía no tienen movimientos reciben primero una línea
+        de saldo inicial, fechada al contrato.
+
+        El saldo no se guarda: se suma al leer (ver ``_compute_balance``), así
+        los movimientos con fecha anterior y los appends concurrentes de otras
+        transacciones no dejan saldos inconsistentes.
+        """
+        entries = [e for e in entries if not float_is_zero(e["tn"], precision_digits=3)]
+        if not entries:
+            return self.browse()
+
+        contracts = self.env["grain.canje.contract"].browse(
+            list(dict.fromkeys(e["contract"].id for e in entries))
+        )
+        balances = self._last_balances(contracts)
+        today = fields.Date.context_today(self)
+
+        deltas = {}
+        first_dates = {}
+        for entry in entries:
+            contract_id = entry["contract"].id
+            deltas[contract_id] = deltas.get(contract_id, 0.0) + entry["tn"]
+            date = entry.get("date") or today
+            first_dates[contract_id] = min(first_dates.get(contract_id, date), date)
+
+        vals_list = []
+        for contract in contracts.filtered(lambda c: c.id not in balances):
+            opening = float_round(contract.tn_disponibles - deltas[contract.id], precision_digits=3)
+            if not float_is_zero(opening, precision_digits=3):
+                vals_list.append({
+                    "contract_id": contract.id,
+                    "company_id": contract.company_id.id,
+                    "date": min(contract.date or today, first_dates[contract.id]),
+                    "kind": "adjustment",
+                    "tn": opening,
+                    "note": _("Saldo inicial"),
+                })
+
+        for entry in entries:
+            contract = entry["contract"]
+            vals_list.append({
+                "contract_id": contract.id,
+                "company_id": contract.company_id.id,
+                "date": entry.get("date") or today,
+                "kind": entry["kind"],
+                "tn": float_round(entry["tn"], precision_digits=3),
+                "application_id": entry.get("application") and entry["application"].id,
+                "note": entry.get("note"),
+            })
+        return self.sudo().create(vals_list)
+
+
+class GrainCanjeContract(models.Model):
+    _inherit = "grain.canje.contract"
+
+    ledger_ids = fields.One2many(
+        "grain.canje.ledger",
+        "contract_id",
+        string="Libro de TN",
+        readonly=True,
+    )
+
+    def _ledger_available_at(self, date=None):
+        """TN disponibles por contrato al día ``date``, leídas del libro."""
+        return self.env["grain.canje.ledger"]._last_balances(self, date=date)
+
+    def _job_recompute_tonnage(self):
+        """Recalcula MRV / aplicadas / disponibles y concilia el libro contra el resultado.
+
+        La diferencia se toma contra el saldo del libro (no contra el campo
+        almacenado anterior), así el recálculo también corrige cualquier
+        desvío acumulado entre el libro y ``tn_disponibles``.
+        """
+        fnames = ["tn_mrv", "tn_aplicadas", "tn_disponibles"]
+        before = self._ledger_available_at()
+        for fname in fnames:
+            self.env.add_to_compute(self._fields[fname], self)
+        self.flush_recordset(fnames)
+        self.env["grain.canje.ledger"]._append([
+            {
+                "contract": contract,
+                "kind": "adjustment",
+                "tn": contract.tn_disponibles - before.get(contract.id, 0.0),
+                "note": _("Recálculo de toneladas"),
+            }
+            for contract in self
+        ])
+        return True
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        contracts = super().create(vals_list)
+        self.env["grain.canje.ledger"]._append([
+            {
+                "contract": contract,
+                "kind": "adjustment",
+                "tn": contract.tn_disponibles,
+                "date": contract.date,
+                "note": _("Alta de contrato"),
+            }
+            for contract in contracts
+        ])
+        return contracts
+
+    def write(self, vals):
+        if "tn_pactadas" not in vals and "stock_move_ids" not in vals:
+            return super().write(vals)
+
+        base_before = {contract.id: contract.tn_pactadas or contract.tn_mrv for contract in self}
+        res = super().write(vals)
+
+        kind = "adjustment" if "tn_pactadas" in vals else "mrv"
+        self.env["grain.canje.ledger"]._append([
+            {
+                "contract": contract,
+                "kind": kind,
+                "tn": (contract.tn_pactadas or contract.tn_mrv) - base_before[contract.id],
+            }
+            for contract in self
+        ])
+        return res
+
+
+class GrainCanjeApplication(models.Model):
+    _inherit = "grain.canje.application"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        applications = super().create(vals_list)
+        self.env["grain.canje.ledger"]._append([
+            {
+                "contract": app.contract_id,
+                "kind": "application",
+                "tn": -app.tn_aplicadas,
+                "date": app.date,
+                "application": app,
+                "note": app.move_id.name,
+            }
+            for app in applications
+        ])
+        return applications
+
+    def write(self, vals):
+        if "tn_aplicadas" not in vals and "contract_id" not in vals:
+            return super().write(vals)
+
+        before = [(app, app.contract_id, app.tn_aplicadas) for app in self]
+        res = super().write(vals)
+
+        entries = []
+        for app, contract, tn in before:
+            if app.contract_id == contract and float_compare(app.tn_aplicadas, tn, precision_digits=3) == 0:
+                continue
+            entries += [
+                {"contract": contract, "kind": "reversal", "tn": tn, "application": app, "note": app.move_id.name},
+                {"contract": app.contract_id, "kind": "application", "tn": -app.tn_aplicadas,
+                 "date": app.date, "application": app, "note": app.move_id.name},
+            ]
+        self.env["grain.canje.ledger"]._append(entries)
+        return res
+
+    def unlink(self):
+        entries = [
+            {
+                "contract": app.contract_id,
+                "kind": "reversal",
+                "tn": app.tn_aplicadas,
+                "note": _("Baja de aplicación (%s)") % app.move_id.name,
+            }
+            for app in self
+        ]
+        res = super().unlink()
+        self.env["grain.canje.ledger"]._append(
+            [entry for entry in entries if entry["contract"].exists()]
+        )
+        return res
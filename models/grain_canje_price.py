@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, tools
+from odoo.tools.float_utils import float_compare
+
+
+class GrainCanjePrice(models.Model):
+    _name = "grain.canje.price"
+    _description = "Historial de precio de referencia por contrato de canje"
+    _order = "date desc, id desc"
+
+    contract_id = fields.Many2one(
+        "grain.canje.contract",
+        string="Contrato",
+        required=True,
+        readonly=True,
+        ondelete="cascade",
+    )
+    company_id = fields.Many2one(
+        "res.company",
+        string="Compañía",
+        required=True,
+        readonly=True,
+    )
+    date = fields.Datetime(
+        string="Vigente desde",
+        required=True,
+        readonly=True,
+        default=fields.Datetime.now,
+    )
+    price = fields.Float(
+        string="Precio por TN",
+        readonly=True,
+    )
+    previous_price = fields.Float(
+        string="Precio anterior",
+        readonly=True,
+    )
+    user_id = fields.Many2one(
+        "res.users",
+        string="Modificado por",
+        readonly=True,
+        default=lambda self: self.env.user,
+    )
+
+    def init(self):
+        tools.create_index(
+            self._cr,
+            "grain_canje_price_contract_date_idx",
+            self._table,
+            ["contract_id", "date"],
+        )
+
+    @api.model
+    def _record(self, contracts, previous=None):
+        """Agrega una fila de historial por contrato con su precio vigente."""
+        previous = previous or {}
+        return self.sudo().create([
+            {
+                "contract_id": contract.id,
+                "company_id": contract.company_id.id,
+                "price": contract.precio_ref,
+                "previous_price": previous.get(contract.id, 0.0),
+            }
+            for contract in contracts
+        ])
+
+
+class GrainCanjeContract(models.Model):
+    _inherit = "grain.canje.contract"
+
+    price_history_ids = fields.One2many(
+        "grain.canje.price",
+        "contract_id",
+        string="Historial de precios",
+        readonly=True,
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        contracts = super().create(vals_list)
+        self.env["grain.canje.price"]._record(contracts.filtered("precio_ref"))
+        return contracts
+
+    def write(self, vals):
+        if "precio_ref" not in vals:
+            return super().write(vals)
+        previous = {contract.id: contract.precio_ref for contract in self}
+        res = super().write(vals)
+        changed = self.filtered(
+            lambda c: float_compare(c.precio_ref, previous[c.id], precision_digits=6) != 0
+        )
+        self.env["grain.canje.price"]._record(changed, previous)
+        return res
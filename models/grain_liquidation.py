@@ -1,6 +1,14 @@
 # -*- coding: utf-8 -*-
-from odoo import api, fields, models, _
-from odoo.exceptions import UserError
+import hashlib
+import logging
+
+from psycopg2 import errors as pg_errors
+
+from odoo import api, fields, models, tools, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools.float_utils import float_repr, float_round
+
+_logger = logging.getLogger(__name__)
 
 
 class GrainLiquidation(models.Model):
@@ -10,7 +18,8 @@ class GrainLiquidation(models.Model):
     _order = "date desc, id desc"
 
     name = fields.Char(string="Número", readonly=True, copy=False, default=lambda self: _("New"))
-    date = fields.Date(required=True, default=fields.Date.context_today)
+    lpg_number = fields.Char(string="N° LPG (COE)", copy=False, help="Número de la liquidación electrónica emitida.")
+    date = fields.Date(required=True, default=fields.Date.context_today, index=True)
     company_id = fields.Many2one("res.company", required=True, default=lambda self: self.env.company)
     currency_id = fields.Many2one(related="company_id.currency_id", store=True, readonly=True)
 
@@ -45,12 +54,138 @@ class GrainLiquidation(models.Model):
         required=True,
     )
 
-    move_id = fields.Many2one("account.move", string="Vendor Bill (LPG)", readonly=True, copy=False)
+    move_id = fields.Many2one("account.move", string="Vendor Bill (LPG)", readonly=True, copy=False, index=True)
     state = fields.Selection(
         [("draft", "Borrador"), ("posted", "Publicado"), ("cancel", "Cancelado")],
         default="draft",
         tracking=True,
     )
+    # Huella de contenido para detectar LPG ya registradas (índice único)
+    fingerprint = fields.Char(
+        string="Huella",
+        compute="_compute_fingerprint",
+        store=True,
+        readonly=True,
+        copy=False,
+    )
+
+    def init(self):
+        # LPG de un productor por fecha y diario (vinculación con la vendor bill)
+        tools.create_index(
+            self._cr,
+            "grain_liquidation_producer_date_journal_idx",
+            self._table,
+            ["producer_id", "date", "journal_id"],
+        )
+        if not tools.index_exists(self._cr, "grain_liquidation_fingerprint_uniq"):
+            # Huellas de las LPG existentes (misma clave y formato que _fingerprint_key)
+            self._cr.execute(r"""
+                UPDATE grain_liquidation
+                   SET fingerprint = md5(concat_ws('|',
+                           COALESCE(company_id::text, ''),
+                           COALESCE(producer_id::text, ''),
+                           COALESCE(to_char(date, 'YYYY-MM-DD'), ''),
+                           COALESCE(product_id::text, ''),
+                           round(COALESCE(qty_tn, 0)::numeric, 3)::text,
+                           round(COALESCE(price_per_tn, 0)::numeric, 2)::text,
+                           upper(regexp_replace(COALESCE(lpg_number, ''), '^\s+|\s+$', '', 'g'))))
+                 WHERE fingerprint IS NULL
+            """)
+            try:
+                with self._cr.savepoint(flush=False):
+                    self._cr.execute(
+                        "CREATE UNIQUE INDEX grain_liquidation_fingerprint_uniq "
+                        "ON grain_liquidation (fingerprint) WHERE state != 'cancel'"
+                    )
+            except Exception:
+                _logger.warning(
+                    "No se pudo crear el índice único de huellas de LPG: hay liquidaciones duplicadas "
+                    "no canceladas. Cancele los duplicados y actualice el módulo."
+                )
+
+    @api.model
+    def _fingerprint_key(self, company_id, producer_id, date, product_id, qty_tn, price_per_tn, lpg_number):
+        """Huella (md5) de los datos que identifican una LPG.
+
+        ``date`` puede venir como fecha o como texto. Los números se redondean
+        como ``round(numeric)`` de PostgreSQL (mitad hacia arriba), así la
+        huella coincide con la que calcula ``init`` en SQL.
+        """
+        key = "|".join([
+            str(company_id or ""),
+            str(producer_id or ""),
+            fields.Date.to_string(fields.Date.to_date(date)) or "",
+            str(product_id or ""),
+            float_repr(float_round(qty_tn or 0.0, precision_digits=3), precision_digits=3),
+            float_repr(float_round(price_per_tn or 0.0, precision_digits=2), precision_digits=2),
+            (lpg_number or "").strip().upper(),
+        ])
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def _flush_fingerprint(self):
+        """Escribe las huellas y traduce una LPG duplicada en un error legible."""
+        try:
+            with self.env.cr.savepoint(flush=False), tools.mute_logger("odoo.sql_db"):
+                self.flush_recordset(["fingerprint", "state"])
+        except pg_errors.UniqueViolation as e:
+            if e.diag.constraint_name != "grain_liquidation_fingerprint_uniq":
+                raise
+            raise ValidationError(_(
+                "Ya existe una LPG no cancelada con el mismo productor, fecha, grano, toneladas, "
+                "precio y N° LPG."
+            )) from e
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._flush_fingerprint()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        fingerprint_fields = {
+            "company_id", "producer_id", "date", "product_id", "qty_tn", "price_per_tn", "lpg_number", "state",
+        }
+        if fingerprint_fields & set(vals):
+            self._flush_fingerprint()
+        return res
+
+    @api.model
+    def _fingerprint_from_vals(self, vals):
+        return self._fingerprint_key(
+            vals.get("company_id"),
+            vals.get("producer_id"),
+            vals.get("date"),
+            vals.get("product_id"),
+            vals.get("qty_tn"),
+            vals.get("price_per_tn"),
+            vals.get("lpg_number"),
+        )
+
+    @api.model
+    def _registered_fingerprints(self, fingerprints):
+        """Subconjunto de ``fingerprints`` ya registrado (LPG no canceladas)."""
+        if not fingerprints:
+            return set()
+        self.flush_model(["fingerprint", "state"])
+        self.env.cr.execute(
+            "SELECT fingerprint FROM grain_liquidation WHERE fingerprint IN %s AND state != 'cancel'",
+            (tuple(fingerprints),),
+        )
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.depends("company_id", "producer_id", "date", "product_id", "qty_tn", "price_per_tn", "lpg_number")
+    def _compute_fingerprint(self):
+        for rec in self:
+            rec.fingerprint = rec._fingerprint_key(
+                rec.company_id.id,
+                rec.producer_id.id,
+                rec.date,
+                rec.product_id.id,
+                rec.qty_tn,
+                rec.price_per_tn,
+                rec.lpg_number,
+            )
 
     @api.depends("qty_tn", "price_per_tn")
     def _compute_amount(self):
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+from itertools import islice
+
+from lxml import etree
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+# Columnas del CSV / etiquetas hijas de cada <liquidacion> en el XML
+IMPORT_COLUMNS = (
+    "producer_vat",
+    "date",
+    "product_code",
+    "qty_tn",
+    "price_per_tn",
+    "journal_code",
+    "lpg_number",
+)
+XML_ROW_TAG = "liquidacion"
+
+
+class GrainLiquidationImport(models.Model):
+    _name = "grain.liquidation.import"
+    _description = "Importación de liquidaciones de granos (LPG/LSG)"
+    _order = "id desc"
+
+    name = fields.Char(string="Archivo", required=True)
+    company_id = fields.Many2one("res.company", required=True, default=lambda self: self.env.company)
+    data = fields.Binary(string="Contenido", required=True, attachment=True)
+    file_type = fields.Selection(
+        [("csv", "CSV"), ("xml", "XML (LPG electrónica)")],
+        string="Formato",
+        required=True,
+        default="csv",
+    )
+    chunk_size = fields.Integer(string="Filas por lote", default=500, required=True)
+    # La importación corre como trabajo en segundo plano: un lote del trabajo por lote de filas
+    job_id = fields.Many2one("grain.canje.job", string="Trabajo", readonly=True, copy=False)
+    state = fields.Selection(
+        [
+            ("draft", "Borrador"),
+            ("running", "En proceso"),
+            ("done", "Terminada"),
+            ("failed", "Con lotes fallidos"),
+        ],
+        compute="_compute_progress",
+    )
+    rows_done = fields.Integer(string="Filas procesadas", compute="_compute_progress")
+    rows_created = fields.Integer(string="LPG creadas", compute="_compute_progress")
+    rows_failed = fields.Integer(string="Filas con error", compute="_compute_progress")
+    rows_skipped = fields.Integer(string="Filas ya registradas", compute="_compute_progress")
+    log = fields.Text(string="Errores", compute="_compute_progress")
+
+    @api.depends("job_id.state", "job_id.chunk_ids.state", "job_id.chunk_ids.errors")
+    def _compute_progress(self):
+        """Avance leído del trabajo: lotes procesados, errores por fila y LPG creadas."""
+        created = {}
+        if self.ids:
+            for group in self.env["grain.liquidation"].read_group(
+                [("import_id", "in", self.ids)], ["import_id"], ["import_id"]
+            ):
+                created[group["import_id"][0]] = group["import_id_count"]
+        job_states = {"pending": "running", "running": "running", "done": "done", "failed": "failed"}
+        for rec in self:
+            job = rec.job_id
+            rec.state = job_states[job.state] if job else "draft"
+            rec.rows_done = job.items_done + job.items_failed
+            rec.rows_failed = job.items_failed
+            rec.rows_created = created.get(rec.id, 0)
+            rec.rows_skipped = max(job.items_done - rec.rows_created, 0)
+            # Un solo join al leer, no una concatenación por lote
+            rec.log = "\n".join(job.chunk_ids.filtered("errors").mapped("errors_text")) or False
+
+    @api.onchange("name")
+    def _onchange_name(self):
+        if self.name and self.name.lower().endswith(".xml"):
+            self.file_type = "xml"
+        elif self.name and self.name.lower().endswith(".csv"):
+            self.file_type = "csv"
+
+    # ------------------------------
+    # LECTURA INCREMENTAL
+    # ------------------------------
+
+    def _open_data(self):
+        """Abre el archivo como stream binario (desde el filestore si es posible)."""
+        self.ensure_one()
+        attachment = self.env["ir.attachment"].sudo().search([
+            ("res_model", "=", self._name),
+            ("res_id", "=", self.id),
+            ("res_field", "=", "data"),
+        ], limit=1)
+        if not attachment:
+            raise UserError(_("Falta el archivo a importar."))
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), "rb")
+        return io.BytesIO(attachment.raw or b"")
+
+    def _iter_rows(self, stream):
+        """Itera las filas del archivo como dicts, sin cargarlo completo en memoria."""
+        if self.file_type == "csv":
+            reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig"))
+            for row in reader:
+                yield {key: (row.get(key) or "").strip() for key in IMPORT_COLUMNS}
+            return
+
+        for _event, elem in etree.iterparse(stream, events=("end",), tag=XML_ROW_TAG):
+            yield {key: (elem.findtext(key) or "").strip() for key in IMPORT_COLUMNS}
+            # Liberar el nodo ya leído (y sus hermanos previos) para mantener la memoria plana
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    # ------------------------------
+    # VALIDACIÓN
+    # ------------------------------
+
+    def _load_lookups(self, rows):
+        """Mapas de referencia para las filas del lote (una consulta por mapa)."""
+        vats = {row["producer_vat"] for _n, row in rows if row["producer_vat"]}
+        codes = {row["product_code"] for _n, row in rows if row["product_code"]}
+        partners = self.env["res.partner"].search_read(
+            [("vat", "in", list(vats)), ("company_id", "in", [False, self.company_id.id])],
+            ["vat"],
+        )
+        products = self.env["product.product"].search_read(
+            [("default_code", "in", list(codes)), ("company_id", "in", [False, self.company_id.id])],
+            ["default_code"],
+        )
+        return {
+            "producer": {p["vat"]: p["id"] for p in partners},
+            "product": {p["default_code"]: p["id"] for p in products},
+        }
+
+    def _load_journals(self):
+        journals = self.env["account.journal"].search_read(
+            [("company_id", "=", self.company_id.id), ("type", "=", "purchase")],
+            ["code"],
+        )
+        return {j["code"]: j["id"] for j in journals}
+
+    @api.model
+    def _parse_float(self, value):
+        value = (value or "").strip()
+        if "," in value and "." in value:
+            value = value.replace(".", "").replace(",", ".")
+        elif "," in value:
+            value = value.replace(",", ".")
+        return float(value)
+
+    def _prepare_liquidation_vals(self, row, lookups, journals):
+        """Valores de grain.liquidation para una fila; UserError si no es válida."""
+        producer_id = lookups["producer"].get(row["producer_vat"])
+        if not producer_id:
+            raise UserError(_("Productor con CUIT %s no encontrado.") % row["producer_vat"])
+        product_id = lookups["product"].get(row["product_code"])
+        if not product_id:
+            raise UserError(_("Producto con código %s no encontrado.") % row["product_code"])
+
+        try:
+            date = fields.Date.to_date(row["date"])
+            qty_tn = self._parse_float(row["qty_tn"])
+            price_per_tn = self._parse_float(row["price_per_tn"])
+        except ValueError:
+            raise UserError(_("Fecha, toneladas o precio con formato inválido."))
+        if not date:
+            raise UserError(_("Falta la fecha."))
+        if qty_tn <= 0 or price_per_tn <= 0:
+            raise UserError(_("Las toneladas y el precio deben ser mayores a 0."))
+
+        if row["journal_code"]:
+            journal_id = journals.get(row["journal_code"])
+            if not journal_id:
+                raise UserError(_("Diario con código %s no encontrado.") % row["journal_code"])
+        else:
+            journal_id = self.company_id.grain_liquidation_journal_id.id
+
+        return {
+            "date": date,
+            "company_id": self.company_id.id,
+            "producer_id": producer_id,
+            "product_id": product_id,
+            "qty_tn": qty_tn,
+            "price_per_tn": price_per_tn,
+            "clearing_account_id": self.company_id.grain_clearing_account_id.id,
+            "journal_id": journal_id,
+            "lpg_number": row["lpg_number"] or False,
+            "import_id": self.id,
+        }
+
+    # ------------------------------
+    # PROCESO POR LOTES
+    # ------------------------------
+
+    def _iter_chunks(self):
+        """Lotes de filas numeradas ``{"row", <columnas>}`` para el trabajo en segundo plano."""
+        with self._open_data() as stream:
+            numbered = (
+                dict(row, row=row_number) for row_number, row in enumerate(self._iter_rows(stream), start=1)
+            )
+            while True:
+                rows = list(islice(numbered, self.chunk_size))
+                if not rows:
+                    break
+                yield rows
+
+    def _import_rows(self, rows):
+        """Crea y publica las LPG de un lote de filas.
+
+        Las filas ya publicadas (misma huella) o repetidas en el mismo lote se
+        omiten; si la LPG ya existe en borrador (una corrida o un lote anterior
+        falló antes de publicarla) se publica la existente. Así reimportar un
+        archivo o reintentar un lote es idempotente y no deja LPG sin publicar.
+        Devuelve ``(filas sin error, {fila o LPG: error})`` como cualquier
+        lote del trabajo.
+        """
+        self.ensure_one()
+        Liquidation = self.env["grain.liquidation"]
+        numbered = [(row["row"], row) for row in rows]
+        lookups = self._load_lookups(numbered)
+        journals = self._load_journals()
+        errors = {}
+        vals_by_fingerprint = {}
+        for row_number, row in numbered:
+            try:
+                vals = self._prepare_liquidation_vals(row, lookups, journals)
+            except UserError as e:
+                errors[_("Fila %s") % row_number] = e.args[0]
+                continue
+            vals_by_fingerprint.setdefault(Liquidation._fingerprint_from_vals(vals), vals)
+
+        existing = Liquidation.search([
+            ("fingerprint", "in", list(vals_by_fingerprint)),
+            ("state", "!=", "cancel"),
+        ])
+        registered = set(existing.mapped("fingerprint"))
+        vals_list = [vals for fingerprint, vals in vals_by_fingerprint.items() if fingerprint not in registered]
+
+        liquidations = Liquidation.create(vals_list) | existing.filtered(lambda l: l.state == "draft")
+        post_errors = liquidations._post_batch()
+        for liquidation in liquidations.filtered(lambda l: l.id in post_errors):
+            errors[_("LPG %s") % (liquidation.lpg_number or liquidation.id)] = post_errors[liquidation.id]
+        return len(rows) - len(errors), errors
+
+    def action_run(self):
+        """Encola la importación: el archivo se lee una vez y se reparte en lotes del trabajo."""
+        for rec in self:
+            if rec.job_id and rec.job_id.state != "done":
+                # Reanudar: sólo los lotes fallidos
+                rec.job_id.action_retry()
+                continue
+            company = rec.company_id
+            if not company.grain_clearing_account_id or not company.grain_liquidation_journal_id:
+                raise UserError(_("Configurá la cuenta puente y el diario de liquidaciones en Ajustes."))
+            rec.job_id = self.env["grain.canje.job"]._enqueue_chunks(
+                "lpg_import",
+                rec._iter_chunks(),
+                _("Importación de LPG: %s") % rec.name,
+                company=company,
+                params={"import_id": rec.id},
+            )
+        return True
+
+    def action_open_job(self):
+        self.ensure_one()
+        return self.job_id._action_open()
+
+
+class GrainLiquidation(models.Model):
+    _inherit = "grain.liquidation"
+
+    import_id = fields.Many2one(
+        "grain.liquidation.import",
+        string="Importación",
+        readonly=True,
+        copy=False,
+        index="btree_not_null",
+        ondelete="set null",
+    )
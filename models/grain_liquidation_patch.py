@@ -12,46 +12,151 @@ class GrainLiquidation(models.Model):
         string='Vendor Bill (LPG)',
         readonly=True,
         copy=False,
+        index=True,
     )
 
-    def _find_vendor_bill_candidate(self):
-        """Heurística: busca la vendor bill generada por esta LPG."""
+    def _vendor_bill_refs(self):
+        """Referencias exactas con las que se registraron las vendor bills de la LPG."""
         self.ensure_one()
+        refs = ['LPG %s' % self.id]
+        if self.name and self.name != _('New'):
+            refs.append(self.name)
+        return refs
 
-        producer = getattr(self, 'producer_id', False) or getattr(self, 'partner_id', False)
-        date = getattr(self, 'date', False) or getattr(self, 'invoice_date', False)
-        journal = getattr(self, 'liquidation_journal_id', False) or getattr(self, 'journal_id', False)
+    def _pick_vendor_bill(self, candidates, used=()):
+        """Elige la vendor bill entre los candidatos de (productor, fecha, diario).
 
-        domain = [('move_type', '=', 'in_invoice'), ('state', 'in', ['draft', 'posted'])]
+        Sólo se acepta un resultado inequívoco: la única bill con la referencia
+        exacta de la LPG o, si no hay, la única con el mismo importe.
+        ``candidates`` es una lista de ``(move_id, ref, amount_untaxed)``.
+        """
+        self.ensure_one()
+        candidates = [c for c in candidates if c[0] not in used]
+        refs = self._vendor_bill_refs()
+        exact = [c for c in candidates if c[1] in refs]
+        if len(exact) == 1:
+            return exact[0][0]
+        same_amount = [
+            c for c in candidates
+            if self.currency_id.compare_amounts(c[2] or 0.0, self.amount) == 0
+        ]
+        if len(same_amount) == 1:
+            return same_amount[0][0]
+        return False
+
+    def _backfill_vendor_bills(self):
+        """Vincula en lote las LPG sin vendor bill.
+
+        Una sola consulta agrupada por LPG trae todas las bills candidatas de
+        (productor, fecha, diario); si la LPG ya tiene ``move_id`` se usa esa.
+        Los vínculos se escriben con un UPDATE por tabla. Si ``self`` está vacío se procesan todas las LPG sin vincular.
+
+        Devuelve ``(vinculadas, sin_resolver)``; las borrador sin bill
+        registrada no cuentan como sin resolver.
+        """
+        self.env['account.move'].flush_model([
+            'move_type', 'state', 'partner_id', 'invoice_date', 'journal_id',
+            'grain_liquidation_id', 'ref', 'amount_untaxed',
+        ])
+        self.flush_model(['producer_id', 'date', 'journal_id', 'vendor_bill_id', 'move_id'])
 
-        if producer:
-            domain.append(('partner_id', '=', producer.commercial_partner_id.id))
-        if date:
-            domain.append(('invoice_date', '=', date))
-        if journal:
-            domain.append(('journal_id', '=', journal.id))
+        where = 'l.vendor_bill_id IS NULL'
+        params = []
+        if self:
+            where += ' AND l.id IN %s'
+            params.append(tuple(self.ids))
+        self.env.cr.execute(
+            """
+            SELECT l.id,
+                   l.move_id,
+                   array_agg(m.id ORDER BY m.id) FILTER (WHERE m.id IS NOT NULL),
+                   array_agg(m.ref ORDER BY m.id) FILTER (WHERE m.id IS NOT NULL),
+                   array_agg(m.amount_untaxed ORDER BY m.id) FILTER (WHERE m.id IS NOT NULL)
+              FROM grain_liquidation l
+         LEFT JOIN account_move m
+                ON m.partner_id = l.producer_id
+               AND m.invoice_date = l.date
+               AND m.journal_id = l.journal_id
+               AND m.move_type = 'in_invoice'
+               AND m.state IN ('draft', 'posted')
+               AND (m.grain_liquidation_id IS NULL OR m.grain_liquidation_id = l.id)
+             WHERE %s
+          GROUP BY l.id, l.move_id
+          ORDER BY l.id
+            """ % where,
+            params,
+        )
+        rows = self.env.cr.fetchall()
 
-        key = getattr(self, 'name', False) or self.display_name
-        move = self.env['account.move'].search(domain + [('ref', 'ilike', key)], order='id desc', limit=1)
-        if not move:
-            # fallback: por partner+fecha+diario
-            move = self.env['account.move'].search(domain, order='id desc', limit=1)
-        return move
+        lpg_ids, bill_ids = [], []
+        used = set()
+        records = self.browse([row[0] for row in rows])
+        for lpg, (_lpg_id, move_id, move_ids, refs, amounts) in zip(records, rows):
+            # La bill registrada por el wizard (move_id) tiene prioridad
+            if not move_id and move_ids:
+                move_id = lpg._pick_vendor_bill(list(zip(move_ids, refs, amounts)), used)
+            if move_id and move_id not in used:
+                used.add(move_id)
+                lpg_ids.append(lpg.id)
+                bill_ids.append(move_id)
+
+        if lpg_ids:
+            self.env.cr.execute(
+                """
+                UPDATE grain_liquidation l
+                   SET vendor_bill_id = v.bill_id,
+                       move_id = COALESCE(l.move_id, v.bill_id)
+                  FROM (SELECT unnest(%s::int[]) AS lpg_id, unnest(%s::int[]) AS bill_id) v
+                 WHERE l.id = v.lpg_id
+                """,
+                (lpg_ids, bill_ids),
+            )
+            self.env.cr.execute(
+                """
+                UPDATE account_move m
+                   SET grain_liquidation_id = v.lpg_id
+                  FROM (SELECT unnest(%s::int[]) AS lpg_id, unnest(%s::int[]) AS bill_id) v
+                 WHERE m.id = v.bill_id
+                """,
+                (lpg_ids, bill_ids),
+            )
+            self.invalidate_model(['vendor_bill_id', 'move_id'])
+            self.env['account.move'].invalidate_model(['grain_liquidation_id'])
+
+        # Sin resolver: sólo las LPG que deberían tener bill (publicadas o ya registradas)
+        linked = self.browse(lpg_ids)
+        domain = [('vendor_bill_id', '=', False), '|', ('state', '=', 'posted'), ('move_id', '!=', False)]
+        if self:
+            domain.append(('id', 'in', self.ids))
+        pending = self.search(domain)
+        return linked, pending
 
     def action_publish(self):
         res = super().action_publish()
-        for rec in self:
-            if not getattr(rec, 'vendor_bill_id', False):
-                move = rec._find_vendor_bill_candidate()
-                if move:
-                    rec.vendor_bill_id = move.id
+        unlinked = self.filtered(lambda r: not r.vendor_bill_id)
+        if unlinked:
+            unlinked._backfill_vendor_bills()
         return res
 
     def action_sync_vendor_bill(self):
         """Botón/acción manual: vincula la vendor bill si quedó vacía."""
-        for rec in self:
-            move = rec._find_vendor_bill_candidate()
-            if not move:
-                raise UserError(_("No pude encontrar una Vendor Bill candidata para esta LPG."))
-            rec.vendor_bill_id = move.id
-        return True
+        linked, pending = self._backfill_vendor_bills()
+        if pending and len(self) == 1:
+            raise UserError(_("No pude encontrar una Vendor Bill candidata para esta LPG."))
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Vinculación de vendor bills'),
+                'message': _('LPG vinculadas: %(linked)s. Sin resolver: %(pending)s.') % {
+                    'linked': len(linked),
+                    'pending': len(pending),
+                },
+                'sticky': bool(pending),
+            },
+        }
+
+    @api.model
+    def action_backfill_vendor_bills(self):
+        """Vincula todas las LPG sin vendor bill (acción de menú)."""
+        return self.browse().action_sync_vendor_bill()
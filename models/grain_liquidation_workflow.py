@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
+from odoo.tools.float_utils import float_compare, float_round
+
+from .grain_bulk import DIGEST_MAX_LINKS, bulk_mode, in_bulk_mode
 
 
 class GrainLiquidation(models.Model):
@@ -20,78 +23,156 @@ class GrainLiquidation(models.Model):
             raise UserError(_("Falta configurar el Diario de Liquidaciones de Granos en Ajustes."))
         return journal
 
-    def _ensure_vendor_bill(self):
-        """Crea la Vendor Bill si no existe (o reutiliza la existente)."""
+    def _prepare_vendor_bill_vals(self):
+        """Valores de la Vendor Bill de la LPG (valida los datos requeridos)."""
         self.ensure_one()
 
-        # Si ya existe, no recreamos
-        if getattr(self, "vendor_bill_id", False):
-            return self.vendor_bill_id
-
-        # Campos esperados en el modelo base
-        producer = getattr(self, "producer_id", False)
-        product = getattr(self, "product_id", False)
-        amount = getattr(self, "amount", 0.0)
-        date = getattr(self, "date", fields.Date.context_today(self))
-        toneladas = getattr(self, "toneladas", 0.0)
-        price_tn = getattr(self, "price_tn", 0.0) or getattr(self, "precio_tn", 0.0)
+        producer = self.producer_id
+        product = self.product_id
+        date = self.date or fields.Date.context_today(self)
 
         if not producer:
             raise UserError(_("Debe indicar el Productor."))
         if not product:
             raise UserError(_("Debe indicar el Producto servicio (Grano - Liquidación)."))
-        if not amount:
-            # Si no hay amount calculado, lo intentamos calcular
-            if toneladas and price_tn:
-                amount = toneladas * price_tn
-            if not amount:
-                raise UserError(_("El Importe es 0. Verifique Toneladas y Precio por TN."))
+        if self.currency_id.is_zero(self.amount):
+            raise UserError(_("El Importe es 0. Verifique Toneladas y Precio por TN."))
 
         journal = self._get_liquidation_journal()
         bridge_account = self._get_bridge_account()
 
-        qty = toneladas if toneladas else 1.0
-        price_unit = price_tn if toneladas and price_tn else amount
+        # TN x precio por TN; si las TN tienen más decimales que la UoM de la línea, se factura el importe
+        uom_digits = self.env["decimal.precision"].precision_get("Product Unit of Measure")
+        if float_compare(float_round(self.qty_tn, precision_digits=uom_digits), self.qty_tn, precision_digits=3):
+            quantity, price_unit = 1.0, self.amount
+        else:
+            quantity, price_unit = self.qty_tn, self.price_per_tn
 
-        bill = self.env["account.move"].create({
+        return {
             "move_type": "in_invoice",
             "partner_id": producer.id,
             "invoice_date": date,
             "date": date,
             "journal_id": journal.id,
+            "ref": "LPG %s" % self.id,
+            # Clave explícita LPG -> vendor bill
+            "grain_liquidation_id": self.id,
             "invoice_line_ids": [(0, 0, {
                 "product_id": product.id,
-                "name": getattr(product, "display_name", "LPG"),
-                "quantity": qty,
+                "name": product.display_name,
+                "quantity": quantity,
                 "price_unit": price_unit,
                 # Clave: imputar a la cuenta puente para que el asiento impacte "Granos a liquidar / Canje"
                 "account_id": bridge_account.id,
             })],
-        })
+        }
 
-        # Guardamos relación si el campo existe
-        if "vendor_bill_id" in self._fields:
-            self.vendor_bill_id = bill.id
+    def _ensure_vendor_bill(self):
+        """Crea la Vendor Bill si no existe (o reutiliza la existente)."""
+        self.ensure_one()
 
+        # Si ya existe, no recreamos
+        if self.vendor_bill_id or self.move_id:
+            return self.vendor_bill_id or self.move_id
+
+        bill = self.env["account.move"].create(self._prepare_vendor_bill_vals())
+        self.vendor_bill_id = bill.id
         return bill
 
-    def action_post(self):
-        """Publicar / Confirmar LPG"""
-        for rec in self:
-            # Si el modelo original ya trae action_post, lo respetamos
-            try:
-                return super(GrainLiquidation, rec).action_post()
-            except Exception:
-                pass
+    def _post_batch(self):
+        """Publica las LPG en lote.
 
-            bill = rec._ensure_vendor_bill()
-            if bill.state != "posted":
-                bill.action_post()
+        Las Vendor Bills faltantes se crean con un solo ``create()`` y todas se
+        publican con un solo ``action_post()``; si la publicación conjunta falla
+        se reintenta por bill para aislar la que tiene el problema.
 
-            if "state" in rec._fields:
-                # Estado típico: draft/posted/cancel
-                rec.state = "posted"
-        return True
+        Devuelve ``{lpg_id: mensaje}`` con las LPG que no se pudieron publicar.
+        """
+        errors = {}
+        to_post = self.filtered(lambda r: r.state == "draft")
+
+        # 1) Vendor Bills faltantes, en un solo create()
+        vals_list = []
+        need_bill = self.browse()
+        for rec in to_post.filtered(lambda r: not (r.vendor_bill_id or r.move_id)):
+            try:
+                vals_list.append(rec._prepare_vendor_bill_vals())
+                need_bill |= rec
+            except UserError as e:
+                errors[rec.id] = e.args[0]
+        bills = self.env["account.move"].create(vals_list)
+        for rec, bill in zip(need_bill, bills):
+            rec.vendor_bill_id = bill.id
+
+        # 2) Publicar todas las bills juntas
+        valid = to_post.filtered(lambda r: r.id not in errors)
+        draft_bills = valid.mapped(lambda r: r.vendor_bill_id or r.move_id).filtered(lambda b: b.state == "draft")
+        try:
+            with self.env.cr.savepoint():
+                draft_bills.action_post()
+        except UserError:
+            for bill in draft_bills:
+                try:
+                    with self.env.cr.savepoint():
+                        bill.action_post()
+                except UserError as e:
+                    for rec in valid.filtered(lambda r: bill in (r.vendor_bill_id | r.move_id)):
+                        errors[rec.id] = e.args[0]
+
+        # 3) Estado de las LPG publicadas, en un solo write()
+        posted = to_post.filtered(lambda r: r.id not in errors)
+        posted.write({"state": "posted"})
+        if in_bulk_mode(self):
+            posted._lpg_post_digest()
+        return errors
+
+    def _lpg_post_digest(self):
+        """Modo masivo: un mensaje por productor con el resumen de las LPG publicadas.
+
+        Reemplaza el seguimiento por LPG; lleva cantidades, totales y enlaces.
+        """
+        by_producer = {}
+        for rec in self:
+            by_producer.setdefault(rec.producer_id.commercial_partner_id, self.browse())
+            by_producer[rec.producer_id.commercial_partner_id] |= rec
+        for producer, liquidations in by_producer.items():
+            body = _(
+                "LPG publicadas en lote: %(count)s, %(tn).2f TN, %(amount)s."
+            ) % {
+                "count": len(liquidations),
+                "tn": sum(liquidations.mapped("qty_tn")),
+                "amount": liquidations[0].currency_id.format(sum(liquidations.mapped("amount"))),
+            }
+            body += "<br/>" + ", ".join(lpg._get_html_link() for lpg in liquidations[:DIGEST_MAX_LINKS])
+            if len(liquidations) > DIGEST_MAX_LINKS:
+                body += "<br/>" + _("(%s LPG más)") % (len(liquidations) - DIGEST_MAX_LINKS)
+            producer.message_post(body=body)
+
+    def action_post(self):
+        """Publicar / Confirmar LPG (una o varias)."""
+        errors = (bulk_mode(self) if len(self) > 1 else self)._post_batch()
+        if not errors:
+            return True
+
+        failed = self.browse(list(errors))
+        if len(self) == 1:
+            raise UserError(errors[self.id])
+
+        for rec in failed:
+            rec.message_post(body=_("No se pudo publicar la LPG: %s") % errors[rec.id])
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": _("Publicación de LPG"),
+                "message": _("Publicadas: %(ok)s. Con error: %(err)s (ver el detalle en cada LPG).") % {
+                    "ok": len(self.filtered(lambda r: r.state == "posted")),
+                    "err": len(failed),
+                },
+                "type": "warning",
+                "sticky": True,
+            },
+        }
 
     def action_publish(self):
         """Alias por si la vista llama 'publish' en lugar de post."""
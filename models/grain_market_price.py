@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, tools
+
+# Clave del caché de precios en ``cr.cache`` (vive lo que dura la transacción)
+PRICE_CACHE_KEY = "grain_market_prices"
+
+
+class GrainMarketPrice(models.Model):
+    _name = "grain.market.price"
+    _description = "Precio de mercado de granos (pizarra)"
+    _order = "date desc, product_id, id desc"
+
+    product_id = fields.Many2one(
+        "product.product",
+        string="Grano",
+        required=True,
+        ondelete="cascade",
+    )
+    date = fields.Date(
+        string="Fecha",
+        required=True,
+        default=fields.Date.context_today,
+    )
+    price = fields.Float(
+        string="Precio por TN",
+        required=True,
+    )
+    source = fields.Char(
+        string="Fuente",
+        required=True,
+        default="manual",
+        help="Origen de la cotización (p. ej. pizarra de la bolsa de cereales).",
+    )
+
+    _sql_constraints = [
+        (
+            "product_date_source_uniq",
+            "unique(product_id, date, source)",
+            "Ya existe un precio para ese grano, fecha y fuente.",
+        ),
+    ]
+
+    def init(self):
+        # Precio "a fecha": WHERE product_id = ? AND date <= ? ORDER BY date DESC
+        tools.create_index(
+            self._cr,
+            "grain_market_price_product_date_idx",
+            self._table,
+            ["product_id", "date"],
+        )
+
+    # ------------------------------
+    # CONSULTA "PRECIO A FECHA"
+    # ------------------------------
+
+    @api.model
+    def _price_cache(self):
+        """Caché ``{(product_id, fecha): precio}`` de la transacción en curso.
+
+        Se descarta al confirmar o deshacer la transacción y cada vez que
+        cambia un precio, como el caché de cotizaciones de ``res.currency``.
+        """
+        cr = self.env.cr
+        cache = cr.cache.get(PRICE_CACHE_KEY)
+        if cache is None:
+            cache = cr.cache[PRICE_CACHE_KEY] = {}
+            cr.postcommit.add(lambda: cr.cache.pop(PRICE_CACHE_KEY, None))
+            cr.postrollback.add(lambda: cr.cache.pop(PRICE_CACHE_KEY, None))
+        return cache
+
+    @api.model
+    def _clear_price_cache(self):
+        self.env.cr.cache.pop(PRICE_CACHE_KEY, None)
+
+    @api.model
+    def _prices_as_of(self, pairs):
+        """Último precio de mercado a fecha de cada par ``(producto, fecha)``.
+
+        Los pares que no están en el caché se resuelven con una sola consulta
+        (un LATERAL por par sobre ``grain_market_price_product_date_idx``).
+        Sin fecha se toma hoy. Devuelve ``{(product_id, fecha): precio}``,
+        0.0 si el grano no tiene precio a esa fecha.
+        """
+        today = fields.Date.context_today(self)
+        keys = {
+            (product.id, fields.Date.to_date(date) or today)
+            for product, date in pairs
+            if product
+        }
+        cache = self._price_cache()
+        missing = [key for key in keys if key not in cache]
+        if missing:
+            self.flush_model(["product_id", "date", "price"])
+            self.env.cr.execute(
+                """
+                SELECT v.product_id, v.date, COALESCE(p.price, 0.0)
+                  FROM (SELECT unnest(%s::int[]) AS product_id, unnest(%s::date[]) AS date) v
+             LEFT JOIN LATERAL (
+                       SELECT price
+                         FROM grain_market_price
+                        WHERE product_id = v.product_id
+                          AND date <= v.date
+                     ORDER BY date DESC, id DESC
+                        LIMIT 1
+                  ) p ON TRUE
+                """,
+                ([key[0] for key in missing], [key[1] for key in missing]),
+            )
+            for product_id, date, price in self.env.cr.fetchall():
+                cache[(product_id, date)] = price
+        return {key: cache[key] for key in keys}
+
+    @api.model
+    def _price_as_of(self, product, date=None):
+        """Último precio de mercado del grano a ``date`` (0.0 si no hay)."""
+        if not product:
+            return 0.0
+        date = fields.Date.to_date(date) or fields.Date.context_today(self)
+        return self._prices_as_of([(product, date)])[(product.id, date)]
+
+    # ------------------------------
+    # INVALIDACIÓN
+    # ------------------------------
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self._clear_price_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self._clear_price_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self._clear_price_cache()
+        return super().unlink()
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+from .grain_bulk import bulk_mode
+
+
+class GrainNettingEngine(models.AbstractModel):
+    _name = "grain.netting.engine"
+    _description = "Motor de compensación canje (A/R vs A/P por productor)"
+
+    # ------------------------------
+    # PARTIDAS ABIERTAS
+    # ------------------------------
+
+    @api.model
+    def _fetch_open_items(self, company, producers=None):
+        """Partidas abiertas a compensar, agrupadas por productor.
+
+        Una sola consulta: residuales A/R de facturas cliente (insumos) y A/P
+        de vendor bills LPG (diario de liquidaciones), en moneda de la
+        compañía, sólo de productores que tienen partidas de ambos lados.
+
+        Devuelve ``{partner_id: {"receivable": [...], "payable": [...]}}`` con
+        dicts ``{"id", "account_id", "due", "date", "residual"}``.
+        """
+        self.env["account.move.line"].flush_model([
+            "partner_id", "account_id", "move_id", "company_id", "currency_id",
+            "parent_state", "reconciled", "amount_residual", "date", "date_maturity",
+        ])
+        self.env["account.move"].flush_model(["move_type", "journal_id"])
+
+        where_partner = ""
+        params = {
+            "company_id": company.id,
+            "currency_id": company.currency_id.id,
+            "lpg_journal_id": company.grain_liquidation_journal_id.id or 0,
+        }
+        if producers is not None:
+            where_partner = "AND aml.partner_id IN %(partner_ids)s"
+            params["partner_ids"] = tuple(producers.ids) or (0,)
+
+        self.env.cr.execute(
+            """
+            WITH items AS (
+                SELECT aml.partner_id,
+                       aml.id,
+                       aml.account_id,
+                       CASE WHEN acc.account_type = 'asset_receivable' THEN 'receivable' ELSE 'payable' END AS side,
+                       COALESCE(aml.date_maturity, aml.date) AS due,
+                       aml.date,
+                       ABS(aml.amount_residual) AS residual
+                  FROM account_move_line aml
+                  JOIN account_account acc ON acc.id = aml.account_id
+                  JOIN account_move m ON m.id = aml.move_id
+                 WHERE aml.company_id = %(company_id)s
+                   AND aml.currency_id = %(currency_id)s
+                   AND aml.parent_state = 'posted'
+                   AND NOT aml.reconciled
+                   AND aml.amount_residual != 0
+                   AND aml.partner_id IS NOT NULL
+                   AND (
+                        (acc.account_type = 'asset_receivable' AND m.move_type = 'out_invoice')
+                     OR (acc.account_type = 'liability_payable' AND m.move_type = 'in_invoice'
+                         AND m.journal_id = %(lpg_journal_id)s)
+                   )
+                   {where_partner}
+            ),
+            producers AS (
+                SELECT partner_id
+                  FROM items
+              GROUP BY partner_id
+                HAVING bool_or(side = 'receivable') AND bool_or(side = 'payable')
+            )
+            SELECT items.*
+              FROM items
+              JOIN producers USING (partner_id)
+          ORDER BY items.partner_id, items.id
+            """.format(where_partner=where_partner),
+            params,
+        )
+
+        result = {}
+        for row in self.env.cr.dictfetchall():
+            sides = result.setdefault(row["partner_id"], {"receivable": [], "payable": []})
+            sides[row["side"]].append(row)
+        return result
+
+    @api.model
+    def _lines_to_items(self, lines):
+        """Partidas abiertas de ``lines`` con la misma forma que ``_fetch_open_items``.
+
+        Igual que ``_fetch_open_items``, sólo las partidas en moneda de la
+        compañía: el residual que se compensa es el de esa moneda.
+        """
+        return [
+            {
+                "id": line.id,
+                "account_id": line.account_id.id,
+                "due": line.date_maturity or line.date,
+                "date": line.date,
+                "residual": abs(line.amount_residual),
+            }
+            for line in lines
+            if not line.reconciled
+            and line.currency_id == line.company_currency_id
+            and not line.company_currency_id.is_zero(line.amount_residual)
+        ]
+
+    @api.model
+    def _match(self, receivables, payables, currency, strategy="due_date", limit=None):
+        """Empareja partidas A/R y A/P en orden FIFO.
+
+        ``strategy``: ``due_date`` (vencimiento más próximo primero) o
+        ``date`` (la más antigua primero). ``limit`` acota el monto total a
+        compensar. Los montos se redondean y comparan con ``currency``, así
+        un residuo de coma flotante no deja una partida "abierta" por
+        centésimos. Devuelve ``(monto_total, {line_id: monto compensado})``.
+        """
+        if strategy == "date":
+            sort_key = lambda item: (item["date"], item["id"])  # noqa: E731
+        else:
+            sort_key = lambda item: (item["due"], item["id"])  # noqa: E731
+        receivables = sorted(receivables, key=sort_key)
+        payables = sorted(payables, key=sort_key)
+
+        matched = {}
+        total = 0.0
+        i = j = 0
+        recv_left = currency.round(receivables[0]["residual"]) if receivables else 0.0
+        pay_left = currency.round(payables[0]["residual"]) if payables else 0.0
+        while i < len(receivables) and j < len(payables):
+            amount = min(recv_left, pay_left)
+            if limit is not None:
+                amount = currency.round(min(amount, limit - total))
+                if currency.compare_amounts(amount, 0.0) <= 0:
+                    break
+            if not currency.is_zero(amount):
+                matched[receivables[i]["id"]] = currency.round(matched.get(receivables[i]["id"], 0.0) + amount)
+                matched[payables[j]["id"]] = currency.round(matched.get(payables[j]["id"], 0.0) + amount)
+                total = currency.round(total + amount)
+                recv_left = currency.round(recv_left - amount)
+                pay_left = currency.round(pay_left - amount)
+            if currency.is_zero(recv_left) or recv_left < 0.0:
+                i += 1
+                recv_left = currency.round(receivables[i]["residual"]) if i < len(receivables) else 0.0
+            if currency.is_zero(pay_left) or pay_left < 0.0:
+                j += 1
+                pay_left = currency.round(payables[j]["residual"]) if j < len(payables) else 0.0
+        return total, matched
+
+    # ------------------------------
+    # ASIENTO DE COMPENSACIÓN
+    # ------------------------------
+
+    @api.model
+    def _prepare_netting_move_vals(self, company, partner, receivable_amounts, payable_amounts, ref):
+        """Asiento de compensación: Debe A/P y Haber A/R, una línea por cuenta."""
+        line_vals = []
+        for account_id, amount in payable_amounts.items():
+            line_vals.append((0, 0, {
+                "name": _("Compensación Canje (Dr A/P)"),
+                "partner_id": partner.id,
+                "account_id": account_id,
+                "debit": amount,
+                "credit": 0.0,
+            }))
+        for account_id, amount in receivable_amounts.items():
+            line_vals.append((0, 0, {
+                "name": _("Compensación Canje (Cr A/R)"),
+                "partner_id": partner.id,
+                "account_id": account_id,
+                "debit": 0.0,
+                "credit": amount,
+            }))
+        return {
+            "move_type": "entry",
+            "date": fields.Date.context_today(self),
+            "ref": ref,
+            "journal_id": company.grain_netting_journal_id.id,
+            "company_id": company.id,
+            "line_ids": line_vals,
+        }
+
+    @api.model
+    def _plan_netting(self, company, partner, receivables, payables, ref, strategy="due_date", limit=None):
+        """Valores del asiento de compensación de un productor.
+
+        Devuelve ``(vals, líneas a conciliar)``; ``(False, vacío)`` si no hay
+        nada que compensar.
+        """
+        currency = company.currency_id
+        total, matched = self._match(receivables, payables, currency, strategy, limit=limit)
+        if currency.is_zero(total):
+            return False, self.env["account.move.line"]
+
+        amounts = {"receivable": {}, "payable": {}}
+        for side, side_items in (("receivable", receivables), ("payable", payables)):
+            account_amounts = amounts[side]
+            for item in side_items:
+                if item["id"] in matched:
+                    account_amounts[item["account_id"]] = (
+                        account_amounts.get(item["account_id"], 0.0) + matched[item["id"]]
+                    )
+            # Redondeo una sola vez por cuenta; la diferencia contra el total va a la última cuenta
+            for account_id in account_amounts:
+                account_amounts[account_id] = currency.round(account_amounts[account_id])
+            if account_amounts:
+                difference = currency.round(total - sum(account_amounts.values()))
+                if not currency.is_zero(difference):
+                    last_account_id = list(account_amounts)[-1]
+                    account_amounts[last_account_id] = currency.round(account_amounts[last_account_id] + difference)
+        vals = self._prepare_netting_move_vals(
+            company, partner, amounts["receivable"], amounts["payable"], ref
+        )
+        return vals, self.env["account.move.line"].browse(list(matched))
+
+    @api.model
+    def _netting_line_sets(self, net_move, counterpart_lines):
+        """Juegos a conciliar: cada línea del asiento con las partidas de su misma cuenta."""
+        return [
+            net_line + counterpart_lines.filtered(
+                lambda l: l.account_id == net_line.account_id and not l.reconciled
+            )
+            for net_line in net_move.line_ids
+        ]
+
+    @api.model
+    def _reconcile_netting(self, net_moves, counterpart_lines_list):
+        """Concilia los asientos de compensación con sus partidas (un juego por línea del asiento)."""
+        line_sets = []
+        for net_move, counterpart_lines in zip(net_moves, counterpart_lines_list):
+            line_sets += self._netting_line_sets(net_move, counterpart_lines)
+        self.env["account.move.line"]._grain_reconcile_batch(line_sets)
+
+    # ------------------------------
+    # CORRIDA
+    # ------------------------------
+
+    @api.model
+    def _run(self, company, producers=None, strategy="due_date"):
+        """Compensa A/R vs A/P de todos los productores indicados (o de todos).
+
+        Un asiento por productor, creados con un solo ``create()`` y
+        publicados juntos. Devuelve los asientos de compensación.
+        """
+        if not company.grain_netting_journal_id:
+            raise UserError(_("Configurá el diario de compensaciones (Ajustes)."))
+
+        items = self._fetch_open_items(company, producers)
+
+        vals_list = []
+        plans = []
+        for partner_id, sides in items.items():
+            partner = self.env["res.partner"].browse(partner_id)
+            vals, counterpart_lines = self._plan_netting(
+                company,
+                partner,
+                sides["receivable"],
+                sides["payable"],
+                _("Compensación Canje automática: %s") % partner.display_name,
+                strategy=strategy,
+            )
+            if vals:
+                vals_list.append(vals)
+                plans.append(counterpart_lines)
+
+        net_moves = self.env["account.move"].create(vals_list)
+        net_moves.action_post()
+        self._reconcile_netting(net_moves, plans)
+        return net_moves
+
+    @api.model
+    def _cron_run_netting(self, strategy="due_date"):
+        companies = self.env["res.company"].search([("grain_netting_journal_id", "!=", False)])
+        for company in companies:
+            bulk_mode(self.with_company(company))._run(company, strategy=strategy)
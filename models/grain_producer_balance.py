@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import api, fields, models, _
+
+_logger = logging.getLogger(__name__)
+
+
+class GrainProducerBalance(models.Model):
+    _name = "grain.producer.balance"
+    _inherit = ["grain.rollup.mixin"]
+    _description = "Saldo de cuenta corriente cereal por productor"
+    _order = "company_id, producer_id, campaign_id, product_id"
+
+    _rollup_keys = ("company_id", "producer_id", "campaign_id", "product_id")
+    _rollup_measures = ("tn_canje", "amount_canje", "tn_lpg", "amount_lpg", "amount_netted")
+
+    company_id = fields.Many2one("res.company", string="Compañía", required=True, readonly=True)
+    producer_id = fields.Many2one("res.partner", string="Productor", required=True, readonly=True)
+    campaign_id = fields.Many2one("grain.canje.campaign", string="Campaña", readonly=True)
+    product_id = fields.Many2one("product.product", string="Grano", readonly=True)
+    currency_id = fields.Many2one(related="company_id.currency_id", readonly=True)
+
+    tn_canje = fields.Float(string="TN canjeadas", digits=(16, 3), readonly=True)
+    amount_canje = fields.Monetary(string="Canje (Cta Cte Cereal)", currency_field="currency_id", readonly=True)
+    tn_lpg = fields.Float(string="TN liquidadas", digits=(16, 3), readonly=True)
+    amount_lpg = fields.Monetary(string="Liquidado (LPG)", currency_field="currency_id", readonly=True)
+    amount_netted = fields.Monetary(string="Compensado", currency_field="currency_id", readonly=True)
+
+    def init(self):
+        self._rollup_create_index()
+
+    @api.model
+    def _get_balance(self, company, producer, campaign=None, product=None):
+        """Fila de saldo de la clave (lectura de una sola fila)."""
+        return self.search([
+            ("company_id", "=", company.id),
+            ("producer_id", "=", producer.commercial_partner_id.id),
+            ("campaign_id", "=", campaign.id if campaign else False),
+            ("product_id", "=", product.id if product else False),
+        ], limit=1)
+
+    # ------------------------------
+    # RECONSTRUCCIÓN Y CONTROL
+    # ------------------------------
+
+    def _source_query(self):
+        """Movimientos de origen, con la misma clave y medidas que la tabla."""
+        return """
+            -- Aplicaciones de canje
+            SELECT c.company_id,
+                   p.commercial_partner_id AS producer_id,
+                   c.campaign_id,
+                   c.product_id,
+                   app.tn_aplicadas AS tn_canje,
+                   COALESCE(app.amount_company, 0.0) AS amount_canje,
+                   0.0 AS tn_lpg,
+                   0.0 AS amount_lpg,
+                   0.0 AS amount_netted
+              FROM grain_canje_application app
+              JOIN grain_canje_contract c ON c.id = app.contract_id
+              JOIN res_partner p ON p.id = c.producer_id
+
+             UNION ALL
+
+            -- Liquidaciones publicadas (campaña según fecha)
+            SELECT l.company_id, p.commercial_partner_id, camp.id, l.product_id,
+                   0.0, 0.0, l.qty_tn, l.amount, 0.0
+              FROM grain_liquidation l
+              JOIN res_partner p ON p.id = l.producer_id
+              LEFT JOIN LATERAL (
+                  SELECT gc.id
+                    FROM grain_canje_campaign gc
+                   WHERE gc.company_id = l.company_id
+                     AND l.date BETWEEN gc.date_start AND gc.date_end
+                ORDER BY gc.date_start DESC
+                   LIMIT 1
+              ) camp ON TRUE
+             WHERE l.state = 'posted'
+
+             UNION ALL
+
+            -- Compensaciones (Debe A/P de los asientos del diario de compensaciones)
+            SELECT aml.company_id, p.commercial_partner_id, NULL, NULL,
+                   0.0, 0.0, 0.0, 0.0, aml.debit
+              FROM account_move_line aml
+              JOIN res_company comp ON comp.id = aml.company_id
+              JOIN account_account acc ON acc.id = aml.account_id
+              JOIN res_partner p ON p.id = aml.partner_id
+             WHERE aml.journal_id = comp.grain_netting_journal_id
+               AND aml.parent_state = 'posted'
+               AND acc.account_type = 'liability_payable'
+               AND aml.debit > 0
+        """
+
+    @api.model
+    def _verify(self, tolerance=0.01):
+        """Controla la tabla contra los movimientos de origen y el canje contra la contabilidad.
+
+        Todas las medidas (TN y canje, TN e importe de LPG, compensado) se
+        comparan por clave con ``_source_query``. Además el canje acumulado
+        por (compañía, productor) se compara con el Haber neto de
+        ``res.company.canje_account_id`` en apuntes publicados. Devuelve una
+        lista de ``(company_id, producer_id, medida, valor_tabla,
+        valor_esperado)`` con las diferencias; la medida ``contabilidad`` es
+        el control contra la cuenta de canje.
+        """
+        mismatches = [
+            (key["company_id"], key["producer_id"], measure, table_value, source_value)
+            for key, measure, table_value, source_value in self._rollup_diff(tolerance)
+        ]
+        self.env.cr.execute(
+            """
+            WITH rollup AS (
+                SELECT company_id, producer_id, SUM(amount_canje) AS amount
+                  FROM grain_producer_balance
+              GROUP BY company_id, producer_id
+            ),
+            ledger AS (
+                SELECT aml.company_id, p.commercial_partner_id AS producer_id, -SUM(aml.balance) AS amount
+                  FROM account_move_line aml
+                  JOIN res_company comp ON comp.id = aml.company_id AND comp.canje_account_id = aml.account_id
+                  JOIN res_partner p ON p.id = aml.partner_id
+                 WHERE aml.parent_state = 'posted'
+              GROUP BY aml.company_id, p.commercial_partner_id
+            )
+            SELECT COALESCE(r.company_id, l.company_id),
+                   COALESCE(r.producer_id, l.producer_id),
+                   'contabilidad',
+                   COALESCE(r.amount, 0.0),
+                   COALESCE(l.amount, 0.0)
+              FROM rollup r
+              FULL OUTER JOIN ledger l ON l.company_id = r.company_id AND l.producer_id = r.producer_id
+             WHERE ABS(COALESCE(r.amount, 0.0) - COALESCE(l.amount, 0.0)) > %s
+            """,
+            (tolerance,),
+        )
+        return mismatches + self.env.cr.fetchall()
+
+    @api.model
+    def action_rebuild(self):
+        drift = [row for row in self._verify() if row[2] != "contabilidad"]
+        rows = self._rebuild()
+        mismatches = self._verify()
+        for company_id, producer_id, measure, table_value, expected in drift + mismatches:
+            _logger.warning(
+                "Saldo cereal productor %s (compañía %s), %s: tabla %.2f, esperado %.2f",
+                producer_id, company_id, measure, table_value, expected,
+            )
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": _("Saldos de productores reconstruidos"),
+                "message": _(
+                    "Filas: %(rows)s. Diferencias corregidas: %(drift)s. "
+                    "Productores con diferencias contra la contabilidad: %(diff)s."
+                ) % {
+                    "rows": rows,
+                    "drift": len(drift),
+                    "diff": len({(row[0], row[1]) for row in mismatches}),
+                },
+                "sticky": bool(drift or mismatches),
+                "type": "warning" if drift or mismatches else "success",
+            },
+        }
+
+
+class GrainCanjeApplication(models.Model):
+    _inherit = "grain.canje.application"
+
+    def _producer_balance_deltas(self, sign=1):
+        return [
+            {
+                "company_id": app.contract_id.company_id.id,
+                "producer_id": app.contract_id.producer_id.commercial_partner_id.id,
+                "campaign_id": app.contract_id.campaign_id.id,
+                "product_id": app.contract_id.product_id.id,
+                "tn_canje": sign * app.tn_aplicadas,
+                "amount_canje": sign * app.amount_company,
+            }
+            for app in self
+        ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        applications = super().create(vals_list)
+        self.env["grain.producer.balance"]._rollup_add(applications._producer_balance_deltas())
+        return applications
+
+    def write(self, vals):
+        if "tn_aplicadas" not in vals and "contract_id" not in vals:
+            return super().write(vals)
+        deltas = self._producer_balance_deltas(sign=-1)
+        res = super().write(vals)
+        self.env["grain.producer.balance"]._rollup_add(deltas + self._producer_balance_deltas())
+        return res
+
+    def unlink(self):
+        deltas = self._producer_balance_deltas(sign=-1)
+        res = super().unlink()
+        self.env["grain.producer.balance"]._rollup_add(deltas)
+        return res
+
+
+class GrainLiquidation(models.Model):
+    _inherit = "grain.liquidation"
+
+    def _producer_balance_deltas(self, sign=1):
+        campaigns = self.env["grain.canje.campaign"].search(
+            [("company_id", "in", self.company_id.ids), ("date_start", "!=", False), ("date_end", "!=", False)],
+            order="date_start desc",
+        )
+        deltas = []
+        for lpg in self:
+            campaign = next(
+                (c for c in campaigns if c.company_id == lpg.company_id and c.date_start <= lpg.date <= c.date_end),
+                campaigns.browse(),
+            )
+            deltas.append({
+                "company_id": lpg.company_id.id,
+                "producer_id": lpg.producer_id.commercial_partner_id.id,
+                "campaign_id": campaign.id,
+                "product_id": lpg.product_id.id,
+                "tn_lpg": sign * lpg.qty_tn,
+                "amount_lpg": sign * lpg.amount,
+            })
+        return deltas
+
+    def write(self, vals):
+        if "state" not in vals:
+            return super().write(vals)
+        was_posted = self.filtered(lambda l: l.state == "posted")
+        deltas = was_posted._producer_balance_deltas(sign=-1)
+        res = super().write(vals)
+        deltas += self.filtered(lambda l: l.state == "posted")._producer_balance_deltas()
+        self.env["grain.producer.balance"]._rollup_add(deltas)
+        return res
+
+    def unlink(self):
+        deltas = self.filtered(lambda l: l.state == "posted")._producer_balance_deltas(sign=-1)
+        res = super().unlink()
+        self.env["grain.producer.balance"]._rollup_add(deltas)
+        return res
+
+
+class AccountMove(models.Model):
+    _inherit = "account.move"
+
+    def _grain_netting_balance_deltas(self, sign=1):
+        lines = self.filtered(
+            lambda m: m.journal_id == m.company_id.grain_netting_journal_id
+        ).line_ids.filtered(
+            lambda l: l.account_id.account_type == "liability_payable" and l.debit > 0 and l.partner_id
+        )
+        return [
+            {
+                "company_id": line.company_id.id,
+                "producer_id": line.partner_id.commercial_partner_id.id,
+                "amount_netted": sign * line.debit,
+            }
+            for line in lines
+        ]
+
+    def _post(self, soft=True):
+        posted = super()._post(soft=soft)
+        self.env["grain.producer.balance"]._rollup_add(posted._grain_netting_balance_deltas())
+        return posted
+
+    def button_draft(self):
+        deltas = self.filtered(lambda m: m.state == "posted")._grain_netting_balance_deltas(sign=-1)
+        res = super().button_draft()
+        self.env["grain.producer.balance"]._rollup_add(deltas)
+        return res
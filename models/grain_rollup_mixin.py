@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models, _
+
+
+class GrainRollupMixin(models.AbstractModel):
+    """Tabla de totales mantenida por diferencias.
+
+    El modelo concreto declara ``_rollup_keys`` (campos Many2one o Date de la
+    clave, pueden ser nulos) y ``_rollup_measures`` (campos numéricos acumulados), y
+    crea en ``init()`` el índice único de la clave con ``_rollup_create_index``.
+    """
+
+    _name = "grain.rollup.mixin"
+    _description = "Totales incrementales (mixin)"
+
+    _rollup_keys = ()
+    _rollup_measures = ()
+
+    def _rollup_create_index(self):
+        # COALESCE: las claves nulas (sin campaña / sin grano) también son únicas
+        self._cr.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", ("%s_key_uniq" % self._table,))
+        if not self._cr.fetchone():
+            self._cr.execute(
+                "CREATE UNIQUE INDEX %s_key_uniq ON %s (%s)"
+                % (self._table, self._table, self._rollup_conflict_target())
+            )
+
+    def _rollup_key_type(self, key):
+        """Tipo SQL de la clave y valor que reemplaza al nulo en el índice único."""
+        if self._fields[key].type == "date":
+            return "date", "'1970-01-01'::date"
+        return "int", "0"
+
+    def _rollup_conflict_target(self):
+        return ", ".join(
+            "COALESCE(%s, %s)" % (key, self._rollup_key_type(key)[1]) for key in self._rollup_keys
+        )
+
+    @api.model
+    def _rollup_add(self, deltas):
+        """Suma ``deltas`` a los totales con un solo INSERT ... ON CONFLICT.
+
+        ``deltas`` es una lista de dicts con los ids de la clave (o ``False``)
+        y las medidas a sumar; las filas con la misma clave se agrupan antes.
+        """
+        grouped = {}
+        for delta in deltas:
+            key = tuple(delta.get(field) or None for field in self._rollup_keys)
+            totals = grouped.setdefault(key, dict.fromkeys(self._rollup_measures, 0.0))
+            for measure in self._rollup_measures:
+                totals[measure] += delta.get(measure) or 0.0
+        grouped = {
+            key: totals for key, totals in grouped.items()
+            if any(abs(value) > 1e-9 for value in totals.values())
+        }
+        if not grouped:
+            return
+
+        keys = list(grouped)
+        columns = list(self._rollup_keys) + list(self._rollup_measures)
+        arrays = [[key[i] for key in keys] for i in range(len(self._rollup_keys))]
+        arrays += [[grouped[key][measure] for key in keys] for measure in self._rollup_measures]
+        types = [self._rollup_key_type(key)[0] for key in self._rollup_keys]
+        types += ["float8"] * len(self._rollup_measures)
+        unnest = ", ".join(
+            "unnest(%%s::%s[]) AS %s" % (sql_type, column) for sql_type, column in zip(types, columns)
+        )
+
+        self.flush_model()
+        self.env.cr.execute(
+            """
+            INSERT INTO {table} ({columns}, create_uid, create_date, write_uid, write_date)
+            SELECT {columns}, %s, now() AT TIME ZONE 'UTC', %s, now() AT TIME ZONE 'UTC'
+              FROM (SELECT {unnest}) v
+                ON CONFLICT ({target})
+                DO UPDATE SET {updates},
+                              write_uid = EXCLUDED.write_uid,
+                              write_date = EXCLUDED.write_date
+            """.format(
+                table=self._table,
+                columns=", ".join(columns),
+                unnest=unnest,
+                target=self._rollup_conflict_target(),
+                updates=", ".join(
+                    "{m} = COALESCE({table}.{m}, 0.0) + EXCLUDED.{m}".format(m=measure, table=self._table)
+                    for measure in self._rollup_measures
+                ),
+            ),
+            [self.env.uid, self.env.uid] + arrays,
+        )
+        self.invalidate_model(list(self._rollup_measures))
+
+    def _source_query(self):
+        """SELECT con las columnas de la clave y las medidas, una fila por movimiento de origen."""
+        raise NotImplementedError(
+            _("El modelo %s debe definir _source_query() para reconstruir sus totales.") % self._name
+        )
+
+    @api.model
+    def _rebuild(self):
+        """Recalcula toda la tabla desde los movimientos de origen (``_source_query``)."""
+        self.env.flush_all()
+        keys = ", ".join(self._rollup_keys)
+        self.env.cr.execute("DELETE FROM %s" % self._table)
+        self.env.cr.execute(
+            """
+            INSERT INTO {table} ({keys}, {measures}, create_uid, create_date, write_uid, write_date)
+            SELECT {keys}, {sums}, %s, now() AT TIME ZONE 'UTC', %s, now() AT TIME ZONE 'UTC'
+              FROM ({source}) src
+          GROUP BY {keys}
+            """.format(
+                table=self._table,
+                keys=keys,
+                measures=", ".join(self._rollup_measures),
+                sums=", ".join("SUM(%s)" % measure for measure in self._rollup_measures),
+                source=self._source_query(),
+            ),
+            (self.env.uid, self.env.uid),
+        )
+        self.invalidate_model()
+        return self.env.cr.rowcount
+
+    @api.model
+    def _rollup_diff(self, tolerance=0.01):
+        """Claves cuyas medidas en la tabla difieren de los movimientos de origen.
+
+        Compara todas las ``_rollup_measures`` por clave (las claves nulas
+        también). Devuelve una lista de ``(clave, medida, valor_tabla,
+        valor_origen)``, con ``clave`` un dict ``{campo: id o fecha}``.
+        """
+        self.env.flush_all()
+        keys = list(self._rollup_keys)
+        measures = list(self._rollup_measures)
+        self.env.cr.execute(
+            """
+            WITH tbl AS (
+                SELECT {keys}, {sums} FROM {table} GROUP BY {keys}
+            ),
+            src AS (
+                SELECT {keys}, {sums} FROM ({source}) s GROUP BY {keys}
+            )
+            SELECT {coalesced_keys}, {pairs}
+              FROM tbl t
+              FULL OUTER JOIN src s ON {join}
+            """.format(
+                table=self._table,
+                keys=", ".join(keys),
+                sums=", ".join("SUM(%s) AS %s" % (measure, measure) for measure in measures),
+                source=self._source_query(),
+                coalesced_keys=", ".join("COALESCE(t.%s, s.%s)" % (key, key) for key in keys),
+                pairs=", ".join(
+                    "COALESCE(t.%s, 0.0), COALESCE(s.%s, 0.0)" % (measure, measure) for measure in measures
+                ),
+                join=" AND ".join("t.%s IS NOT DISTINCT FROM s.%s" % (key, key) for key in keys),
+            )
+        )
+        diffs = []
+        for row in self.env.cr.fetchall():
+            key = dict(zip(keys, row[:len(keys)]))
+            values = row[len(keys):]
+            for index, measure in enumerate(measures):
+                table_value, source_value = values[2 * index], values[2 * index + 1]
+                if abs(table_value - source_value) > tolerance:
+                    diffs.append((key, measure, table_value, source_value))
+        return diffs
+
+    @api.model
+    def _rollup_seed(self):
+        """Carga inicial (instalación / actualización): reconstruye si la tabla está vacía."""
+        self.env.cr.execute("SELECT 1 FROM %s LIMIT 1" % self._table)
+        if not self.env.cr.fetchone():
+            self._rebuild()
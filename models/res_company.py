@@ -15,6 +15,17 @@ class ResCompany(models.Model):
         string="Diario de Canje",
         help="Diario contable utilizado para las operaciones de canje (pago a proveedor).",
     )
+    canje_allocation_order = fields.Selection(
+        [
+            ("date", "Fecha de contrato"),
+            ("campaign", "Campaña"),
+            ("priority", "Prioridad del contrato"),
+        ],
+        string="Orden de asignación automática",
+        default="date",
+        help="Orden en que se consumen los contratos vigentes del proveedor al repartir una factura "
+             "entre varios contratos (el más antiguo primero).",
+    )
 
     # NUEVO: Config para LPG/LSG + nettings (Tramo A)
     grain_clearing_account_id = fields.Many2one(
@@ -18,6 +18,11 @@ class ResConfigSettings(models.TransientModel):
         related="company_id.canje_journal_id",
         readonly=False,
     )
+    canje_allocation_order = fields.Selection(
+        string="Orden de asignación automática",
+        related="company_id.canje_allocation_order",
+        readonly=False,
+    )
 
     # NUEVO: LPG/LSG + netting (Tramo A)
     grain_clearing_account_id = fields.Many2one(
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_right
+
+from odoo import api, fields, models
+
+# Clave del caché de cotizaciones en ``cr.cache`` (vive lo que dura la transacción)
+RATE_CACHE_KEY = "grain_canje_rates"
+
+
+class ResCurrency(models.Model):
+    _inherit = "res.currency"
+
+    # ------------------------------
+    # CACHÉ DE COTIZACIONES POR TRANSACCIÓN
+    # ------------------------------
+
+    @api.model
+    def _canje_rate_cache(self):
+        """Caché ``{(currency_id, company_id): datos}`` de la transacción en curso.
+
+        Se descarta al confirmar o deshacer la transacción y cada vez que
+        cambia una cotización (ver ``res.currency.rate``).
+        """
+        cr = self.env.cr
+        cache = cr.cache.get(RATE_CACHE_KEY)
+        if cache is None:
+            cache = cr.cache[RATE_CACHE_KEY] = {}
+            cr.postcommit.add(lambda: cr.cache.pop(RATE_CACHE_KEY, None))
+            cr.postrollback.add(lambda: cr.cache.pop(RATE_CACHE_KEY, None))
+        return cache
+
+    @api.model
+    def _canje_clear_rate_cache(self):
+        self.env.cr.cache.pop(RATE_CACHE_KEY, None)
+
+    def _canje_prefetch_rates(self, company, date_from, date_to):
+        """Carga en una consulta las cotizaciones de ``self`` para el rango de fechas.
+
+        Trae las cotizaciones del rango más la última anterior a ``date_from``,
+        separando las de la compañía de las globales para aplicar la misma
+        regla que ``_get_rates`` (la cotización de la compañía tiene prioridad).
+        """
+        if not self:
+            return
+        self.env["res.currency.rate"].flush_model(["currency_id", "company_id", "name", "rate"])
+        self.env.cr.execute(
+            """
+            SELECT currency_id, company_id IS NOT NULL AS own, name, rate
+              FROM res_currency_rate
+             WHERE currency_id IN %(currency_ids)s
+               AND (company_id = %(company_id)s OR company_id IS NULL)
+               AND name BETWEEN %(date_from)s AND %(date_to)s
+             UNION ALL
+            (
+                SELECT DISTINCT ON (currency_id, company_id IS NOT NULL)
+                       currency_id, company_id IS NOT NULL, name, rate
+                  FROM res_currency_rate
+                 WHERE currency_id IN %(currency_ids)s
+                   AND (company_id = %(company_id)s OR company_id IS NULL)
+                   AND name < %(date_from)s
+              ORDER BY currency_id, company_id IS NOT NULL, name DESC
+            )
+          ORDER BY 1, 2, 3
+            """,
+            {
+                "currency_ids": tuple(self.ids),
+                "company_id": company.id,
+                "date_from": date_from,
+                "date_to": date_to,
+            },
+        )
+        series = {currency.id: {"own": [], "global": []} for currency in self}
+        for currency_id, own, date, rate in self.env.cr.fetchall():
+            series[currency_id]["own" if own else "global"].append((date, rate))
+
+        cache = self._canje_rate_cache()
+        for currency_id, data in series.items():
+            data["dates"] = {
+                side: [date for date, _rate in data[side]] for side in ("own", "global")
+            }
+            data["date_from"] = date_from
+            data["date_to"] = date_to
+            cache[(currency_id, company.id)] = data
+
+    def _canje_rate(self, company, date):
+        """Cotización de la moneda a ``date`` (1.0 si no hay), leída del caché."""
+        self.ensure_one()
+        date = fields.Date.to_date(date)
+        data = self._canje_rate_cache().get((self.id, company.id))
+        if not data or not (data["date_from"] <= date <= data["date_to"]):
+            date_from = min(date, data["date_from"]) if data else date
+            date_to = max(date, data["date_to"]) if data else date
+            self._canje_prefetch_rates(company, date_from, date_to)
+            data = self._canje_rate_cache()[(self.id, company.id)]
+
+        for side in ("own", "global"):
+            index = bisect_right(data["dates"][side], date)
+            if index:
+                return data[side][index - 1][1]
+        return 1.0
+
+    def _canje_convert(self, amount, to_currency, company, date, round=True):
+        """Equivalente a ``_convert`` usando el caché de cotizaciones de la transacción."""
+        self.ensure_one()
+        if self == to_currency or not amount:
+            converted = amount
+        else:
+            converted = amount * to_currency._canje_rate(company, date) / self._canje_rate(company, date)
+        return to_currency.round(converted) if round else converted
+
+
+class ResCurrencyRate(models.Model):
+    _inherit = "res.currency.rate"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env["res.currency"]._canje_clear_rate_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self.env["res.currency"]._canje_clear_rate_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env["res.currency"]._canje_clear_rate_cache()
+        return super().unlink()
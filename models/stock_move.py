@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from odoo import fields, models, _
+from odoo.tools.float_utils import float_is_zero
+
+
+class StockMove(models.Model):
+    _inherit = "stock.move"
+
+    # ------------------------------
+    # VINCULACIÓN AUTOMÁTICA A CONTRATOS
+    # ------------------------------
+
+    def _canje_link_contracts(self):
+        """Vincula los movimientos realizados que no tienen contrato.
+
+        Las recepciones se asignan, con una sola consulta, al contrato vigente
+        más antiguo del productor (partner del movimiento o del remito) para el
+        mismo grano y compañía, cuya campaña incluya la fecha del movimiento.
+        Las devoluciones quedan en el contrato del movimiento original.
+        """
+        self.flush_model([
+            "state", "product_id", "partner_id", "picking_id", "picking_type_id",
+            "date", "company_id", "origin_returned_move_id",
+        ])
+        self.env["stock.picking"].flush_model(["partner_id"])
+        self.env["res.partner"].flush_model(["commercial_partner_id"])
+        self.env["grain.canje.contract"].flush_model([
+            "product_id", "company_id", "state", "producer_id", "campaign_id", "date", "stock_move_ids",
+        ])
+        self.env["grain.canje.campaign"].flush_model(["date_start", "date_end"])
+
+        cr = self.env.cr
+        cr.execute(
+            """
+            INSERT INTO grain_canje_contract_move_rel (contract_id, move_id)
+            SELECT DISTINCT ON (sm.id) c.id, sm.id
+              FROM stock_move sm
+              JOIN stock_picking_type spt ON spt.id = sm.picking_type_id AND spt.code = 'incoming'
+         LEFT JOIN stock_picking sp ON sp.id = sm.picking_id
+              JOIN res_partner pm ON pm.id = COALESCE(sm.partner_id, sp.partner_id)
+              JOIN grain_canje_contract c
+                ON c.product_id = sm.product_id
+               AND c.company_id = sm.company_id
+               AND c.state = 'open'
+              JOIN res_partner pc ON pc.id = c.producer_id AND pc.commercial_partner_id = pm.commercial_partner_id
+         LEFT JOIN grain_canje_campaign camp ON camp.id = c.campaign_id
+             WHERE sm.id IN %(ids)s
+               AND sm.state = 'done'
+               AND sm.origin_returned_move_id IS NULL
+               AND NOT EXISTS (SELECT 1 FROM grain_canje_contract_move_rel r WHERE r.move_id = sm.id)
+               AND (camp.date_start IS NULL OR sm.date::date >= camp.date_start)
+               AND (camp.date_end IS NULL OR sm.date::date <= camp.date_end)
+          ORDER BY sm.id, c.date, c.id
+                ON CONFLICT DO NOTHING
+            """,
+            {"ids": tuple(self.ids)},
+        )
+        linked = cr.rowcount
+        cr.execute(
+            """
+            INSERT INTO grain_canje_contract_move_rel (contract_id, move_id)
+            SELECT DISTINCT r.contract_id, sm.id
+              FROM stock_move sm
+              JOIN grain_canje_contract_move_rel r ON r.move_id = sm.origin_returned_move_id
+             WHERE sm.id IN %(ids)s
+               AND sm.state = 'done'
+                ON CONFLICT DO NOTHING
+            """,
+            {"ids": tuple(self.ids)},
+        )
+        linked += cr.rowcount
+        if linked:
+            self.env["grain.canje.contract"].invalidate_model(["stock_move_ids"])
+        return linked
+
+    # ------------------------------
+    # TN MRV INCREMENTALES
+    # ------------------------------
+
+    def _canje_mrv_totals(self):
+        """TN de los movimientos realizados y vinculados, por contrato.
+
+        En la UoM del producto del contrato; las devoluciones restan. Devuelve
+        ``(tn, notas, fechas)``, cada uno ``{contract_id: valor}``.
+        """
+        self.flush_recordset(["state"])
+        self.env.cr.execute(
+            """
+            SELECT rel.contract_id, rel.move_id
+              FROM grain_canje_contract_move_rel rel
+              JOIN stock_move sm ON sm.id = rel.move_id
+             WHERE rel.move_id IN %s
+               AND sm.state = 'done'
+            """,
+            (tuple(self.ids),),
+        )
+        rows = self.env.cr.fetchall()
+        contracts = self.env["grain.canje.contract"].browse([row[0] for row in rows])
+        moves = self.browse([row[1] for row in rows])
+
+        totals = {}
+        notes = {}
+        dates = {}
+        for contract, move in zip(contracts, moves):
+            qty = move.product_uom._compute_quantity(
+                move.product_uom_qty, contract.product_id.uom_id or move.product_uom, round=False
+            )
+            if move.origin_returned_move_id:
+                qty = -qty
+            totals[contract.id] = totals.get(contract.id, 0.0) + qty
+            notes.setdefault(contract.id, []).append(move.picking_id.name or move.reference or move.display_name)
+            move_date = fields.Date.to_date(move.date)
+            dates[contract.id] = max(dates.get(contract.id, move_date), move_date)
+        return totals, {contract_id: ", ".join(dict.fromkeys(names)) for contract_id, names in notes.items()}, dates
+
+    def _canje_apply_mrv_delta(self):
+        """Suma (o resta, si es devolución) las TN de los movimientos a sus contratos."""
+        totals, notes, dates = self._canje_mrv_totals()
+        if totals:
+            self.env["grain.canje.contract"].browse(list(totals))._mrv_apply_deltas(totals, notes, dates)
+
+    def write(self, vals):
+        # Corrección de cantidad de un movimiento ya realizado: se aplica sólo la diferencia
+        if not {"product_uom_qty", "product_uom"} & set(vals):
+            return super().write(vals)
+        done = self.filtered(lambda m: m.state == "done")
+        before = done._canje_mrv_totals()[0] if done else {}
+        res = super().write(vals)
+        if done:
+            after, notes, dates = done._canje_mrv_totals()
+            deltas = {
+                contract_id: after.get(contract_id, 0.0) - before.get(contract_id, 0.0)
+                for contract_id in set(before) | set(after)
+            }
+            deltas = {
+                contract_id: delta for contract_id, delta in deltas.items()
+                if not float_is_zero(delta, precision_digits=3)
+            }
+            if deltas:
+                self.env["grain.canje.contract"].browse(list(deltas))._mrv_apply_deltas(deltas, notes, dates)
+        return res
+
+    def _action_done(self, cancel_backorder=False):
+        moves = super()._action_done(cancel_backorder=cancel_backorder)
+        done = moves.filtered(lambda m: m.state == "done")
+        if done:
+            done._canje_link_contracts()
+            done._canje_apply_mrv_delta()
+        return moves
+
+    def _action_cancel(self):
+        res = super()._action_cancel()
+        cancelled = self.filtered(lambda m: m.state == "cancel")
+        if cancelled:
+            # Sólo se cancelan movimientos no realizados: nunca sumaron TN, sólo se desvinculan
+            self.env.cr.execute(
+                "DELETE FROM grain_canje_contract_move_rel WHERE move_id IN %s",
+                (tuple(cancelled.ids),),
+            )
+            if self.env.cr.rowcount:
+                self.env["grain.canje.contract"].invalidate_model(["stock_move_ids"])
+        return res
+
+
+class GrainCanjeContract(models.Model):
+    _inherit = "grain.canje.contract"
+
+    def _mrv_apply_deltas(self, deltas, notes=None, dates=None):
+        """Aplica diferencias de TN MRV ``{contract_id: tn}`` sin recalcular la suma completa.
+
+        Un UPDATE para todos los contratos; sólo se recalcula ``tn_disponibles``
+        de esos contratos y la diferencia queda en el libro de TN, fechada con
+        ``dates`` ``{contract_id: fecha del movimiento}``.
+        """
+        notes = notes or {}
+        dates = dates or {}
+        self.flush_recordset(["tn_mrv", "tn_disponibles"])
+        before = {contract.id: contract.tn_disponibles for contract in self}
+        ids = list(deltas)
+        self.env.cr.execute(
+            """
+            UPDATE grain_canje_contract c
+               SET tn_mrv = ROUND((COALESCE(c.tn_mrv, 0.0) + v.delta)::numeric, 3)
+              FROM (SELECT unnest(%s::int[]) AS id, unnest(%s::float8[]) AS delta) v
+             WHERE c.id = v.id
+            """,
+            (ids, [deltas[contract_id] for contract_id in ids]),
+        )
+        self.invalidate_recordset(["tn_mrv"])
+        self.env.add_to_compute(self._fields["tn_disponibles"], self)
+        self.flush_recordset(["tn_disponibles"])
+
+        self.env["grain.canje.ledger"]._append([
+            {
+                "contract": contract,
+                "kind": "mrv",
+                "tn": contract.tn_disponibles - before[contract.id],
+                "date": dates.get(contract.id),
+                "note": notes.get(contract.id) or _("Recepción MRV"),
+            }
+            for contract in self
+        ])
+        return True
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+from . import test_campaign_close
+from . import test_canje_bulk
+from . import test_canje_concurrency
+from . import test_canje_job
+from . import test_canje_reconcile
+from . import test_canje_reprice
+from . import test_canje_simulation
+from . import test_ledger
+from . import test_liquidation_fingerprint
+from . import test_liquidation_import
+from . import test_liquidation_post
+from . import test_market_price
+from . import test_netting
+from . import test_query_plans
+from . import test_rollups
+from . import test_stock_mrv
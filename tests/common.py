@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+class GrainCanjeCommon(AccountTestInvoicingCommon):
+    """Compañía configurada para canje: diario, Cta Cte Cereal, campaña y grano."""
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.company = cls.company_data["company"]
+        cls.canje_account = cls.env["account.account"].create({
+            "name": "Cta Cte Cereal Productor",
+            "code": "219901",
+            "account_type": "liability_current",
+            "reconcile": True,
+        })
+        cls.clearing_account = cls.env["account.account"].create({
+            "name": "Granos a liquidar",
+            "code": "119901",
+            "account_type": "asset_current",
+            "reconcile": True,
+        })
+        cls.lpg_journal = cls.env["account.journal"].create({
+            "name": "Liquidaciones de Granos",
+            "code": "LPG",
+            "type": "purchase",
+        })
+        cls.netting_journal = cls.env["account.journal"].create({
+            "name": "Compensaciones Canje",
+            "code": "CMP",
+            "type": "general",
+        })
+        cls.company.write({
+            "canje_account_id": cls.canje_account.id,
+            "canje_journal_id": cls.company_data["default_journal_misc"].id,
+            "grain_clearing_account_id": cls.clearing_account.id,
+            "grain_liquidation_journal_id": cls.lpg_journal.id,
+            "grain_netting_journal_id": cls.netting_journal.id,
+        })
+        cls.supplier = cls.partner_a
+        cls.producer = cls.partner_b
+        cls.grain = cls.env["product.product"].create({"name": "Soja", "type": "consu"})
+        cls.grain_service = cls.env["product.product"].create({"name": "Soja (liquidación)", "type": "service"})
+        cls.campaign = cls.env["grain.canje.campaign"].create({
+            "name": "2024/25",
+            "date_start": "2024-04-01",
+            "date_end": "2025-03-31",
+        })
+
+    @classmethod
+    def _create_contract(cls, tn=100.0, price=10.0, **vals):
+        contract = cls.env["grain.canje.contract"].create(dict({
+            "name": "CT-%s" % (cls.env["grain.canje.contract"].search_count([]) + 1),
+            "date": "2024-05-01",
+            "campaign_id": cls.campaign.id,
+            "producer_id": cls.producer.id,
+            "supplier_id": cls.supplier.id,
+            "product_id": cls.grain.id,
+            "tn_pactadas": tn,
+            "precio_ref": price,
+        }, **vals))
+        contract.action_open()
+        return contract
+
+    @classmethod
+    def _create_bill(cls, amount, partner=None, date="2024-06-01", move_type="in_invoice", journal=None):
+        vals = {
+            "move_type": move_type,
+            "partner_id": (partner or cls.supplier).id,
+            "invoice_date": date,
+            "invoice_line_ids": [(0, 0, {
+                "name": "Insumos",
+                "quantity": 1.0,
+                "price_unit": amount,
+                "tax_ids": [(6, 0, [])],
+            })],
+        }
+        if journal:
+            vals["journal_id"] = journal.id
+        bill = cls.env["account.move"].create(vals)
+        bill.action_post()
+        return bill
+
+    @classmethod
+    def _create_lpg_bill(cls, amount, date="2024-06-01"):
+        """Vendor bill LPG del productor (diario de liquidaciones)."""
+        return cls._create_bill(amount, partner=cls.producer, date=date, journal=cls.lpg_journal)
+
+    @classmethod
+    def _create_invoice(cls, amount, date="2024-06-01"):
+        """Factura de insumos al productor (A/R)."""
+        return cls._create_bill(amount, partner=cls.producer, date=date, move_type="out_invoice")
+
+    @classmethod
+    def _create_lpg(cls, qty_tn=10.0, price=100.0, date="2024-06-01", **vals):
+        return cls.env["grain.liquidation"].create(dict({
+            "date": date,
+            "producer_id": cls.producer.id,
+            "product_id": cls.grain_service.id,
+            "qty_tn": qty_tn,
+            "price_per_tn": price,
+            "clearing_account_id": cls.clearing_account.id,
+            "journal_id": cls.lpg_journal.id,
+        }, **vals))
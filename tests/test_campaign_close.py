@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestCampaignClose(GrainCanjeCommon):
+
+    def test_close_snapshot_matches_applications(self):
+        Application = self.env["grain.canje.application"]
+        first = self._create_contract(tn=100.0, price=10.0)
+        second = self._create_contract(tn=50.0, price=12.0)
+        draft = self.env["grain.canje.contract"].create({
+            "name": "CT-BORRADOR",
+            "campaign_id": self.campaign.id,
+            "producer_id": self.producer.id,
+            "supplier_id": self.supplier.id,
+            "product_id": self.grain.id,
+            "tn_pactadas": 30.0,
+        })
+        applications, errors = Application._canje_apply_batch([
+            {"move": self._create_bill(200.0), "contract": first, "tn": 20.0},
+            {"move": self._create_bill(100.0), "contract": first, "tn": 10.0},
+            {"move": self._create_bill(120.0), "contract": second, "tn": 10.0},
+        ])
+        self.assertFalse(errors)
+        applications.filtered(lambda a: a.tn_aplicadas == 10.0 and a.contract_id == first).tn_aplicadas = 5.0
+
+        # Desvío del campo almacenado: el cierre lo corrige y el libro queda igual al saldo final
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE grain_canje_contract SET tn_aplicadas = 0.0, tn_disponibles = tn_pactadas WHERE id = %s",
+            (first.id,),
+        )
+        first.invalidate_recordset()
+
+        self.campaign.action_close_campaign()
+        self.assertEqual(self.campaign.state, "closed")
+        self.assertEqual((first + second).mapped("state"), ["done", "done"])
+        self.assertEqual(draft.state, "draft")
+
+        snapshots = self.campaign.snapshot_ids
+        self.assertEqual(snapshots.contract_id, first + second)
+        groups = Application.read_group(
+            [("contract_id", "in", (first + second).ids)],
+            ["contract_id", "tn_aplicadas:sum", "amount_company:sum"],
+            ["contract_id"],
+        )
+        expected = {
+            group["contract_id"][0]: (group["tn_aplicadas"], group["amount_company"], group["contract_id_count"])
+            for group in groups
+        }
+        self.assertEqual(expected, {first.id: (25.0, 250.0, 2), second.id: (10.0, 120.0, 1)})
+        for snapshot in snapshots:
+            self.assertEqual(
+                (snapshot.tn_aplicadas, snapshot.amount_aplicado, snapshot.application_count),
+                expected[snapshot.contract_id.id],
+            )
+            self.assertEqual(snapshot.tn_disponibles, snapshot.tn_pactadas - snapshot.tn_aplicadas)
+            self.assertEqual(snapshot.contract_id.tn_disponibles, snapshot.tn_disponibles)
+
+        self.assertEqual(
+            (first + second)._ledger_available_at(),
+            {first.id: 75.0, second.id: 40.0},
+        )
+        with self.assertRaises(UserError):
+            self.campaign.action_close_campaign()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestCanjeBulk(GrainCanjeCommon):
+    """Línea explícita y línea automática sobre la misma factura."""
+
+    def test_auto_line_covers_only_the_rest(self):
+        first = self._create_contract(tn=100.0, price=10.0)
+        second = self._create_contract(tn=100.0, price=20.0)
+        bill = self._create_bill(300.0)
+        wizard = self.env["apply.grain.canje.bulk.wizard"].create({
+            "line_ids": [
+                (0, 0, {"move_id": bill.id, "contract_id": second.id, "tn_aplicar": 5.0}),
+                (0, 0, {"move_id": bill.id}),
+            ],
+        })
+        wizard.action_apply()
+
+        self.assertEqual(wizard.line_ids.mapped("state"), ["done", "done"])
+        self.assertEqual(second.application_ids.tn_aplicadas, 5.0)
+        # 300 - 5 TN x 20 = 200 a cubrir automáticamente: 20 TN del primer contrato
+        self.assertEqual(sum(first.application_ids.mapped("tn_aplicadas")), 20.0)
+        self.assertEqual(bill.payment_state, "paid")
+
+    def test_auto_item_covers_only_the_rest_in_background(self):
+        first = self._create_contract(tn=100.0, price=10.0)
+        second = self._create_contract(tn=100.0, price=20.0)
+        bill = self._create_bill(300.0)
+        items = [
+            {"move_id": bill.id, "contract_id": second.id, "tn": 5.0},
+            {"move_id": bill.id, "contract_id": False, "tn": 0.0},
+        ]
+        job = self.env["grain.canje.job"]._enqueue("canje_apply", items, "Canje")
+        done, errors = job._job_dispatch(items)
+
+        self.assertFalse(errors)
+        self.assertEqual(done, 1)
+        self.assertEqual(sum(first.application_ids.mapped("tn_aplicadas")), 20.0)
+        self.assertEqual(bill.payment_state, "paid")
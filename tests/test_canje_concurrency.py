@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import odoo
+from odoo import SUPERUSER_ID, api
+from odoo.tests import tagged
+from odoo.tests.common import get_db_name
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestCanjeConcurrency(GrainCanjeCommon):
+    """Un contrato bloqueado o modificado por otra transacción se informa como ocupado."""
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        # El contrato se confirma antes de que la transacción del test tome su foto:
+        # una segunda conexión sólo puede bloquear filas ya confirmadas.
+        registry = odoo.registry(get_db_name())
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            product = env["product.product"].create({"name": "Maíz (concurrencia)", "type": "consu"})
+            contract = env["grain.canje.contract"].create({
+                "name": "CT-CONCURRENCIA",
+                "producer_id": env.user.partner_id.id,
+                "supplier_id": env.user.partner_id.id,
+                "product_id": product.id,
+                "tn_pactadas": 100.0,
+                "precio_ref": 10.0,
+            })
+            contract.action_open()
+            cls.committed_ids = {"product": product.id, "contract": contract.id}
+        cls.addClassCleanup(cls._drop_committed, registry)
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.locked_contract = cls.env["grain.canje.contract"].browse(cls.committed_ids["contract"])
+
+    @classmethod
+    def _drop_committed(cls, registry):
+        with registry.cursor() as cr:
+            cr.execute("DELETE FROM grain_canje_ledger WHERE contract_id = %s", (cls.committed_ids["contract"],))
+            cr.execute("DELETE FROM grain_canje_contract WHERE id = %s", (cls.committed_ids["contract"],))
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env["product.product"].browse(cls.committed_ids["product"]).product_tmpl_id.unlink()
+
+    def _apply_one(self):
+        bill = self._create_bill(100.0)
+        applications, errors = self.env["grain.canje.application"]._canje_apply_batch([
+            {"move": bill, "contract": self.locked_contract, "tn": 5.0},
+        ])
+        self.assertFalse(applications)
+        self.assertIn("está siendo aplicado por otro usuario", errors[bill.id])
+        self.assertFalse(self.locked_contract.application_ids)
+        self.assertFalse(bill.canje_application_ids)
+
+    def test_locked_row_is_busy(self):
+        """SKIP LOCKED: otra transacción tiene el contrato bloqueado."""
+        with self.registry.cursor() as cr2:
+            cr2.execute(
+                "SELECT id FROM grain_canje_contract WHERE id = %s FOR NO KEY UPDATE",
+                (self.locked_contract.id,),
+            )
+            self.assertEqual(self.locked_contract._canje_reserve(), {})
+            self._apply_one()
+            cr2.rollback()
+        # Liberado el bloqueo, el contrato se puede reservar
+        self.assertEqual(self.locked_contract._canje_reserve(), {self.locked_contract: 100.0})
+
+    def test_updated_row_is_busy(self):
+        """Falla de serialización: otra transacción confirmó un cambio después de la foto de ésta."""
+        self.assertEqual(self.locked_contract.tn_disponibles, 100.0)
+        with self.registry.cursor() as cr2:
+            cr2.execute(
+                "UPDATE grain_canje_contract SET precio_ref = precio_ref WHERE id = %s",
+                (self.locked_contract.id,),
+            )
+        self.assertEqual(self.locked_contract._canje_reserve(), {})
+        self._apply_one()
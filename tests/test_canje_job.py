@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import new_test_user, tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestCanjeJob(GrainCanjeCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        # Usuario interno sin permisos de escritura sobre los lotes
+        cls.user = new_test_user(
+            cls.env,
+            login="canje_job_user",
+            groups="base.group_user",
+            company_id=cls.company.id,
+            company_ids=[(6, 0, cls.company.ids)],
+        )
+        cls.contract = cls._create_contract(tn=100.0)
+
+    def test_enqueue_and_retry_as_user(self):
+        action = self.contract.with_user(self.user).action_recompute_in_background()
+        job = self.env["grain.canje.job"].browse(action["res_id"])
+        self.assertEqual(job.user_id, self.user)
+        self.assertEqual(job.items_total, 1)
+        self.assertEqual(job.chunk_ids.mapped("items"), [self.contract.ids])
+
+        self.env["grain.canje.job"]._cron_process_chunks(auto_commit=False)
+        self.assertEqual(job.state, "done")
+        self.assertEqual(job.chunk_ids.state, "done")
+
+        # Un lote fallido se reencola desde el usuario que pidió el trabajo
+        job.chunk_ids.write({"state": "failed", "items_done": 0, "items_failed": 1, "errors": {"lote": "x"}})
+        job.write({"state": "failed"})
+        job.with_user(self.user).action_retry()
+        self.assertEqual(job.state, "running")
+        self.assertEqual(job.chunk_ids.state, "pending")
+        self.assertFalse(job.chunk_ids.errors)
+
+    def test_enqueue_chunks_as_user(self):
+        job = self.env["grain.canje.job"].with_user(self.user)._enqueue_chunks(
+            "recompute",
+            iter([[self.contract.id]] * 150),
+            "Recálculo",
+        )
+        self.assertEqual(job.items_total, 150)
+        self.assertEqual(len(job.sudo().chunk_ids), 150)
+        self.assertEqual(job.sudo().chunk_ids.mapped("sequence"), list(range(150)))
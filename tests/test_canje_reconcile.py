@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestCanjeReconcile(GrainCanjeCommon):
+
+    def _payable_line(self, bill):
+        return bill.line_ids.filtered(lambda l: l.account_id.account_type == "liability_payable")
+
+    def test_batch_keeps_one_matching_number_per_invoice(self):
+        """Dos facturas del mismo proveedor en un lote: cada una con su propia conciliación."""
+        contract = self._create_contract(tn=100.0, price=10.0)
+        bills = self._create_bill(200.0) + self._create_bill(300.0)
+        applications, errors = self.env["grain.canje.application"]._canje_apply_batch([
+            {"move": bills[0], "contract": contract, "tn": 20.0},
+            {"move": bills[1], "contract": contract, "tn": 30.0},
+        ])
+        self.assertFalse(errors)
+        self.assertEqual(len(applications), 2)
+
+        lines = [self._payable_line(bill) for bill in bills]
+        self.assertEqual(bills.mapped("payment_state"), ["paid", "paid"])
+        self.assertTrue(all(line.full_reconcile_id for line in lines))
+        self.assertNotEqual(lines[0].full_reconcile_id, lines[1].full_reconcile_id)
+        self.assertNotEqual(lines[0].matching_number, lines[1].matching_number)
+        # Cada conciliación tiene sólo la factura y su asiento de canje
+        for bill, line, application in zip(bills, lines, applications.sorted(lambda a: a.move_id.id)):
+            self.assertEqual(application.move_id, bill)
+            self.assertEqual(
+                line.full_reconcile_id.reconciled_line_ids.move_id,
+                bill + application.canje_move_id,
+            )
+
+    def test_netting_run_reconciles_each_producer(self):
+        """Una corrida con dos productores: un solo paso de conciliación, una conciliación por productor."""
+        other = self.env["res.partner"].create({"name": "Otro productor"})
+        bills = self._create_lpg_bill(300.0) + self._create_bill(
+            150.0, partner=other, journal=self.lpg_journal
+        )
+        invoices = self._create_invoice(300.0) + self._create_bill(150.0, partner=other, move_type="out_invoice")
+
+        net_moves = self.env["grain.netting.engine"]._run(self.company, producers=self.producer + other)
+        self.assertEqual(len(net_moves), 2)
+        self.assertEqual((bills + invoices).mapped("payment_state"), ["paid"] * 4)
+        reconciles = self.env["account.full.reconcile"]
+        for bill in bills:
+            reconciles |= self._payable_line(bill).full_reconcile_id
+        self.assertEqual(len(reconciles), 2)
+        for bill, reconcile in zip(bills, reconciles):
+            self.assertEqual(reconcile.reconciled_line_ids.move_id, bill + (net_moves & reconcile.reconciled_line_ids.move_id))
+            self.assertEqual(reconcile.reconciled_line_ids.partner_id, bill.partner_id)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestCanjeReprice(GrainCanjeCommon):
+
+    def _reprice(self, price):
+        wizard = self.env["grain.canje.reprice.wizard"].create({
+            "company_id": self.company.id,
+            "product_id": self.grain.id,
+            "campaign_id": self.campaign.id,
+            "price": price,
+        })
+        self.assertEqual(wizard.price, price)
+        return wizard.action_reprice()
+
+    def test_reprice_keeps_applied_price(self):
+        """El nuevo precio sólo alcanza a las aplicaciones posteriores."""
+        Application = self.env["grain.canje.application"]
+        contract = self._create_contract(tn=100.0, price=10.0)
+        closed = self._create_contract(tn=50.0, price=10.0)
+        closed.action_done()
+
+        old, errors = Application._canje_apply_batch([
+            {"move": self._create_bill(300.0), "contract": contract, "tn": 10.0},
+        ])
+        self.assertFalse(errors)
+
+        self._reprice(15.0)
+        self.assertEqual(contract.precio_ref, 15.0)
+        self.assertEqual(closed.precio_ref, 10.0)
+        self.assertEqual(
+            contract.price_history_ids.sorted("id").mapped(lambda p: (p.price, p.previous_price)),
+            [(10.0, 0.0), (15.0, 10.0)],
+        )
+
+        # Las aplicaciones existentes conservan el precio y el monto congelados
+        self.assertEqual(old.price_per_tn, 10.0)
+        self.assertEqual(old.amount, 100.0)
+        self.assertEqual(old.amount_company, 100.0)
+        old.tn_aplicadas = 5.0
+        self.assertEqual(old.price_per_tn, 10.0)
+        self.assertEqual(old.amount, 50.0)
+
+        new, errors = Application._canje_apply_batch([
+            {"move": self._create_bill(300.0), "contract": contract, "tn": 10.0},
+        ])
+        self.assertFalse(errors)
+        self.assertEqual(new.price_per_tn, 15.0)
+        self.assertEqual(new.amount, 150.0)
+        self.assertEqual(new.amount_company, 150.0)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestCanjeSimulation(GrainCanjeCommon):
+    """La simulación del wizard masivo da el mismo resultado que la aplicación."""
+
+    def _wizard(self, lines):
+        return self.env["apply.grain.canje.bulk.wizard"].create({
+            "line_ids": [(0, 0, vals) for vals in lines],
+        })
+
+    def test_explicit_contract_without_tn(self):
+        contract = self._create_contract()
+        bill = self._create_bill(1000.0)
+        wizard = self._wizard([{"move_id": bill.id, "contract_id": contract.id, "tn_aplicar": 0.0}])
+
+        wizard.action_simulate()
+        self.assertEqual(wizard.line_ids.state, "error")
+        self.assertEqual(wizard.line_ids.message, "Falta indicar las TN a aplicar.")
+
+        wizard.action_apply()
+        self.assertEqual(wizard.line_ids.state, "error")
+        self.assertEqual(wizard.line_ids.message, "Falta indicar las TN a aplicar.")
+        self.assertFalse(contract.application_ids)
+
+    def test_explicit_contract_with_tn(self):
+        contract = self._create_contract()
+        bill = self._create_bill(1000.0)
+        wizard = self._wizard([{"move_id": bill.id, "contract_id": contract.id, "tn_aplicar": 20.0}])
+
+        results = self.env["grain.canje.application"]._canje_simulate([
+            {"move_id": bill.id, "contract_id": contract.id, "tn": 20.0},
+        ])
+        self.assertTrue(results[0]["ok"])
+        self.assertAlmostEqual(results[0]["tn"], 20.0)
+        self.assertAlmostEqual(results[0]["amount"], 200.0)
+
+        wizard.action_apply()
+        self.assertEqual(wizard.line_ids.state, "done")
+        self.assertAlmostEqual(contract.application_ids.tn_aplicadas, results[0]["tn"])
+        self.assertAlmostEqual(contract.application_ids.amount, results[0]["amount"])
+        self.assertAlmostEqual(contract.tn_disponibles, 80.0)
+
+    def test_automatic_allocation(self):
+        contract = self._create_contract(tn=50.0)
+        bill = self._create_bill(1000.0)
+        results = self.env["grain.canje.application"]._canje_simulate([{"move_id": bill.id, "tn": 0.0}])
+        self.assertTrue(results[0]["ok"])
+        self.assertAlmostEqual(results[0]["tn"], 50.0)
+
+        wizard = self._wizard([{"move_id": bill.id}])
+        wizard.action_apply()
+        self.assertEqual(wizard.line_ids.state, "done")
+        self.assertAlmostEqual(sum(contract.application_ids.mapped("tn_aplicadas")), results[0]["tn"])
+        self.assertAlmostEqual(sum(contract.application_ids.mapped("amount")), results[0]["amount"])
+
+    def test_over_allocation_rejected_in_both(self):
+        contract = self._create_contract(tn=10.0)
+        bill = self._create_bill(1000.0)
+        results = self.env["grain.canje.application"]._canje_simulate([
+            {"move_id": bill.id, "contract_id": contract.id, "tn": 15.0},
+        ])
+        self.assertFalse(results[0]["ok"])
+
+        wizard = self._wizard([{"move_id": bill.id, "contract_id": contract.id, "tn_aplicar": 15.0}])
+        wizard.action_apply()
+        self.assertEqual(wizard.line_ids.state, "error")
+        self.assertFalse(contract.application_ids)
+
+    def test_automatic_allocation_follows_fifo(self):
+        """Contratos con precios distintos: la simulación da las TN del FIFO real, no un precio medio."""
+        first = self._create_contract(tn=10.0, price=10.0)
+        second = self._create_contract(tn=100.0, price=20.0)
+        bill = self._create_bill(300.0)
+        results = self.env["grain.canje.application"]._canje_simulate([{"move_id": bill.id, "tn": 0.0}])
+        self.assertTrue(results[0]["ok"])
+        self.assertAlmostEqual(results[0]["tn"], 20.0)
+        self.assertAlmostEqual(results[0]["amount"], 300.0)
+
+        wizard = self._wizard([{"move_id": bill.id}])
+        wizard.action_apply()
+        self.assertEqual(wizard.line_ids.state, "done")
+        applications = (first + second).application_ids
+        self.assertAlmostEqual(sum(applications.mapped("tn_aplicadas")), results[0]["tn"])
+        self.assertAlmostEqual(sum(applications.mapped("amount")), results[0]["amount"])
+
+    def test_automatic_allocation_without_tonnage(self):
+        """Si la asignación no llega a 0,001 TN, la simulación lo informa como error."""
+        self._create_contract(tn=10.0, price=10000.0)
+        bill = self._create_bill(1.0)
+        results = self.env["grain.canje.application"]._canje_simulate([{"move_id": bill.id}])
+        self.assertFalse(results[0]["ok"])
+        self.assertEqual(results[0]["tn"], 0.0)
+
+        wizard = self._wizard([{"move_id": bill.id}])
+        wizard.action_apply()
+        self.assertEqual(wizard.line_ids.state, "error")
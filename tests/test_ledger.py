@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestLedger(GrainCanjeCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.contract = cls._create_contract(tn=100.0)
+        cls.bill = cls._create_bill(1000.0)
+
+    def _apply(self, tn, date):
+        return self.env["grain.canje.application"].create({
+            "contract_id": self.contract.id,
+            "move_id": self.bill.id,
+            "date": date,
+            "tn_aplicadas": tn,
+        })
+
+    def test_balance_as_of(self):
+        """Movimientos cargados fuera de orden: el saldo a fecha sigue la fecha, no la carga."""
+        self._apply(20.0, "2024-06-10")
+        self._apply(10.0, "2024-06-05")
+        Ledger = self.env["grain.canje.ledger"]
+
+        self.assertEqual(Ledger._last_balances(self.contract), {self.contract.id: 70.0})
+        self.assertEqual(self.contract._ledger_available_at("2024-05-31"), {self.contract.id: 100.0})
+        self.assertEqual(self.contract._ledger_available_at("2024-06-07"), {self.contract.id: 90.0})
+        self.assertEqual(self.contract._ledger_available_at("2024-06-10"), {self.contract.id: 70.0})
+        self.assertEqual(self.contract._ledger_available_at("2024-04-30"), {})
+        self.assertEqual(self.contract._ledger_available_at()[self.contract.id], self.contract.tn_disponibles)
+
+        rows = self.contract.ledger_ids.sorted(lambda l: (l.date, l.id))
+        self.assertEqual(rows.mapped("balance"), [100.0, 90.0, 70.0])
+
+    def test_write_and_unlink(self):
+        application = self._apply(20.0, "2024-06-10")
+        application.tn_aplicadas = 15.0
+        self.assertEqual(self.contract._ledger_available_at()[self.contract.id], 85.0)
+        application.unlink()
+        self.assertEqual(self.contract._ledger_available_at()[self.contract.id], 100.0)
+        self.assertEqual(self.contract.tn_disponibles, 100.0)
+
+    def test_recompute_fixes_drift(self):
+        self._apply(20.0, "2024-06-10")
+        # Desvío: un ajuste en el libro que no se refleja en el contrato
+        self.env["grain.canje.ledger"]._append([{"contract": self.contract, "kind": "adjustment", "tn": 5.0}])
+        self.assertEqual(self.contract._ledger_available_at()[self.contract.id], 85.0)
+
+        self.contract._job_recompute_tonnage()
+        self.assertEqual(self.contract.tn_disponibles, 80.0)
+        self.assertEqual(self.contract._ledger_available_at()[self.contract.id], 80.0)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestLiquidationFingerprint(GrainCanjeCommon):
+
+    def test_string_and_date(self):
+        Liquidation = self.env["grain.liquidation"]
+        fingerprints = {
+            Liquidation._fingerprint_key(
+                self.company.id, self.producer.id, value, self.grain_service.id, 10.0, 100.0, "coe-1"
+            )
+            for value in ("2024-06-01", date(2024, 6, 1))
+        }
+        self.assertEqual(len(fingerprints), 1)
+
+    def test_python_matches_sql(self):
+        """Mismo formato que la huella calculada en SQL por ``init`` (incluye medios redondeados)."""
+        lpg = self._create_lpg(qty_tn=2.0005, price=10.125, lpg_number="  coe-7 ")
+        lpg.flush_recordset()
+        self.env.cr.execute(
+            r"""
+            SELECT md5(concat_ws('|',
+                       COALESCE(company_id::text, ''),
+                       COALESCE(producer_id::text, ''),
+                       COALESCE(to_char(date, 'YYYY-MM-DD'), ''),
+                       COALESCE(product_id::text, ''),
+                       round(COALESCE(qty_tn, 0)::numeric, 3)::text,
+                       round(COALESCE(price_per_tn, 0)::numeric, 2)::text,
+                       upper(regexp_replace(COALESCE(lpg_number, ''), '^\s+|\s+$', '', 'g'))))
+              FROM grain_liquidation
+             WHERE id = %s
+            """,
+            (lpg.id,),
+        )
+        self.assertEqual(lpg.fingerprint, self.env.cr.fetchone()[0])
+
+    def test_duplicate_raises_validation_error(self):
+        self._create_lpg(lpg_number="COE-9")
+        with self.assertRaises(ValidationError):
+            self._create_lpg(lpg_number="coe-9 ")
+
+    def test_cancelled_duplicate_allowed(self):
+        first = self._create_lpg(lpg_number="COE-10")
+        first.state = "cancel"
+        second = self._create_lpg(lpg_number="COE-10")
+        self.assertEqual(first.fingerprint, second.fingerprint)
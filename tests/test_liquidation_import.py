@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import base64
+
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestLiquidationImport(GrainCanjeCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.producer.vat = "20111111112"
+        cls.grain_service.default_code = "SOJA-LIQ"
+
+    def _import(self, rows):
+        lines = ["producer_vat,date,product_code,qty_tn,price_per_tn,journal_code,lpg_number"]
+        lines += [
+            "20111111112,%s,SOJA-LIQ,%s,%s,,%s" % (date, qty, price, number)
+            for date, qty, price, number in rows
+        ]
+        record = self.env["grain.liquidation.import"].create({
+            "name": "lpg.csv",
+            "file_type": "csv",
+            "data": base64.b64encode("\n".join(lines).encode()),
+        })
+        record.action_run()
+        self.env["grain.canje.job"]._cron_process_chunks(auto_commit=False)
+        return record
+
+    def test_reimport_posts_drafts_and_skips_posted(self):
+        """Una LPG que quedó en borrador se publica al reimportar; las publicadas se omiten."""
+        draft = self._create_lpg(qty_tn=10.0, price=100.0, date="2024-06-01", lpg_number="0001")
+        posted = self._create_lpg(qty_tn=5.0, price=90.0, date="2024-06-02", lpg_number="0002")
+        posted.action_post()
+        posted_bill = posted.vendor_bill_id
+
+        record = self._import([
+            ("2024-06-01", "10", "100", "0001"),
+            ("2024-06-02", "5", "90", "0002"),
+            ("2024-06-03", "7", "80", "0003"),
+        ])
+        self.assertEqual(record.state, "done")
+        self.assertEqual(record.rows_done, 3)
+        self.assertEqual(record.rows_failed, 0)
+        self.assertEqual(record.rows_created, 1)
+        self.assertEqual(record.rows_skipped, 2)
+
+        self.assertEqual(draft.state, "posted")
+        self.assertEqual(draft.vendor_bill_id.state, "posted")
+        self.assertEqual(posted.vendor_bill_id, posted_bill)
+        liquidations = self.env["grain.liquidation"].search([("producer_id", "=", self.producer.id)])
+        self.assertEqual(len(liquidations), 3)
+        self.assertEqual(set(liquidations.mapped("state")), {"posted"})
+
+        # Volver a importar el mismo archivo no crea ni publica nada nuevo
+        again = self._import([("2024-06-03", "7", "80", "0003")])
+        self.assertEqual(again.rows_created, 0)
+        self.assertEqual(again.rows_skipped, 1)
+        self.assertEqual(self.env["grain.liquidation"].search_count([("producer_id", "=", self.producer.id)]), 3)
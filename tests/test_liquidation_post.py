@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestLiquidationPost(GrainCanjeCommon):
+
+    def test_batch_isolates_invalid_lpg(self):
+        """Una LPG inválida en el lote no impide publicar las demás."""
+        valid = self._create_lpg(qty_tn=10.0, price=100.0) + self._create_lpg(qty_tn=5.0, price=90.0)
+        zero = self._create_lpg(qty_tn=3.0, price=0.0)
+        # Bill sin líneas: falla al publicar, después de la publicación conjunta
+        broken = self._create_lpg(qty_tn=2.0, price=50.0)
+        broken.vendor_bill_id = self.env["account.move"].create({
+            "move_type": "in_invoice",
+            "partner_id": self.producer.id,
+            "journal_id": self.lpg_journal.id,
+            "invoice_date": "2024-06-01",
+        })
+
+        result = (valid + zero + broken).action_post()
+        self.assertEqual(result["tag"], "display_notification")
+        self.assertIn("Publicadas: 2. Con error: 2", result["params"]["message"])
+
+        self.assertEqual(valid.mapped("state"), ["posted", "posted"])
+        self.assertEqual(valid.vendor_bill_id.mapped("state"), ["posted", "posted"])
+        self.assertEqual((zero + broken).mapped("state"), ["draft", "draft"])
+        self.assertFalse(zero.vendor_bill_id)
+        self.assertEqual(broken.vendor_bill_id.state, "draft")
+        self.assertTrue(zero.message_ids.filtered(lambda m: "El Importe es 0" in (m.body or "")))
+        self.assertTrue(broken.message_ids.filtered(lambda m: "No se pudo publicar la LPG" in (m.body or "")))
+
+        # Resumen del lote en el productor, sólo con las publicadas
+        digest = self.producer.message_ids.filtered(lambda m: "LPG publicadas en lote" in (m.body or ""))
+        self.assertEqual(len(digest), 1)
+        self.assertIn("LPG publicadas en lote: 2", digest.body)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestMarketPrice(GrainCanjeCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.corn = cls.env["product.product"].create({"name": "Maíz", "type": "consu"})
+        cls.env["grain.market.price"].create([
+            {"product_id": cls.grain.id, "date": "2024-06-01", "price": 300.0},
+            {"product_id": cls.grain.id, "date": "2024-06-10", "price": 310.0},
+            {"product_id": cls.corn.id, "date": "2024-06-05", "price": 180.0},
+        ])
+
+    def test_prices_as_of_batch(self):
+        """Todos los pares en una consulta; los repetidos salen del caché de la transacción."""
+        MarketPrice = self.env["grain.market.price"]
+        pairs = [
+            (self.grain, "2024-05-31"),
+            (self.grain, "2024-06-05"),
+            (self.grain, date(2024, 6, 10)),
+            (self.corn, "2024-06-20"),
+        ]
+        MarketPrice._clear_price_cache()
+        with self.assertQueryCount(1):
+            prices = MarketPrice._prices_as_of(pairs)
+        self.assertEqual(prices, {
+            (self.grain.id, date(2024, 5, 31)): 0.0,
+            (self.grain.id, date(2024, 6, 5)): 300.0,
+            (self.grain.id, date(2024, 6, 10)): 310.0,
+            (self.corn.id, date(2024, 6, 20)): 180.0,
+        })
+        with self.assertQueryCount(0):
+            self.assertEqual(MarketPrice._price_as_of(self.corn, "2024-06-20"), 180.0)
+
+    def test_new_price_clears_cache(self):
+        MarketPrice = self.env["grain.market.price"]
+        self.assertEqual(MarketPrice._price_as_of(self.corn, "2024-06-20"), 180.0)
+        MarketPrice.create({"product_id": self.corn.id, "date": "2024-06-15", "price": 190.0})
+        self.assertEqual(MarketPrice._price_as_of(self.corn, "2024-06-20"), 190.0)
+
+    def test_reprice_wizard_defaults_to_market_price(self):
+        wizards = self.env["grain.canje.reprice.wizard"].create([
+            {"product_id": self.grain.id, "date": "2024-06-05"},
+            {"product_id": self.corn.id, "date": "2024-06-20"},
+        ])
+        self.assertEqual(wizards.mapped("price"), [300.0, 180.0])
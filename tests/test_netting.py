@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestNetting(GrainCanjeCommon):
+
+    def _item(self, item_id, residual, account_id=1, due="2024-06-01"):
+        return {"id": item_id, "account_id": account_id, "due": due, "date": due, "residual": residual}
+
+    def test_match_float_residuals(self):
+        """0.1 + 0.2 contra 0.3: empareja exacto, sin restos de coma flotante."""
+        engine = self.env["grain.netting.engine"]
+        currency = self.company.currency_id
+        total, matched = engine._match(
+            [self._item(1, 0.1 + 0.2)],
+            [self._item(2, 0.1), self._item(3, 0.2, due="2024-06-02")],
+            currency,
+        )
+        self.assertEqual(total, 0.3)
+        self.assertEqual(matched, {1: 0.3, 2: 0.1, 3: 0.2})
+
+    def test_match_limit(self):
+        engine = self.env["grain.netting.engine"]
+        total, matched = engine._match(
+            [self._item(1, 100.0)],
+            [self._item(2, 60.0), self._item(3, 60.0, due="2024-06-02")],
+            self.company.currency_id,
+            limit=70.0,
+        )
+        self.assertEqual(total, 70.0)
+        self.assertEqual(matched, {1: 70.0, 2: 60.0, 3: 10.0})
+
+    def test_plan_balanced_across_accounts(self):
+        """Varias cuentas por lado: el asiento queda balanceado al centavo."""
+        engine = self.env["grain.netting.engine"]
+        receivable = self.company_data["default_account_receivable"]
+        other_receivable = receivable.copy({"code": "121099"})
+        payable = self.company_data["default_account_payable"]
+        vals, _lines = engine._plan_netting(
+            self.company,
+            self.producer,
+            [
+                self._item(1, 33.33, receivable.id),
+                self._item(2, 33.33, other_receivable.id, due="2024-06-02"),
+                self._item(3, 33.34, receivable.id, due="2024-06-03"),
+            ],
+            [self._item(4, 100.0, payable.id)],
+            "test",
+        )
+        debit = sum(line[2]["debit"] for line in vals["line_ids"])
+        credit = sum(line[2]["credit"] for line in vals["line_ids"])
+        self.assertTrue(self.company.currency_id.is_zero(debit - credit))
+        self.assertAlmostEqual(debit, 100.0)
+
+    def test_run_reconciles_invoice_and_lpg(self):
+        invoice = self._create_invoice(1000.0)
+        lpg_bill = self._create_lpg_bill(600.0)
+
+        net_moves = self.env["grain.netting.engine"]._run(self.company, producers=self.producer)
+
+        self.assertEqual(len(net_moves), 1)
+        self.assertEqual(net_moves.state, "posted")
+        self.assertEqual(lpg_bill.payment_state, "paid")
+        self.assertAlmostEqual(invoice.amount_residual, 400.0)
+        self.assertTrue(all(line.reconciled for line in net_moves.line_ids))
+
+    def test_foreign_currency_lines_excluded(self):
+        """Las partidas en otra moneda no se compensan (ni en la corrida ni desde el wizard)."""
+        invoice = self._create_invoice(1000.0)
+        lpg_bill = self._create_lpg_bill(600.0)
+        foreign_bill = self.env["account.move"].create({
+            "move_type": "in_invoice",
+            "partner_id": self.producer.id,
+            "journal_id": self.lpg_journal.id,
+            "currency_id": self.currency_data["currency"].id,
+            "invoice_date": "2024-06-01",
+            "invoice_line_ids": [(0, 0, {"name": "LPG", "quantity": 1.0, "price_unit": 300.0, "tax_ids": [(6, 0, [])]})],
+        })
+        foreign_bill.action_post()
+
+        engine = self.env["grain.netting.engine"]
+        self.assertFalse(engine._lines_to_items(foreign_bill.line_ids))
+        self.assertEqual(len(engine._lines_to_items(lpg_bill.line_ids.filtered(
+            lambda l: l.account_id.account_type == "liability_payable"
+        ))), 1)
+
+        wizard = self.env["grain.netting.wizard"].create({
+            "producer_id": self.producer.id,
+            "move_ids": [(6, 0, invoice.ids)],
+            "lpg_bill_ids": [(6, 0, (lpg_bill + foreign_bill).ids)],
+        })
+        self.assertEqual(wizard.amount_payable, 600.0)
+        with self.assertRaises(UserError):
+            wizard.action_net()
+
+        engine._run(self.company, producers=self.producer)
+        self.assertEqual(lpg_bill.payment_state, "paid")
+        self.assertEqual(foreign_bill.payment_state, "not_paid")
+        self.assertAlmostEqual(invoice.amount_residual, 400.0)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged("post_install", "-at_install")
+class TestQueryPlans(TransactionCase):
+    """Las consultas calientes del módulo usan sus índices compuestos.
+
+    Con tablas de prueba chicas el planificador prefiere un seq scan; se
+    deshabilita (``enable_seqscan = off``) para verificar que el índice es
+    utilizable por la forma de la consulta, que es lo que se quiere proteger.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.env.cr.execute("SET LOCAL enable_seqscan = off")
+
+    def _plan_indexes(self, query, params):
+        self.env.cr.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        plan = self.env.cr.fetchone()[0]
+        indexes = set()
+
+        def walk(node):
+            if isinstance(node, dict):
+                if "Index Name" in node:
+                    indexes.add(node["Index Name"])
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(plan)
+        return indexes
+
+    def assertUsesIndex(self, index_name, query, params=()):
+        indexes = self._plan_indexes(query, params)
+        self.assertIn(index_name, indexes, "Plan sin %s (índices usados: %s)" % (index_name, indexes))
+
+    def test_open_contracts_of_supplier(self):
+        self.assertUsesIndex(
+            "grain_canje_contract_supplier_state_company_idx",
+            """
+            SELECT id, tn_disponibles
+              FROM grain_canje_contract
+             WHERE supplier_id = %s AND state = 'open' AND company_id = %s
+            """,
+            (1, self.env.company.id),
+        )
+
+    def test_open_contracts_of_product(self):
+        self.assertUsesIndex(
+            "grain_canje_contract_product_state_company_idx",
+            """
+            SELECT id
+              FROM grain_canje_contract
+             WHERE product_id = %s AND state = 'open' AND company_id = %s
+            """,
+            (1, self.env.company.id),
+        )
+
+    def test_applications_of_contract(self):
+        self.assertUsesIndex(
+            "grain_canje_application_contract_date_idx",
+            """
+            SELECT id, tn_aplicadas
+              FROM grain_canje_application
+             WHERE contract_id = %s
+          ORDER BY date
+            """,
+            (1,),
+        )
+
+    def test_lpg_by_producer_date_journal(self):
+        self.assertUsesIndex(
+            "grain_liquidation_producer_date_journal_idx",
+            """
+            SELECT id
+              FROM grain_liquidation
+             WHERE producer_id = %s AND date = %s AND journal_id = %s
+            """,
+            (1, "2024-01-01", 1),
+        )
+
+    def test_lpg_vendor_bill_lookup(self):
+        self.assertUsesIndex(
+            "account_move_grain_lpg_bill_idx",
+            """
+            SELECT id
+              FROM account_move
+             WHERE move_type = 'in_invoice' AND partner_id = %s AND invoice_date = %s AND journal_id = %s
+            """,
+            (1, "2024-01-01", 1),
+        )
+
+    def test_ledger_as_of(self):
+        self.assertUsesIndex(
+            "grain_canje_ledger_contract_date_idx",
+            """
+            SELECT contract_id, SUM(tn)
+              FROM grain_canje_ledger
+             WHERE contract_id IN %s AND date <= %s
+          GROUP BY contract_id
+            """,
+            ((1, 2), "2024-01-01"),
+        )
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestRollups(GrainCanjeCommon):
+    """Los totales mantenidos en forma incremental son iguales a una reconstrucción completa."""
+
+    def _snapshot(self, model):
+        Model = self.env[model]
+        Model.flush_model()
+        rows = Model.search_read([], list(Model._rollup_keys) + list(Model._rollup_measures), load=None)
+        result = {}
+        for row in rows:
+            measures = tuple(round(row[measure], 2) for measure in Model._rollup_measures)
+            if any(measures):
+                result[tuple(row[key] for key in Model._rollup_keys)] = measures
+        return result
+
+    def assertRebuildEqual(self, model):
+        incremental = self._snapshot(model)
+        self.env[model]._rebuild()
+        self.assertEqual(incremental, self._snapshot(model))
+        return incremental
+
+    def _activity(self):
+        """Aplicaciones (alta, cambio, baja), LPG publicadas y una compensación."""
+        Application = self.env["grain.canje.application"]
+        contract = self._create_contract(tn=100.0, price=10.0)
+        other = self._create_contract(tn=50.0, price=12.0, date="2024-07-15")
+        bills = self._create_bill(200.0) + self._create_bill(300.0, date="2024-07-20") + self._create_bill(120.0)
+        applications, errors = Application._canje_apply_batch([
+            {"move": bills[0], "contract": contract, "tn": 20.0},
+            {"move": bills[1], "contract": contract, "tn": 10.0},
+            {"move": bills[1], "contract": other, "tn": 5.0},
+            {"move": bills[2], "contract": other, "tn": 10.0},
+        ])
+        self.assertFalse(errors)
+        changed = applications.filtered(lambda a: a.contract_id == other and a.move_id == bills[1])
+        self.assertEqual(changed.amount_company, 60.0)
+        changed.write({"tn_aplicadas": 4.0, "date": "2024-08-02"})
+        # El importe en moneda de la compañía acompaña el cambio de TN (misma cotización)
+        self.assertEqual(changed.amount_company, 48.0)
+        self.assertEqual(changed.currency_rate, 1.0)
+        applications.filtered(lambda a: a.move_id == bills[2]).unlink()
+
+        lpgs = self._create_lpg(qty_tn=10.0, price=100.0) + self._create_lpg(qty_tn=5.0, price=90.0, date="2024-09-01")
+        lpgs.action_post()
+        self._create_lpg(qty_tn=3.0, price=80.0)  # borrador: no suma
+        self._create_invoice(400.0)
+        self.env["grain.netting.engine"]._run(self.company, producers=self.producer)
+
+    def test_producer_balance_rebuild(self):
+        self._activity()
+        totals = self.assertRebuildEqual("grain.producer.balance")
+        producer_rows = [measures for key, measures in totals.items() if key[1] == self.producer.id]
+        self.assertTrue(producer_rows)
+        self.assertEqual(sum(measures[1] for measures in producer_rows), 200.0 + 100.0 + 48.0)
+        tn_lpg = sum(measures[2] for measures in producer_rows)
+        amount_netted = sum(measures[4] for measures in producer_rows)
+        self.assertEqual(tn_lpg, 15.0)
+        self.assertTrue(amount_netted > 0.0)
+
+    def test_producer_balance_verify_all_measures(self):
+        """El control detecta desvíos en cualquier medida, no sólo en el canje."""
+        self._activity()
+        Balance = self.env["grain.producer.balance"]
+        drift = [row for row in Balance._verify() if row[2] != "contabilidad"]
+        self.assertEqual(drift, [])
+
+        for measure in Balance._rollup_measures:
+            self.env.cr.execute(
+                "UPDATE grain_producer_balance SET {m} = COALESCE({m}, 0.0) + 1.0 "
+                "WHERE id = (SELECT id FROM grain_producer_balance WHERE producer_id = %s ORDER BY id LIMIT 1)"
+                .format(m=measure),
+                (self.producer.id,),
+            )
+            Balance.invalidate_model()
+            drift = [row for row in Balance._verify() if row[2] != "contabilidad"]
+            self.assertEqual([(row[1], row[2]) for row in drift], [(self.producer.id, measure)])
+            Balance._rebuild()
+
+    def test_campaign_summary_rebuild(self):
+        self._activity()
+        totals = self.assertRebuildEqual("grain.campaign.summary")
+        campaign_rows = [measures for key, measures in totals.items() if key[1] == self.campaign.id]
+        self.assertEqual(sum(measures[0] for measures in campaign_rows), 34.0)
+        self.assertEqual(sum(measures[1] for measures in campaign_rows), 200.0 + 100.0 + 48.0)
+        self.assertEqual(sum(measures[2] for measures in campaign_rows), 3)
+        self.assertEqual(self.campaign.tn_aplicadas, 34.0)
+        self.assertEqual(self.campaign.application_count, 3)
+
+    def test_seed_only_when_empty(self):
+        self._activity()
+        Summary = self.env["grain.campaign.summary"]
+        before = self._snapshot("grain.campaign.summary")
+        Summary._rollup_seed()
+        self.assertEqual(before, self._snapshot("grain.campaign.summary"))
+        self.env.cr.execute("DELETE FROM grain_campaign_summary")
+        Summary.invalidate_model()
+        Summary._rollup_seed()
+        self.assertEqual(before, self._snapshot("grain.campaign.summary"))
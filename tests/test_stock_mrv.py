@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import GrainCanjeCommon
+
+
+@tagged("post_install", "-at_install")
+class TestStockMrv(GrainCanjeCommon):
+    """Las TN MRV incrementales coinciden con el cálculo completo de ``_compute_tn_mrv``."""
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        today = fields.Date.today()
+        # Los movimientos se realizan hoy: la campaña del contrato tiene que incluir la fecha
+        campaign = cls.env["grain.canje.campaign"].create({
+            "name": "Campaña actual",
+            "date_start": today - timedelta(days=30),
+            "date_end": today + timedelta(days=30),
+        })
+        cls.contract = cls._create_contract(tn=0.0, campaign_id=campaign.id, date=today - timedelta(days=1))
+        warehouse = cls.env["stock.warehouse"].search([("company_id", "=", cls.company.id)], limit=1)
+        cls.picking_type_in = warehouse.in_type_id
+        cls.stock_location = warehouse.lot_stock_id
+        cls.supplier_location = cls.env.ref("stock.stock_location_suppliers")
+
+    def _create_move(self, qty, returned=None, **vals):
+        source, dest = self.supplier_location, self.stock_location
+        if returned:
+            source, dest = dest, source
+        move = self.env["stock.move"].create(dict({
+            "name": "Recepción MRV",
+            "product_id": self.grain.id,
+            "product_uom_qty": qty,
+            "product_uom": self.grain.uom_id.id,
+            "location_id": source.id,
+            "location_dest_id": dest.id,
+            "picking_type_id": self.picking_type_in.id,
+            "partner_id": self.producer.id,
+            "company_id": self.company.id,
+            "origin_returned_move_id": returned and returned.id,
+        }, **vals))
+        move._action_confirm()
+        return move
+
+    def _done(self, move):
+        move.quantity_done = move.product_uom_qty
+        move._action_done()
+        return move
+
+    def assertMrvMatchesFull(self, expected):
+        """TN MRV guardadas (incrementales) = cálculo completo; el libro acompaña."""
+        self.env.flush_all()
+        self.env.cr.execute(
+            "SELECT tn_mrv, tn_disponibles FROM grain_canje_contract WHERE id = %s", (self.contract.id,)
+        )
+        tn_mrv, tn_disponibles = self.env.cr.fetchone()
+        self.assertAlmostEqual(tn_mrv, expected, places=3)
+        self.contract.invalidate_recordset()
+        self.contract._compute_tn_mrv()
+        self.assertAlmostEqual(self.contract.tn_mrv, tn_mrv, places=3)
+        self.assertAlmostEqual(
+            self.contract._ledger_available_at().get(self.contract.id, 0.0), tn_disponibles, places=3
+        )
+
+    def test_link_done_move(self):
+        move = self._done(self._create_move(10.0))
+        self.assertIn(move, self.contract.stock_move_ids)
+        self.assertMrvMatchesFull(10.0)
+
+    def test_return_subtracts(self):
+        move = self._done(self._create_move(10.0))
+        returned = self._done(self._create_move(4.0, returned=move))
+        self.assertIn(returned, self.contract.stock_move_ids)
+        self.assertMrvMatchesFull(6.0)
+
+    def test_cancel_unlinks(self):
+        self._done(self._create_move(10.0))
+        pending = self._create_move(5.0)
+        self.contract.write({"stock_move_ids": [(4, pending.id)]})
+        pending._action_cancel()
+        self.assertNotIn(pending, self.contract.stock_move_ids)
+        self.assertMrvMatchesFull(10.0)
+
+    def test_correct_done_move(self):
+        move = self._done(self._create_move(10.0))
+        move.product_uom_qty = 12.0
+        self.assertMrvMatchesFull(12.0)
+
+        dozen = self.env.ref("uom.product_uom_dozen")
+        move.write({"product_uom_qty": 1.0, "product_uom": dozen.id})
+        self.assertMrvMatchesFull(12.0)
+        move.product_uom_qty = 2.0
+        self.assertMrvMatchesFull(24.0)
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
 from . import apply_grain_canje_wizard
+from . import apply_grain_canje_bulk_wizard
 from . import register_grain_lpg_wizard
 from . import grain_netting_wizard
+from . import grain_netting_run_wizard
+from . import grain_market_price_import_wizard
+from . import grain_canje_reprice_wizard
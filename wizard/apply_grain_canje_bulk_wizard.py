@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, _
+
+from ..models.grain_bulk import bulk_mode
+
+
+class ApplyGrainCanjeBulkWizard(models.TransientModel):
+    _name = "apply.grain.canje.bulk.wizard"
+    _description = "Wizard para aplicar canje de granos a varias facturas de proveedor"
+
+    line_ids = fields.One2many(
+        "apply.grain.canje.bulk.line",
+        "wizard_id",
+        string="Asignaciones",
+    )
+    result_summary = fields.Text(
+        string="Resultado",
+        readonly=True,
+    )
+
+    @api.model
+    def default_get(self, fields_list):
+        """Pre-cargar una línea por cada factura de proveedor seleccionada."""
+        res = super().default_get(fields_list)
+        ctx = self.env.context
+        if "line_ids" in fields_list and ctx.get("active_model") == "account.move" and ctx.get("active_ids"):
+            moves = self.env["account.move"].browse(ctx["active_ids"]).filtered(
+                lambda m: m.move_type == "in_invoice" and m.state == "posted"
+            )
+            res["line_ids"] = [(0, 0, {"move_id": move.id}) for move in moves]
+        return res
+
+    # ------------------------------
+    # ACCIÓN PRINCIPAL
+    # ------------------------------
+
+    def action_apply(self):
+        self.ensure_one()
+
+        Application = self.env["grain.canje.application"]
+
+        lines = self.line_ids.filtered(lambda l: l.state != "done")
+        incomplete = lines.filtered(lambda l: l.contract_id and l.tn_aplicar <= 0.0)
+        incomplete.write({"state": "error", "message": _("Falta indicar las TN a aplicar.")})
+        to_apply = lines - incomplete
+        if len(to_apply.move_id) > 1:
+            Application = bulk_mode(Application)
+
+        # Líneas sin contrato: asignación automática entre los contratos del proveedor
+        allocations = []
+        consumed = {}
+        allocated = {}
+        for line in to_apply:
+            if line.contract_id:
+                allocations.append({"move": line.move_id, "contract": line.contract_id, "tn": line.tn_aplicar})
+                consumed[line.contract_id] = consumed.get(line.contract_id, 0.0) + line.tn_aplicar
+                amount = line.tn_aplicar * line.contract_id.precio_ref
+                allocated[line.move_id] = allocated.get(line.move_id, 0.0) + amount
+        for line in to_apply.filtered(lambda l: not l.contract_id):
+            # La asignación automática cubre sólo lo que no se asignó explícitamente a la factura
+            move_allocations = Application._canje_allocate(
+                line.move_id,
+                tn_max=line.tn_aplicar,
+                consumed=consumed,
+                allocated_amount=allocated.get(line.move_id, 0.0),
+            )
+            for alloc in move_allocations:
+                amount = alloc["tn"] * alloc["contract"].precio_ref
+                allocated[line.move_id] = allocated.get(line.move_id, 0.0) + amount
+            allocations += move_allocations
+
+        applications, errors = Application._canje_apply_batch(allocations)
+        for line in to_apply.filtered(lambda l: not l.contract_id):
+            if line.move_id not in applications.move_id and line.move_id.id not in errors:
+                errors[line.move_id.id] = _("No hay contratos vigentes con TN disponibles para el proveedor.")
+
+        failed = to_apply.filtered(lambda l: l.move_id.id in errors)
+        (to_apply - failed).write({"state": "done", "message": False})
+        for move_id, message in errors.items():
+            failed.filtered(lambda l: l.move_id.id == move_id).write({"state": "error", "message": message})
+
+        self.result_summary = _(
+            "Aplicaciones creadas: %(ok)s\nFacturas con error: %(err)s"
+        ) % {
+            "ok": len(applications),
+            "err": len((failed | incomplete).move_id),
+        }
+
+        if not (failed or incomplete):
+            return {"type": "ir.actions.act_window_close"}
+
+        # Reabrir el wizard con el detalle de errores por factura
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Aplicar canje de granos (masivo)"),
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
+
+    def action_simulate(self):
+        """Evalúa las asignaciones sin aplicar nada y deja el resultado por línea."""
+        self.ensure_one()
+        lines = self.line_ids.filtered(lambda l: l.state != "done")
+        results = self.env["grain.canje.application"]._canje_simulate([
+            {"move_id": line.move_id.id, "contract_id": line.contract_id.id, "tn": line.tn_aplicar}
+            for line in lines
+        ])
+
+        feasible = 0
+        for line, result in zip(lines, results):
+            if result["ok"]:
+                feasible += 1
+                line.write({
+                    "state": "pending",
+                    "message": _("Factible: %(tn).3f TN por %(amount).2f %(currency)s") % {
+                        "tn": result["tn"],
+                        "amount": result["amount"],
+                        "currency": line.currency_id.name,
+                    },
+                })
+            else:
+                line.write({"state": "error", "message": " ".join(result["errors"])})
+
+        self.result_summary = _(
+            "Simulación (no se aplicó nada)\nFactibles: %(ok)s\nCon problemas: %(err)s"
+        ) % {
+            "ok": feasible,
+            "err": len(lines) - feasible,
+        }
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Aplicar canje de granos (masivo)"),
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
+
+    def action_apply_in_background(self):
+        """Encola las asignaciones pendientes como trabajo en segundo plano."""
+        self.ensure_one()
+        lines = self.line_ids.filtered(lambda l: l.state != "done")
+        incomplete = lines.filtered(lambda l: l.contract_id and l.tn_aplicar <= 0.0)
+        if incomplete:
+            incomplete.write({"state": "error", "message": _("Falta indicar las TN a aplicar.")})
+            return {
+                "type": "ir.actions.act_window",
+                "name": _("Aplicar canje de granos (masivo)"),
+                "res_model": self._name,
+                "res_id": self.id,
+                "view_mode": "form",
+                "target": "new",
+            }
+
+        job = self.env["grain.canje.job"]._enqueue(
+            "canje_apply",
+            [
+                {"move_id": line.move_id.id, "contract_id": line.contract_id.id, "tn": line.tn_aplicar}
+                for line in lines
+            ],
+            _("Aplicación masiva de canje (%s facturas)") % len(lines.move_id),
+        )
+        return job._action_open()
+
+
+class ApplyGrainCanjeBulkLine(models.TransientModel):
+    _name = "apply.grain.canje.bulk.line"
+    _description = "Asignación de canje de granos por factura y contrato"
+
+    wizard_id = fields.Many2one(
+        "apply.grain.canje.bulk.wizard",
+        required=True,
+        ondelete="cascade",
+    )
+    move_id = fields.Many2one(
+        "account.move",
+        string="Factura proveedor",
+        required=True,
+        domain="[('move_type', '=', 'in_invoice'), ('state', '=', 'posted')]",
+    )
+    supplier_id = fields.Many2one(
+        "res.partner",
+        string="Proveedor de insumos",
+        related="move_id.partner_id",
+        readonly=True,
+    )
+    company_id = fields.Many2one(
+        "res.company",
+        string="Compañía",
+        related="move_id.company_id",
+        readonly=True,
+    )
+    contract_id = fields.Many2one(
+        "grain.canje.contract",
+        string="Contrato de canje",
+        domain="[('state', '=', 'open'), "
+               " ('supplier_id', '=', supplier_id), "
+               " ('company_id', '=', company_id)]",
+    )
+    tn_disponibles = fields.Float(
+        string="TN disponibles",
+        related="contract_id.tn_disponibles",
+        readonly=True,
+    )
+    tn_aplicar = fields.Float(
+        string="TN a aplicar",
+    )
+    amount = fields.Monetary(
+        string="Monto equivalente",
+        currency_field="currency_id",
+        compute="_compute_amount",
+    )
+    currency_id = fields.Many2one(
+        "res.currency",
+        string="Moneda",
+        related="move_id.currency_id",
+        readonly=True,
+    )
+    state = fields.Selection(
+        [
+            ("pending", "Pendiente"),
+            ("done", "Aplicada"),
+            ("error", "Error"),
+        ],
+        default="pending",
+        readonly=True,
+    )
+    message = fields.Char(
+        string="Detalle",
+        readonly=True,
+    )
+
+    @api.depends("tn_aplicar", "contract_id.precio_ref")
+    def _compute_amount(self):
+        for line in self:
+            line.amount = (line.tn_aplicar or 0.0) * (line.contract_id.precio_ref or 0.0)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError
+
+
+class GrainCanjeRepriceWizard(models.TransientModel):
+    _name = "grain.canje.reprice.wizard"
+    _description = "Actualizar precio de referencia de contratos de canje"
+
+    company_id = fields.Many2one("res.company", required=True, default=lambda self: self.env.company)
+    product_id = fields.Many2one("product.product", string="Grano", required=True)
+    campaign_id = fields.Many2one(
+        "grain.canje.campaign",
+        string="Campaña",
+        domain="[('company_id', '=', company_id)]",
+        help="Vacío = todos los contratos vigentes del grano.",
+    )
+    date = fields.Date(string="Precio al", required=True, default=fields.Date.context_today)
+    price = fields.Float(
+        string="Nuevo precio por TN",
+        compute="_compute_price",
+        store=True,
+        readonly=False,
+        help="Por defecto el precio de mercado del grano a la fecha.",
+    )
+    contract_count = fields.Integer(string="Contratos a actualizar", compute="_compute_contract_count")
+
+    @api.depends("product_id", "date")
+    def _compute_price(self):
+        today = fields.Date.context_today(self)
+        prices = self.env["grain.market.price"]._prices_as_of([(wiz.product_id, wiz.date) for wiz in self])
+        for wiz in self:
+            wiz.price = prices.get((wiz.product_id.id, wiz.date or today), 0.0)
+
+    def _contract_domain(self):
+        domain = [
+            ("state", "=", "open"),
+            ("company_id", "=", self.company_id.id),
+            ("product_id", "=", self.product_id.id),
+        ]
+        if self.campaign_id:
+            domain.append(("campaign_id", "=", self.campaign_id.id))
+        return domain
+
+    @api.depends("company_id", "product_id", "campaign_id")
+    def _compute_contract_count(self):
+        Contract = self.env["grain.canje.contract"]
+        for wiz in self:
+            wiz.contract_count = Contract.search_count(wiz._contract_domain()) if wiz.product_id else 0
+
+    def action_reprice(self):
+        self.ensure_one()
+        if self.price <= 0:
+            raise UserError(_("El precio debe ser mayor a 0."))
+        contracts = self.env["grain.canje.contract"].search(self._contract_domain())
+        # Una sola escritura para todos los contratos; el cambio queda en el historial de precios
+        contracts.with_context(tracking_disable=True).write({"precio_ref": self.price})
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": _("Precio de referencia actualizado"),
+                "message": _("%(count)s contratos a %(price).2f por TN.") % {
+                    "count": len(contracts),
+                    "price": self.price,
+                },
+                "next": {"type": "ir.actions.act_window_close"},
+            },
+        }
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import base64
+import csv
+import io
+
+from odoo import fields, models, _
+from odoo.exceptions import UserError
+
+# Columnas del CSV de precios (la fuente es opcional: si falta se usa la del wizard)
+PRICE_COLUMNS = ("product_code", "date", "price", "source")
+
+
+class GrainMarketPriceImportWizard(models.TransientModel):
+    _name = "grain.market.price.import.wizard"
+    _description = "Importar precios de mercado de granos (CSV)"
+
+    data = fields.Binary(string="Archivo CSV", required=True)
+    filename = fields.Char(string="Nombre de archivo")
+    source = fields.Char(string="Fuente", required=True, default="pizarra")
+    result_summary = fields.Text(string="Resultado", readonly=True)
+
+    def _read_rows(self):
+        content = base64.b64decode(self.data or b"")
+        reader = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+        for row_number, row in enumerate(reader, start=1):
+            yield row_number, {key: (row.get(key) or "").strip() for key in PRICE_COLUMNS}
+
+    def action_import(self):
+        """Inserta o actualiza los precios del archivo con un solo INSERT ... ON CONFLICT."""
+        self.ensure_one()
+        parse_float = self.env["grain.liquidation.import"]._parse_float
+        rows = list(self._read_rows())
+        codes = {row["product_code"] for _n, row in rows if row["product_code"]}
+        products = {
+            p["default_code"]: p["id"]
+            for p in self.env["product.product"].search_read([("default_code", "in", list(codes))], ["default_code"])
+        }
+
+        errors = []
+        prices = {}
+        for row_number, row in rows:
+            product_id = products.get(row["product_code"])
+            if not product_id:
+                errors.append(_("Fila %(row)s: producto con código %(code)s no encontrado.") % {
+                    "row": row_number, "code": row["product_code"],
+                })
+                continue
+            try:
+                date = fields.Date.to_date(row["date"])
+                price = parse_float(row["price"])
+            except ValueError:
+                date = price = None
+            if not date or not price or price <= 0:
+                errors.append(_("Fila %s: fecha o precio inválido.") % row_number)
+                continue
+            # La última fila del archivo gana si se repite la clave
+            prices[(product_id, date, row["source"] or self.source)] = price
+
+        if prices:
+            keys = list(prices)
+            self.env["grain.market.price"].flush_model()
+            self.env.cr.execute(
+                """
+                INSERT INTO grain_market_price
+                       (product_id, date, source, price, create_uid, create_date, write_uid, write_date)
+                SELECT v.product_id, v.date, v.source, v.price, %(uid)s, now() AT TIME ZONE 'UTC',
+                       %(uid)s, now() AT TIME ZONE 'UTC'
+                  FROM (
+                        SELECT unnest(%(product_ids)s::int[]) AS product_id,
+                               unnest(%(dates)s::date[]) AS date,
+                               unnest(%(sources)s::varchar[]) AS source,
+                               unnest(%(prices)s::float8[]) AS price
+                  ) v
+                    ON CONFLICT (product_id, date, source)
+                    DO UPDATE SET price = EXCLUDED.price,
+                                  write_uid = EXCLUDED.write_uid,
+                                  write_date = EXCLUDED.write_date
+                """,
+                {
+                    "uid": self.env.uid,
+                    "product_ids": [key[0] for key in keys],
+                    "dates": [key[1] for key in keys],
+                    "sources": [key[2] for key in keys],
+                    "prices": [prices[key] for key in keys],
+                },
+            )
+            self.env["grain.market.price"].invalidate_model()
+            self.env["grain.market.price"]._clear_price_cache()
+
+        if not prices and errors:
+            raise UserError("\n".join(errors[:50]))
+
+        self.result_summary = _("Precios importados: %(ok)s\nFilas con error: %(err)s") % {
+            "ok": len(prices),
+            "err": len(errors),
+        } + "".join("\n%s" % error for error in errors[:50])
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Importar precios de mercado"),
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
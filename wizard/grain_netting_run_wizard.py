@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from odoo import fields, models, _
+
+from ..models.grain_bulk import bulk_mode
+
+
+class GrainNettingRunWizard(models.TransientModel):
+    _name = "grain.netting.run.wizard"
+    _description = "Compensación automática A/R vs A/P por productor"
+
+    company_id = fields.Many2one("res.company", required=True, default=lambda self: self.env.company)
+    producer_ids = fields.Many2many(
+        "res.partner",
+        string="Productores",
+        help="Vacío = todos los productores con facturas de insumos y LPG abiertas.",
+    )
+    strategy = fields.Selection(
+        [
+            ("due_date", "Por vencimiento (FIFO)"),
+            ("date", "Más antiguas primero"),
+        ],
+        string="Orden de imputación",
+        required=True,
+        default="due_date",
+    )
+
+    def action_run(self):
+        self.ensure_one()
+        net_moves = bulk_mode(self.env["grain.netting.engine"])._run(
+            self.company_id,
+            producers=self.producer_ids or None,
+            strategy=self.strategy,
+        )
+        if not net_moves:
+            return {
+                "type": "ir.actions.client",
+                "tag": "display_notification",
+                "params": {
+                    "title": _("Compensación automática"),
+                    "message": _("No hay partidas abiertas para compensar."),
+                    "next": {"type": "ir.actions.act_window_close"},
+                },
+            }
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Asientos de compensación"),
+            "res_model": "account.move",
+            "view_mode": "tree,form",
+            "domain": [("id", "in", net_moves.ids)],
+        }
+
+    def action_run_in_background(self):
+        self.ensure_one()
+        producers = self.producer_ids
+        if not producers:
+            items = self.env["grain.netting.engine"]._fetch_open_items(self.company_id)
+            producers = self.env["res.partner"].browse(list(items))
+        job = self.env["grain.canje.job"]._enqueue(
+            "netting",
+            producers.ids,
+            _("Compensación automática (%s productores)") % len(producers),
+            company=self.company_id,
+            params={"strategy": self.strategy},
+        )
+        return job._action_open()
@@ -10,80 +10,125 @@ class GrainNettingWizard(models.TransientModel):
     company_id = fields.Many2one("res.company", required=True, default=lambda self: self.env.company)
     currency_id = fields.Many2one(related="company_id.currency_id", readonly=True)
 
-    move_id = fields.Many2one("account.move", string="Factura cliente (Insumos)", required=True, readonly=True)
     producer_id = fields.Many2one("res.partner", string="Productor", required=True, readonly=True)
 
-    lpg_bill_id = fields.Many2one(
+    move_ids = fields.Many2many(
         "account.move",
-        string="Vendor Bill LPG",
-        domain="[('move_type','=','in_invoice'),('state','=','posted'),('payment_state','!=','paid'),('partner_id','=',producer_id)]",
+        "grain_netting_wizard_invoice_rel",
+        "wizard_id",
+        "move_id",
+        string="Facturas cliente (Insumos)",
+        domain="[('move_type','=','out_invoice'),('state','=','posted'),('payment_state','not in',('paid','in_payment')),"
+               "('commercial_partner_id','=',producer_id),('company_id','=',company_id),('currency_id','=',currency_id)]",
         required=True,
     )
+    lpg_bill_ids = fields.Many2many(
+        "account.move",
+        "grain_netting_wizard_lpg_rel",
+        "wizard_id",
+        "move_id",
+        string="Vendor Bills LPG",
+        domain="[('move_type','=','in_invoice'),('state','=','posted'),('payment_state','not in',('paid','in_payment')),"
+               "('commercial_partner_id','=',producer_id),('company_id','=',company_id),('currency_id','=',currency_id)]",
+        required=True,
+    )
+    strategy = fields.Selection(
+        [
+            ("due_date", "Por vencimiento (FIFO)"),
+            ("date", "Más antiguas primero"),
+        ],
+        string="Orden de imputación",
+        required=True,
+        default="due_date",
+    )
 
-    amount = fields.Monetary(string="Importe a compensar", currency_field="currency_id", required=True)
+    amount_receivable = fields.Monetary(
+        string="Residual facturas", currency_field="currency_id", compute="_compute_amounts"
+    )
+    amount_payable = fields.Monetary(
+        string="Residual LPG", currency_field="currency_id", compute="_compute_amounts"
+    )
+    amount = fields.Monetary(
+        string="Importe a compensar",
+        currency_field="currency_id",
+        compute="_compute_amount",
+        store=True,
+        readonly=False,
+        help="Por defecto el máximo compensable: el menor de los dos residuales.",
+    )
+
+    def _receivable_lines(self):
+        return self.move_ids.line_ids.filtered(
+            lambda l: l.account_id.account_type == "asset_receivable" and not l.reconciled
+            and l.currency_id == l.company_currency_id
+        )
+
+    def _payable_lines(self):
+        return self.lpg_bill_ids.line_ids.filtered(
+            lambda l: l.account_id.account_type == "liability_payable" and not l.reconciled
+            and l.currency_id == l.company_currency_id
+        )
+
+    @api.depends("move_ids", "lpg_bill_ids")
+    def _compute_amounts(self):
+        for wiz in self:
+            wiz.amount_receivable = sum(abs(l.amount_residual) for l in wiz._receivable_lines())
+            wiz.amount_payable = sum(abs(l.amount_residual) for l in wiz._payable_lines())
+
+    @api.depends("amount_receivable", "amount_payable")
+    def _compute_amount(self):
+        for wiz in self:
+            wiz.amount = min(wiz.amount_receivable, wiz.amount_payable)
 
     def action_net(self):
         self.ensure_one()
 
-        if self.move_id.move_type != "out_invoice" or self.move_id.state != "posted":
-            raise UserError(_("La factura cliente debe estar publicada (posted)."))
+        if any(m.move_type != "out_invoice" or m.state != "posted" for m in self.move_ids):
+            raise UserError(_("Las facturas cliente deben estar publicadas (posted)."))
 
-        if self.lpg_bill_id.move_type != "in_invoice" or self.lpg_bill_id.state != "posted":
-            raise UserError(_("La vendor bill LPG debe estar publicada (posted)."))
+        if any(m.move_type != "in_invoice" or m.state != "posted" for m in self.lpg_bill_ids):
+            raise UserError(_("Las vendor bills LPG deben estar publicadas (posted)."))
 
         if not self.company_id.grain_netting_journal_id:
             raise UserError(_("Configurá el diario de compensaciones (Ajustes)."))
 
+        if (self.move_ids | self.lpg_bill_ids).currency_id != self.currency_id:
+            raise UserError(
+                _("Sólo se pueden compensar facturas y vendor bills en %s (moneda de la compañía).")
+                % self.currency_id.name
+            )
+
+        partner = self.producer_id.commercial_partner_id
+        if (self.move_ids | self.lpg_bill_ids).commercial_partner_id != partner:
+            raise UserError(_("Todas las facturas y vendor bills deben ser del mismo productor."))
+
         # límites por residual
-        max_net = min(self.move_id.amount_residual, self.lpg_bill_id.amount_residual)
+        max_net = min(self.amount_receivable, self.amount_payable)
         if self.amount <= 0:
             raise UserError(_("El importe debe ser mayor a 0."))
-        if self.amount - max_net > 0.00001:
+        if self.currency_id.compare_amounts(self.amount, max_net) > 0:
             raise UserError(_("El importe excede el residual (máx: %s).") % max_net)
 
-        partner = self.producer_id
-        recv_acc = partner.property_account_receivable_id
-        pay_acc = partner.property_account_payable_id
-
-        if not recv_acc or not pay_acc:
-            raise UserError(_("El productor debe tener cuentas por cobrar y por pagar configuradas."))
-
-        journal = self.company_id.grain_netting_journal_id
-
-        net_move = self.env["account.move"].create({
-            "move_type": "entry",
-            "date": fields.Date.context_today(self),
-            "ref": f"Compensación Canje: {self.move_id.name} vs {self.lpg_bill_id.name}",
-            "journal_id": journal.id,
-            "company_id": self.company_id.id,
-            "line_ids": [
-                (0, 0, {
-                    "name": _("Compensación Canje (Dr A/P)"),
-                    "partner_id": partner.id,
-                    "account_id": pay_acc.id,
-                    "debit": self.amount,
-                    "credit": 0.0,
-                }),
-                (0, 0, {
-                    "name": _("Compensación Canje (Cr A/R)"),
-                    "partner_id": partner.id,
-                    "account_id": recv_acc.id,
-                    "debit": 0.0,
-                    "credit": self.amount,
-                }),
-            ],
-        })
+        engine = self.env["grain.netting.engine"]
+        vals, counterpart_lines = engine._plan_netting(
+            self.company_id,
+            partner,
+            engine._lines_to_items(self._receivable_lines()),
+            engine._lines_to_items(self._payable_lines()),
+            _("Compensación Canje: %(invoices)s vs %(bills)s") % {
+                "invoices": ", ".join(self.move_ids.mapped("name")),
+                "bills": ", ".join(self.lpg_bill_ids.mapped("name")),
+            },
+            strategy=self.strategy,
+            limit=self.amount,
+        )
+        if not vals:
+            raise UserError(_("No hay partidas abiertas para compensar."))
+
+        net_move = self.env["account.move"].create(vals)
         net_move.action_post()
-
-        # Reconciliar A/R contra la factura cliente
-        recv_line_net = net_move.line_ids.filtered(lambda l: l.account_id == recv_acc and l.credit > 0 and not l.reconciled)
-        recv_lines_inv = self.move_id.line_ids.filtered(lambda l: l.account_id == recv_acc and not l.reconciled)
-        (recv_line_net + recv_lines_inv).reconcile()
-
-        # Reconciliar A/P contra la vendor bill LPG
-        pay_line_net = net_move.line_ids.filtered(lambda l: l.account_id == pay_acc and l.debit > 0 and not l.reconciled)
-        pay_lines_bill = self.lpg_bill_id.line_ids.filtered(lambda l: l.account_id == pay_acc and not l.reconciled)
-        (pay_line_net + pay_lines_bill).reconcile()
+        # A/R contra las facturas, A/P contra las LPG
+        engine._reconcile_netting(net_move, [counterpart_lines])
 
         return {
             "type": "ir.actions.act_window",
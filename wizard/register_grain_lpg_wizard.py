@@ -20,6 +20,7 @@ class RegisterGrainLpgWizard(models.TransientModel):
         domain="[('detailed_type','=','service')]",
     )
 
+    lpg_number = fields.Char(string="N° LPG (COE)")
     qty_tn = fields.Float(string="Toneladas", required=True)
     price_per_tn = fields.Monetary(string="Precio por TN", required=True, currency_field="currency_id")
     amount = fields.Monetary(string="Importe", compute="_compute_amount", currency_field="currency_id", store=False)
@@ -53,16 +54,22 @@ class RegisterGrainLpgWizard(models.TransientModel):
         if self.qty_tn <= 0:
             raise UserError(_("Las toneladas deben ser mayores a 0."))
 
-        lpg = self.env["grain.liquidation"].create({
+        Liquidation = self.env["grain.liquidation"]
+        lpg_vals = {
             "date": self.date,
             "company_id": self.company_id.id,
             "producer_id": self.producer_id.id,
             "product_id": self.product_id.id,
             "qty_tn": self.qty_tn,
             "price_per_tn": self.price_per_tn,
+            "lpg_number": self.lpg_number,
             "clearing_account_id": self.clearing_account_id.id,
             "journal_id": self.journal_id.id,
-        })
+        }
+        if Liquidation._registered_fingerprints([Liquidation._fingerprint_from_vals(lpg_vals)]):
+            raise UserError(_("Esta LPG ya está registrada (mismo productor, fecha, grano, toneladas, precio y número)."))
+
+        lpg = Liquidation.create(lpg_vals)
 
         bill = self.env["account.move"].create({
             "move_type": "in_invoice",
@@ -71,6 +78,7 @@ class RegisterGrainLpgWizard(models.TransientModel):
             "company_id": self.company_id.id,
             "journal_id": self.journal_id.id,
             "ref": f"LPG {lpg.id}",
+            "grain_liquidation_id": lpg.id,
             "invoice_line_ids": [(0, 0, {
                 "product_id": self.product_id.id,
                 "name": _("Liquidación primaria de granos (LPG)"),
@@ -83,6 +91,7 @@ class RegisterGrainLpgWizard(models.TransientModel):
 
         lpg.write({
             "move_id": bill.id,
+            "vendor_bill_id": bill.id,
             "state": "posted",
         })
 